@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fractions import Fraction
+import glob
+import os
+import sys
+import tempfile
+import time
+from typing import NamedTuple
+
+from dam_mpeg2_ps_utility.customized_logger import (
+    configure_logger,
+    LOG_FORMATS,
+    LOG_LEVELS,
+)
+from dam_mpeg2_ps_utility.dam_mpeg2_ps import DamMpeg2PsCodec
+from dam_mpeg2_ps_utility.dam_mpeg2_ps_generator import DamMpeg2PsGenerator
+from dam_mpeg2_ps_utility.index_cache import IndexCache
+
+
+class BatchJob(NamedTuple):
+    input_path: str
+    output_path: str
+
+
+class BatchResult(NamedTuple):
+    job: BatchJob
+    status: str
+    wall_time: float
+    output_size: int
+    gop_count: int
+    error: str | None
+
+
+def iter_input_path(input_path: str, pattern: str):
+    """Iterate input file paths of a path, directory or glob
+
+    Args:
+        input_path (str): File path, directory path or glob pattern
+        pattern (str): Glob pattern of file names in directories
+
+    Yields:
+        str: Input file path
+    """
+
+    if os.path.isdir(input_path):
+        yield from sorted(glob.glob(os.path.join(glob.escape(input_path), pattern)))
+    elif os.path.exists(input_path):
+        yield input_path
+    else:
+        yield from sorted(glob.glob(input_path, recursive=True))
+
+
+def read_manifest(path: str):
+    """Read jobs from a manifest
+
+    Each line has an input path and optionally a tab separated output path. Empty lines and lines starting with "#" are ignored.
+
+    Args:
+        path (str): Manifest file path
+
+    Returns:
+        list[tuple[str, str | None]]: Input and output paths
+    """
+
+    entries: list[tuple[str, str | None]] = []
+    with open(path, "r", encoding="utf-8") as manifest_file:
+        for line in manifest_file:
+            line = line.rstrip("\r\n")
+            if line.strip() == "" or line.startswith("#"):
+                continue
+            fields = line.split("\t")
+            input_path = fields[0]
+            output_path = fields[1] if 1 < len(fields) and fields[1] != "" else None
+            entries.append((input_path, output_path))
+    return entries
+
+
+def is_up_to_date(job: BatchJob):
+    try:
+        return os.stat(job.input_path).st_mtime <= os.stat(job.output_path).st_mtime
+    except FileNotFoundError:
+        return False
+
+
+def initialize_worker(log_level: str, log_format: str):
+    configure_logger(log_level, log_format)
+
+
+def create_dam_mpeg2_ps(
+    job: BatchJob,
+    codec: DamMpeg2PsCodec,
+    frame_rate: Fraction,
+    pass_through: bool,
+    index_cache: IndexCache | None = None,
+):
+    """Create a DAM compatible MPEG2-PS file
+
+    The output is written to a temporary file in the same directory and renamed when complete.
+
+    Args:
+        job (BatchJob): Job
+        codec (DamMpeg2PsCodec): Codec
+        frame_rate (Fraction): Frame rate
+        pass_through (bool): Copy NAL units unchanged
+        index_cache (IndexCache | None, optional): Cache of NAL unit indexes. Defaults to None.
+
+    Returns:
+        BatchResult: Result
+    """
+
+    start_time = time.perf_counter()
+    output_directory = os.path.dirname(os.path.abspath(job.output_path))
+    temp_path: str | None = None
+    try:
+        os.makedirs(output_directory, exist_ok=True)
+        with open(job.input_path, "rb") as input_file, tempfile.NamedTemporaryFile(
+            "wb",
+            dir=output_directory,
+            prefix=f".{os.path.basename(job.output_path)}.",
+            suffix=".tmp",
+            delete=False,
+        ) as output_file:
+            temp_path = output_file.name
+            generator = DamMpeg2PsGenerator(index_cache)
+            gop_index = generator.write_mpeg2_ps_streaming(
+                input_file, output_file, codec, frame_rate, pass_through
+            )
+            output_file.flush()
+            os.fsync(output_file.fileno())
+        # Temporary files are created with mode 0600
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+        os.replace(temp_path, job.output_path)
+        temp_path = None
+        return BatchResult(
+            job,
+            "created",
+            time.perf_counter() - start_time,
+            os.path.getsize(job.output_path),
+            # Excluding the entry of Program end
+            len(gop_index.gops) - 1,
+            None,
+        )
+    except Exception as exception:
+        return BatchResult(
+            job,
+            "failed",
+            time.perf_counter() - start_time,
+            0,
+            0,
+            f"{type(exception).__name__}: {exception}",
+        )
+    finally:
+        if temp_path is not None:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
+def run_jobs(
+    jobs: list[BatchJob],
+    workers: int,
+    codec: DamMpeg2PsCodec,
+    frame_rate: Fraction,
+    pass_through: bool,
+    index_cache: IndexCache | None = None,
+    log_level="info",
+    log_format="text",
+):
+    """Run jobs on a process pool
+
+    If a worker process dies, the unfinished jobs are run again one at a time to find the job that killed it, then the rest go back to the pool.
+
+    Args:
+        jobs (list[BatchJob]): Jobs
+        workers (int): Worker process count
+        codec (DamMpeg2PsCodec): Codec
+        frame_rate (Fraction): Frame rate
+        pass_through (bool): Copy NAL units unchanged
+        index_cache (IndexCache | None, optional): Cache of NAL unit indexes. Defaults to None.
+        log_level (str, optional): Log level of workers. Defaults to "info".
+        log_format (str, optional): Log format of workers, "text" or "json". Defaults to "text".
+
+    Yields:
+        BatchResult: Result
+    """
+
+    pending_jobs = jobs
+    isolated = False
+    while len(pending_jobs) != 0:
+        broken_jobs: list[BatchJob] = []
+        with ProcessPoolExecutor(
+            max_workers=1 if isolated else workers,
+            initializer=initialize_worker,
+            initargs=(log_level, log_format),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    create_dam_mpeg2_ps,
+                    job,
+                    codec,
+                    frame_rate,
+                    pass_through,
+                    index_cache,
+                )
+                for job in pending_jobs
+            ]
+            for job, future in zip(pending_jobs, futures):
+                try:
+                    yield future.result()
+                except BrokenProcessPool:
+                    broken_jobs.append(job)
+
+        # Remove temporary files left by dead workers
+        for job in broken_jobs:
+            output_directory = os.path.dirname(os.path.abspath(job.output_path))
+            for temp_path in glob.glob(
+                os.path.join(
+                    glob.escape(output_directory),
+                    f".{glob.escape(os.path.basename(job.output_path))}.*.tmp",
+                )
+            ):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+        if len(broken_jobs) != 0 and isolated:
+            # The first unfinished job of a single worker killed it
+            yield BatchResult(
+                broken_jobs[0], "crashed", 0.0, 0, 0, "Worker process died."
+            )
+            broken_jobs = broken_jobs[1:]
+            isolated = False
+        elif len(broken_jobs) != 0:
+            isolated = True
+        pending_jobs = broken_jobs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DAM compatible MPEG2-PS Batch Creator")
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        help="Input H.264-ES file paths, directories or glob patterns",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="Manifest file, one input path and optional tab separated output path per line",
+    )
+    parser.add_argument(
+        "--output_dir",
+        help="Output directory of inputs without an output path in the manifest",
+    )
+    parser.add_argument(
+        "--pattern",
+        default="*.h264",
+        help="Glob pattern of input file names in directories",
+    )
+    parser.add_argument(
+        "--output_extension", default=".mpg", help="Extension of output file names"
+    )
+    parser.add_argument("--input_codec", choices=["avc", "hevc"], default="avc")
+    parser.add_argument(
+        "--frame_rate",
+        type=Fraction,
+        default="30000/1001",
+        help="Frame rate as N/D or N (e.g. 24000/1001, 30000/1001, 60)",
+    )
+    parser.add_argument(
+        "--pass_through",
+        action="store_true",
+        help="Copy NAL units unchanged instead of parsing and serializing them",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Worker process count",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Recreate up-to-date outputs"
+    )
+    parser.add_argument(
+        "--no-index-cache",
+        action="store_true",
+        help="Do not use NAL unit index cache",
+    )
+    parser.add_argument(
+        "--log_level", choices=LOG_LEVELS, default="info", help="Log level"
+    )
+    parser.add_argument(
+        "--log_format", choices=LOG_FORMATS, default="text", help="Log format"
+    )
+    args = parser.parse_args(argv)
+
+    configure_logger(args.log_level, args.log_format)
+
+    codec = DamMpeg2PsCodec.UNDEFINED
+    if args.input_codec == "avc":
+        codec = DamMpeg2PsCodec.AVC_VIDEO
+    elif args.input_codec == "hevc":
+        codec = DamMpeg2PsCodec.HEVC_VIDEO
+
+    frame_rate: Fraction = args.frame_rate
+    if frame_rate <= 0:
+        parser.error(f"invalid frame rate: {frame_rate}")
+    if args.workers is None or args.workers < 1:
+        parser.error(f"invalid worker count: {args.workers}")
+
+    entries: list[tuple[str, str | None]] = []
+    if args.manifest is not None:
+        entries += read_manifest(args.manifest)
+    for input_arg in args.inputs:
+        entries += [
+            (input_path, None)
+            for input_path in iter_input_path(input_arg, args.pattern)
+        ]
+    if len(entries) == 0:
+        parser.error("no input files")
+
+    jobs: list[BatchJob] = []
+    for input_path, output_path in entries:
+        if output_path is None:
+            if args.output_dir is None:
+                parser.error(f"--output_dir is required for {input_path}")
+            output_name = (
+                os.path.splitext(os.path.basename(input_path))[0]
+                + args.output_extension
+            )
+            output_path = os.path.join(args.output_dir, output_name)
+        jobs.append(BatchJob(input_path, output_path))
+
+    results: list[BatchResult] = []
+    pending_jobs: list[BatchJob] = []
+    for job in jobs:
+        if not args.force and is_up_to_date(job):
+            output_size = os.path.getsize(job.output_path)
+            results.append(BatchResult(job, "skipped", 0.0, output_size, 0, None))
+            print(f"skipped {job.input_path} -> {job.output_path}")
+        else:
+            pending_jobs.append(job)
+
+    start_time = time.perf_counter()
+    index_cache = None if args.no_index_cache else IndexCache()
+    for result in run_jobs(
+        pending_jobs,
+        args.workers,
+        codec,
+        frame_rate,
+        args.pass_through,
+        index_cache,
+        args.log_level,
+        args.log_format,
+    ):
+        results.append(result)
+        if result.error is None:
+            print(
+                f"{result.status} {result.job.input_path} -> {result.job.output_path}"
+                f" wall_time={result.wall_time:.3f}s bytes={result.output_size} gops={result.gop_count}"
+            )
+        else:
+            print(
+                f"{result.status} {result.job.input_path} -> {result.job.output_path}"
+                f" wall_time={result.wall_time:.3f}s error={result.error}"
+            )
+    wall_time = time.perf_counter() - start_time
+
+    status_counts: dict[str, int] = {}
+    for result in results:
+        status_counts[result.status] = status_counts.get(result.status, 0) + 1
+    created_size = sum(
+        result.output_size for result in results if result.status == "created"
+    )
+    print(
+        f"total files={len(results)} "
+        + " ".join(f"{status}={count}" for status, count in status_counts.items())
+        + f" wall_time={wall_time:.3f}s bytes={created_size}"
+    )
+
+    if any(result.error is not None for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
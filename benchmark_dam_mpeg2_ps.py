@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+from fractions import Fraction
+import json
+import os
+import sys
+import tempfile
+
+from dam_mpeg2_ps_benchmark.dam_mpeg2_ps_benchmark import DamMpeg2PsBenchmark
+from dam_mpeg2_ps_benchmark.dam_mpeg2_ps_benchmark_data import BenchmarkParameters
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DAM compatible MPEG2-PS Benchmark")
+    parser.add_argument(
+        "--benchmarks",
+        nargs="+",
+        choices=DamMpeg2PsBenchmark.BENCHMARKS,
+        default=list(DamMpeg2PsBenchmark.BENCHMARKS),
+        help="Benchmarks to run",
+    )
+    parser.add_argument(
+        "--durations",
+        nargs="+",
+        type=float,
+        default=[60.0, 120.0, 240.0],
+        help="Durations of synthetic inputs (sec)",
+    )
+    parser.add_argument(
+        "--frame_rate",
+        type=Fraction,
+        default="30000/1001",
+        help="Frame rate as N/D or N (e.g. 24000/1001, 30000/1001, 60)",
+    )
+    parser.add_argument(
+        "--gop_length", type=int, default=30, help="Picture count of a GOP"
+    )
+    parser.add_argument(
+        "--slice_size", type=int, default=4000, help="Size of non-IDR slice data"
+    )
+    parser.add_argument(
+        "--idr_slice_size", type=int, default=40000, help="Size of IDR slice data"
+    )
+    parser.add_argument(
+        "--emulation_density",
+        type=float,
+        default=1.0,
+        help="Emulation prevention sequences (0x000003XX) per KiB of slice data",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of slice data")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Repeat count, the fastest is reported"
+    )
+    parser.add_argument(
+        "--work_dir",
+        help="Directory of synthetic inputs, kept for later runs. Defaults to a temporary directory",
+    )
+    parser.add_argument("--output", help="JSON report output file path")
+    parser.add_argument("--baseline", help="JSON report file path to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Tolerance ratio of throughput and peak RSS against the baseline",
+    )
+    args = parser.parse_args(argv)
+
+    frame_rate: Fraction = args.frame_rate
+    if frame_rate <= 0:
+        parser.error(f"invalid frame rate: {frame_rate}")
+    if any(duration <= 0 for duration in args.durations):
+        parser.error(f"invalid durations: {args.durations}")
+    if args.repeat < 1:
+        parser.error(f"invalid repeat count: {args.repeat}")
+
+    parameters = BenchmarkParameters(
+        sorted(set(args.durations)),
+        str(frame_rate),
+        args.gop_length,
+        args.slice_size,
+        args.idr_slice_size,
+        args.emulation_density,
+        args.seed,
+        args.repeat,
+    )
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+
+    with tempfile.TemporaryDirectory() as temp_directory:
+        work_directory = args.work_dir if args.work_dir is not None else temp_directory
+        os.makedirs(work_directory, exist_ok=True)
+        results = []
+        for result in DamMpeg2PsBenchmark.run(
+            parameters, work_directory, args.benchmarks
+        ):
+            results.append(result)
+            for measurement in result.measurements:
+                print(
+                    f"{result.name} duration={measurement.duration:g}s bytes={measurement.size}"
+                    f" seconds={measurement.seconds:.3f} throughput={measurement.throughput:.2f}MB/s"
+                    f" peak_rss={measurement.peak_rss / 1048576:.1f}MiB"
+                )
+            if result.scaling_exponent is not None:
+                print(f"{result.name} scaling_exponent={result.scaling_exponent:.2f}")
+
+    report = DamMpeg2PsBenchmark.make_report(parameters, results)
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+            output_file.write("\n")
+
+    if baseline is None:
+        return
+    if baseline["parameters"] != report["parameters"]:
+        print("Parameters differ from the baseline.")
+    regressions = DamMpeg2PsBenchmark.compare(report, baseline, args.threshold)
+    for regression in regressions:
+        print(f"regression {regression}")
+    if len(regressions) != 0:
+        sys.exit(1)
+    print("No regression.")
+
+
+if __name__ == "__main__":
+    main()
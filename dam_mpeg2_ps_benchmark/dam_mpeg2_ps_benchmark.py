@@ -0,0 +1,339 @@
+import bitstring
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+import math
+import os
+import platform
+import sys
+import time
+
+from dam_mpeg2_ps_benchmark.dam_mpeg2_ps_benchmark_data import (
+    BenchmarkParameters,
+    BenchmarkMeasurement,
+    BenchmarkResult,
+)
+from dam_mpeg2_ps_benchmark.synthetic_h264_es import SyntheticH264Es
+from dam_mpeg2_ps_utility.dam_mpeg2_ps import DamMpeg2Ps, DamMpeg2PsCodec
+from dam_mpeg2_ps_utility.dam_mpeg2_ps_generator import DamMpeg2PsGenerator
+from dam_mpeg2_ps_utility.h264_annex_b import H264AnnexB
+from dam_mpeg2_ps_utility.mpeg2_ps import Mpeg2Ps
+from dam_mpeg2_ps_utility.mpeg2_ps_reader import Mpeg2PsReader
+
+
+class DamMpeg2PsBenchmark:
+    """Benchmarks of scanning, parsing, muxing, dumping and GOP indexing
+
+    Each benchmark runs on synthetic inputs of several durations in a fresh worker process, so peak RSS is of that benchmark only. Throughput is input bytes per second of the fastest repeat, and the scaling exponent is the slope of log time over log input size (1.0 is linear).
+    """
+
+    BENCHMARKS = ("scanner", "parser", "muxer", "dumper", "gop_index")
+    REPORT_VERSION = 1
+
+    __SCALING_EXPONENT_TOLERANCE = 0.1
+
+    @staticmethod
+    def __prepare(name: str, es_path: str, ps_path: str, output_path: str):
+        # Return the benchmark and its input size
+        if name == "scanner":
+
+            def run():
+                with open(es_path, "rb") as input_file:
+                    H264AnnexB.index_nal_unit(input_file)
+
+            return run, os.path.getsize(es_path)
+        elif name == "parser":
+
+            def run():
+                with open(ps_path, "rb") as input_file:
+                    stream = bitstring.BitStream(input_file)
+                    while Mpeg2Ps.read_ps_packet(stream) is not None:
+                        pass
+
+            return run, os.path.getsize(ps_path)
+        elif name == "muxer":
+
+            def run():
+                with open(es_path, "rb") as input_file, open(
+                    output_path, "wb"
+                ) as output_file:
+                    generator = DamMpeg2PsGenerator()
+                    generator.load_h264_es(input_file)
+                    generator.write_mpeg2_ps(
+                        output_file, DamMpeg2PsCodec.AVC_VIDEO, Fraction(30000, 1001)
+                    )
+
+            return run, os.path.getsize(es_path)
+        elif name == "dumper":
+
+            def run():
+                with open(ps_path, "rb") as input_file, Mpeg2PsReader(
+                    input_file
+                ) as reader:
+                    for _ in reader.iter_packets(decode=True):
+                        pass
+
+            return run, os.path.getsize(ps_path)
+        elif name == "gop_index":
+
+            def run():
+                with open(ps_path, "rb") as input_file, open(
+                    output_path, "wb"
+                ) as output_file:
+                    DamMpeg2Ps.restamp_gop_index(input_file, output_file)
+                with open(output_path, "rb") as output_file:
+                    DamMpeg2Ps.load_gop_index(output_file)
+
+            return run, os.path.getsize(ps_path)
+        raise RuntimeError("Invalid benchmark.")
+
+    @staticmethod
+    def __peak_rss():
+        try:
+            import resource
+        except ImportError:
+            return 0
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Bytes on macOS, KiB on Linux
+        return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+    @staticmethod
+    def measure(
+        name: str,
+        duration: float,
+        es_path: str,
+        ps_path: str,
+        output_path: str,
+        repeat: int,
+    ):
+        """Measure a benchmark, run on a worker process
+
+        Args:
+            name (str): Benchmark name
+            duration (float): Duration of input (sec)
+            es_path (str): Synthetic H.264-ES file path
+            ps_path (str): MPEG2-PS file path of the H.264-ES
+            output_path (str): Output file path
+            repeat (int): Repeat count
+
+        Returns:
+            BenchmarkMeasurement: Measurement
+        """
+
+        run, size = DamMpeg2PsBenchmark.__prepare(name, es_path, ps_path, output_path)
+        seconds = math.inf
+        for _ in range(repeat):
+            # Rewriting a truncated file may wait for writeback of the previous one
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            start_time = time.perf_counter()
+            run()
+            seconds = min(seconds, time.perf_counter() - start_time)
+        return BenchmarkMeasurement(
+            duration,
+            size,
+            seconds,
+            size / seconds / 1000000,
+            DamMpeg2PsBenchmark.__peak_rss(),
+        )
+
+    @staticmethod
+    def scaling_exponent(measurements: list[BenchmarkMeasurement]):
+        """Least squares slope of log time over log input size
+
+        Args:
+            measurements (list[BenchmarkMeasurement]): Measurements
+
+        Returns:
+            float | None: Scaling exponent, None if there are less than 2 input sizes
+        """
+
+        points = [
+            (math.log(measurement.size), math.log(measurement.seconds))
+            for measurement in measurements
+            if 0 < measurement.size and 0 < measurement.seconds
+        ]
+        if len(set(x for x, _ in points)) < 2:
+            return
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        return sum((x - mean_x) * (y - mean_y) for x, y in points) / sum(
+            (x - mean_x) ** 2 for x, _ in points
+        )
+
+    @staticmethod
+    def generate_inputs(parameters: BenchmarkParameters, work_directory: str):
+        """Generate synthetic H.264-ES and MPEG2-PS files of each duration
+
+        Existing files are reused.
+
+        Args:
+            parameters (BenchmarkParameters): Parameters
+            work_directory (str): Directory of generated files
+
+        Returns:
+            list[tuple[float, str, str]]: Duration, H.264-ES file path and MPEG2-PS file path
+        """
+
+        frame_rate = Fraction(parameters.frame_rate)
+        inputs: list[tuple[float, str, str]] = []
+        for duration in parameters.durations:
+            name = (
+                f"synthetic_{duration:g}s_{frame_rate.numerator}_{frame_rate.denominator}"
+                f"_{parameters.gop_length}_{parameters.slice_size}_{parameters.idr_slice_size}"
+                f"_{parameters.emulation_density:g}_{parameters.seed}"
+            )
+            es_path = os.path.join(work_directory, f"{name}.h264")
+            ps_path = os.path.join(work_directory, f"{name}.mpg")
+            if not os.path.exists(es_path):
+                with open(f"{es_path}.tmp", "wb") as es_file:
+                    SyntheticH264Es.write(
+                        es_file,
+                        duration,
+                        frame_rate,
+                        parameters.gop_length,
+                        parameters.slice_size,
+                        parameters.idr_slice_size,
+                        parameters.emulation_density,
+                        parameters.seed,
+                    )
+                os.replace(f"{es_path}.tmp", es_path)
+            if not os.path.exists(ps_path):
+                with open(es_path, "rb") as es_file, open(
+                    f"{ps_path}.tmp", "wb"
+                ) as ps_file:
+                    DamMpeg2PsGenerator().write_mpeg2_ps_streaming(
+                        es_file, ps_file, DamMpeg2PsCodec.AVC_VIDEO, frame_rate
+                    )
+                os.replace(f"{ps_path}.tmp", ps_path)
+            inputs.append((duration, es_path, ps_path))
+        return inputs
+
+    @staticmethod
+    def run(
+        parameters: BenchmarkParameters,
+        work_directory: str,
+        benchmarks: list[str] | None = None,
+    ):
+        """Run benchmarks
+
+        Args:
+            parameters (BenchmarkParameters): Parameters
+            work_directory (str): Directory of generated files
+            benchmarks (list[str] | None, optional): Benchmark names. Defaults to None (All benchmarks).
+
+        Yields:
+            BenchmarkResult: Result of each benchmark
+        """
+
+        if benchmarks is None:
+            benchmarks = list(DamMpeg2PsBenchmark.BENCHMARKS)
+        inputs = DamMpeg2PsBenchmark.generate_inputs(parameters, work_directory)
+        output_path = os.path.join(work_directory, "output.mpg")
+        for name in benchmarks:
+            measurements: list[BenchmarkMeasurement] = []
+            for duration, es_path, ps_path in inputs:
+                # Fresh process for peak RSS of this measurement only
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    measurements.append(
+                        executor.submit(
+                            DamMpeg2PsBenchmark.measure,
+                            name,
+                            duration,
+                            es_path,
+                            ps_path,
+                            output_path,
+                            parameters.repeat,
+                        ).result()
+                    )
+            yield BenchmarkResult(
+                name, measurements, DamMpeg2PsBenchmark.scaling_exponent(measurements)
+            )
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+    @staticmethod
+    def make_report(parameters: BenchmarkParameters, results: list[BenchmarkResult]):
+        """Make a JSON serializable report
+
+        Args:
+            parameters (BenchmarkParameters): Parameters
+            results (list[BenchmarkResult]): Results
+
+        Returns:
+            dict: Report
+        """
+
+        return {
+            "version": DamMpeg2PsBenchmark.REPORT_VERSION,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": parameters._asdict(),
+            "results": [
+                {
+                    "name": result.name,
+                    "scaling_exponent": result.scaling_exponent,
+                    "measurements": [
+                        measurement._asdict() for measurement in result.measurements
+                    ],
+                }
+                for result in results
+            ],
+        }
+
+    @staticmethod
+    def compare(report: dict, baseline: dict, threshold: float):
+        """Compare a report against a baseline report
+
+        Measurements are matched by benchmark name and duration. A throughput drop or peak RSS growth over the threshold, or a scaling exponent growth over 0.1 is a regression.
+
+        Args:
+            report (dict): Report
+            baseline (dict): Baseline report
+            threshold (float): Tolerance ratio of throughput and peak RSS
+
+        Returns:
+            list[str]: Regressions
+        """
+
+        if baseline.get("version") != DamMpeg2PsBenchmark.REPORT_VERSION:
+            raise RuntimeError("Invalid baseline version.")
+        baseline_results = {result["name"]: result for result in baseline["results"]}
+        regressions: list[str] = []
+        for result in report["results"]:
+            baseline_result = baseline_results.get(result["name"])
+            if baseline_result is None:
+                continue
+            baseline_measurements = {
+                measurement["duration"]: measurement
+                for measurement in baseline_result["measurements"]
+            }
+            for measurement in result["measurements"]:
+                baseline_measurement = baseline_measurements.get(
+                    measurement["duration"]
+                )
+                if baseline_measurement is None:
+                    continue
+                label = f"{result['name']} duration={measurement['duration']:g}s"
+                if measurement["throughput"] < baseline_measurement["throughput"] * (
+                    1 - threshold
+                ):
+                    regressions.append(
+                        f"{label} throughput={measurement['throughput']:.2f}MB/s baseline={baseline_measurement['throughput']:.2f}MB/s"
+                    )
+                if baseline_measurement["peak_rss"] * (1 + threshold) < measurement[
+                    "peak_rss"
+                ]:
+                    regressions.append(
+                        f"{label} peak_rss={measurement['peak_rss'] / 1048576:.1f}MiB baseline={baseline_measurement['peak_rss'] / 1048576:.1f}MiB"
+                    )
+            if (
+                result["scaling_exponent"] is not None
+                and baseline_result["scaling_exponent"] is not None
+                and baseline_result["scaling_exponent"]
+                + DamMpeg2PsBenchmark.__SCALING_EXPONENT_TOLERANCE
+                < result["scaling_exponent"]
+            ):
+                regressions.append(
+                    f"{result['name']} scaling_exponent={result['scaling_exponent']:.2f} baseline={baseline_result['scaling_exponent']:.2f}"
+                )
+        return regressions
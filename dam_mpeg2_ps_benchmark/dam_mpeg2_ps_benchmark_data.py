@@ -0,0 +1,26 @@
+from typing import NamedTuple
+
+
+class BenchmarkParameters(NamedTuple):
+    durations: list[float]
+    frame_rate: str
+    gop_length: int
+    slice_size: int
+    idr_slice_size: int
+    emulation_density: float
+    seed: int
+    repeat: int
+
+
+class BenchmarkMeasurement(NamedTuple):
+    duration: float
+    size: int
+    seconds: float
+    throughput: float
+    peak_rss: int
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    measurements: list[BenchmarkMeasurement]
+    scaling_exponent: float | None
@@ -0,0 +1,108 @@
+from fractions import Fraction
+import io
+import random
+
+
+class SyntheticH264Es:
+    """Deterministic synthetic H.264-ES
+
+    Access units are an Access Unit Delimiter and a slice, and every GOP starts with SPS, PPS and an IDR slice. Slice data is pseudo-random without zero bytes, except for planted emulation prevention sequences (0x000003XX), so the same parameters always produce the same bytes.
+    """
+
+    # Access Unit Delimiter (primary_pic_type=7)
+    __ACCESS_UNIT_DELIMITER = b"\x00\x00\x00\x01\x09\xf0"
+    # Sequence Parameter Set (High profile, Level 4.0, 1920x1080)
+    __SEQUENCE_PARAMETER_SET = (
+        b"\x00\x00\x00\x01\x67\x64\x00\x28\xac\xd9\x40\x78\x02\x27\xe5\x84"
+        b"\x00\x00\x03\x00\x04\x00\x00\x03\x00\xf0\x3c\x60\xc6\x58"
+    )
+    # Picture Parameter Set
+    __PICTURE_PARAMETER_SET = b"\x00\x00\x00\x01\x68\xeb\xe3\xcb\x22\xc0"
+    __IDR_SLICE_PREFIX = b"\x00\x00\x01\x65"
+    __NON_IDR_SLICE_PREFIX = b"\x00\x00\x01\x41"
+    __POOL_SIZE = 4 * 1024 * 1024
+
+    @staticmethod
+    def __make_pool(emulation_density: float, seed: int):
+        random_source = random.Random(seed)
+        # Map zero bytes to non-zero, start codes are not emulated by chance
+        pool = bytearray(
+            random_source.randbytes(SyntheticH264Es.__POOL_SIZE).translate(
+                bytes([0x80]) + bytes(range(1, 256))
+            )
+        )
+        escape_count = int(SyntheticH264Es.__POOL_SIZE * emulation_density / 1024)
+        positions = sorted(
+            random_source.randrange(SyntheticH264Es.__POOL_SIZE - 4)
+            for _ in range(escape_count)
+        )
+        end_position = 0
+        for position in positions:
+            # Escape sequences do not overlap
+            if position < end_position:
+                continue
+            pool[position : position + 4] = bytes(
+                (0x00, 0x00, 0x03, random_source.randrange(4))
+            )
+            end_position = position + 4
+        return bytes(pool)
+
+    @staticmethod
+    def write(
+        stream: io.BufferedWriter,
+        duration: float,
+        frame_rate: Fraction = Fraction(30000, 1001),
+        gop_length: int = 30,
+        slice_size: int = 4000,
+        idr_slice_size: int = 40000,
+        emulation_density: float = 1.0,
+        seed: int = 0,
+    ):
+        """Write synthetic H.264-ES
+
+        Args:
+            stream (io.BufferedWriter): Writable stream of H.264-ES
+            duration (float): Duration (sec)
+            frame_rate (Fraction, optional): Frame rate. Defaults to 30000/1001.
+            gop_length (int, optional): Picture count of a GOP. Defaults to 30.
+            slice_size (int, optional): Size of non-IDR slice data. Defaults to 4000.
+            idr_slice_size (int, optional): Size of IDR slice data. Defaults to 40000.
+            emulation_density (float, optional): Emulation prevention sequences per KiB of slice data. Defaults to 1.0.
+            seed (int, optional): Seed of slice data. Defaults to 0.
+
+        Returns:
+            tuple[int, int]: Written size and picture count
+        """
+
+        if gop_length < 1 or slice_size < 1 or idr_slice_size < 1:
+            raise RuntimeError("Invalid GOP length or slice size.")
+        if SyntheticH264Es.__POOL_SIZE < max(slice_size, idr_slice_size):
+            raise RuntimeError("Invalid slice size.")
+
+        pool = SyntheticH264Es.__make_pool(emulation_density, seed)
+        picture_count = round(duration * frame_rate)
+        written_size = 0
+        pool_position = 0
+        for picture_number in range(picture_count):
+            is_idr = picture_number % gop_length == 0
+            size = idr_slice_size if is_idr else slice_size
+            if len(pool) < pool_position + size:
+                pool_position = 0
+            # Do not end with a part of an escape sequence, then rbsp_stop_one_bit
+            slice_data = (
+                pool[pool_position : pool_position + size - 1].rstrip(b"\x00\x03")
+                + b"\x80"
+            )
+            pool_position += size
+
+            access_unit_buffer = bytearray(SyntheticH264Es.__ACCESS_UNIT_DELIMITER)
+            if is_idr:
+                access_unit_buffer += SyntheticH264Es.__SEQUENCE_PARAMETER_SET
+                access_unit_buffer += SyntheticH264Es.__PICTURE_PARAMETER_SET
+                access_unit_buffer += SyntheticH264Es.__IDR_SLICE_PREFIX
+            else:
+                access_unit_buffer += SyntheticH264Es.__NON_IDR_SLICE_PREFIX
+            access_unit_buffer += slice_data
+            stream.write(access_unit_buffer)
+            written_size += len(access_unit_buffer)
+        return written_size, picture_count
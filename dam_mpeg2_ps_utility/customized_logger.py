@@ -1,16 +1,84 @@
-from logging import getLogger as loggingGetLogger, Formatter, StreamHandler, DEBUG
+from datetime import datetime, timezone
+import json
+from logging import (
+    getLogger as loggingGetLogger,
+    Formatter,
+    Handler,
+    LogRecord,
+    StreamHandler,
+    INFO,
+)
 import sys
+from typing import TextIO
+
+ROOT_LOGGER_NAME = "dam_mpeg2_ps_utility"
+LOG_LEVELS = ("debug", "info", "warning", "error", "critical")
+LOG_FORMATS = ("text", "json")
+
+_handler: Handler | None = None
+
+
+class JsonFormatter(Formatter):
+    """Formatter of a JSON object per line"""
+
+    def format(self, record: LogRecord):
+        log = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "function": record.funcName,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        if record.exc_info is not None:
+            log["exception"] = self.formatException(record.exc_info)
+        return json.dumps(log, ensure_ascii=False)
 
 
 def getLogger(name: str):
-    logger = loggingGetLogger(name)
-    logger.setLevel(DEBUG)
-    log_handler = StreamHandler(sys.stdout)
-    log_handler.setLevel(DEBUG)
-    log_handler.setFormatter(
-        Formatter(
+    """Get a logger under the package logger
+
+    No handler and level are set, so messages below the configured level are dropped before formatting.
+
+    Args:
+        name (str): Logger name
+
+    Returns:
+        Logger: Logger
+    """
+
+    return loggingGetLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def configure_logger(
+    level: int | str = INFO, log_format: str = "text", stream: TextIO | None = None
+):
+    """Configure the package logger
+
+    The handler of the previous call is replaced, so handlers are never duplicated. Without a call, warnings and errors go to stderr by the last resort handler of logging.
+
+    Args:
+        level (int | str, optional): Log level, such as logging.DEBUG or "debug". Defaults to INFO.
+        log_format (str, optional): "text" or "json". Defaults to "text".
+        stream (TextIO | None, optional): Output stream. Defaults to None (stderr).
+    """
+
+    global _handler
+
+    if log_format not in LOG_FORMATS:
+        raise RuntimeError("Invalid log format.")
+    root_logger = loggingGetLogger(ROOT_LOGGER_NAME)
+    root_logger.setLevel(level.upper() if isinstance(level, str) else level)
+    if _handler is not None:
+        root_logger.removeHandler(_handler)
+    _handler = StreamHandler(sys.stderr if stream is None else stream)
+    _handler.setFormatter(
+        JsonFormatter()
+        if log_format == "json"
+        else Formatter(
             "[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s"
         )
     )
-    logger.addHandler(log_handler)
-    return logger
+    root_logger.addHandler(_handler)
+    # Not printed again by handlers of the application
+    root_logger.propagate = False
@@ -1,11 +1,20 @@
 import bitstring
 from enum import Flag, auto
+import io
+import struct
+import time
 
 from dam_mpeg2_ps_utility.customized_logger import getLogger
-from dam_mpeg2_ps_utility.dam_mpeg2_ps_generator_data import GopIndexEntry, GopIndex
+from dam_mpeg2_ps_utility.dam_mpeg2_ps_generator_data import (
+    GopIndexEntry,
+    GopIndexEntries,
+    GopIndex,
+    GopIndexPage,
+)
 from dam_mpeg2_ps_utility.mpeg2_ps import Mpeg2Ps
 from dam_mpeg2_ps_utility.mpeg2_ps_data import (
     Mpeg2PesPacketType2,
+    Mpeg2PesPacketType3,
     Mpeg2PsPackHeader,
     Mpeg2PsSystemHeader,
     Mpeg2PsSystemHeaderPStdInfo,
@@ -16,6 +25,8 @@ from dam_mpeg2_ps_utility.mpeg2_ps_data import (
     Mpeg2PsElementaryStreamMapEntry,
     Mpeg2PsProgramStreamMap,
 )
+from dam_mpeg2_ps_utility.profiler import Profiler
+from dam_mpeg2_ps_utility.stream_copy import StreamCopy
 
 
 class DamMpeg2PsCodec(Flag):
@@ -29,72 +40,309 @@ class DamMpeg2Ps:
     """DAM compatible MPEG2-PS"""
 
     __GOP_INDEX_HEADER_SIZE = 6
+    # sub_stream_id, version, stream_id, page_number and page_count, gop_count - 1
+    __GOP_INDEX_HEADER = struct.Struct(">BBBBH")
     __GOP_INDEX_ENTRY_SIZE = 12
+    # Entries fit in PES_packet_length
+    __GOP_INDEX_PAGE_CAPACITY = (0xFFFF - __GOP_INDEX_HEADER_SIZE) // __GOP_INDEX_ENTRY_SIZE
+    # page_count is 4 bits of the last page number
+    __GOP_INDEX_MAX_PAGE_COUNT = 16
+    # PES packet header and the first NAL units of an access unit fit in
+    __ACCESS_UNIT_PROBE_SIZE = 4096
 
     __logger = getLogger("DamMpeg2Ps")
 
     @staticmethod
-    def __size_of_gop_index_pes_packet_bytes(index: GopIndex):
-        # NAL unit prefix + NAL unit header + ...
+    def __count_gop_index_pages(gop_count: int):
+        capacity = DamMpeg2Ps.__GOP_INDEX_PAGE_CAPACITY
+        return max((gop_count + capacity - 1) // capacity, 1)
+
+    @staticmethod
+    def __size_of_gop_index_pes_packet_bytes(gop_count: int):
+        # NAL unit prefix + NAL unit header + ... of each page
         return (
-            6
-            + DamMpeg2Ps.__GOP_INDEX_HEADER_SIZE
-            + len(index.gops) * DamMpeg2Ps.__GOP_INDEX_ENTRY_SIZE
+            DamMpeg2Ps.__count_gop_index_pages(gop_count)
+            * (6 + DamMpeg2Ps.__GOP_INDEX_HEADER_SIZE)
+            + gop_count * DamMpeg2Ps.__GOP_INDEX_ENTRY_SIZE
         )
 
+    @staticmethod
+    def paginate_gop_index(gop_index: GopIndex):
+        """Split GOP index into pages
+
+        Args:
+            gop_index (GopIndex): GOP index
+
+        Returns:
+            list[GopIndex]: Pages of GOP index
+        """
+
+        gops = gop_index.gops
+        if not isinstance(gops, GopIndexEntries):
+            gops = GopIndexEntries(gops)
+        capacity = DamMpeg2Ps.__GOP_INDEX_PAGE_CAPACITY
+        page_count = DamMpeg2Ps.__count_gop_index_pages(len(gops))
+        if DamMpeg2Ps.__GOP_INDEX_MAX_PAGE_COUNT < page_count:
+            raise RuntimeError("Invalid GOP count.")
+        return [
+            gop_index._replace(
+                page_number=page_number,
+                page_count=page_count - 1,
+                gops=gops[page_number * capacity : (page_number + 1) * capacity],
+            )
+            for page_number in range(page_count)
+        ]
+
+    @staticmethod
+    def merge_gop_index(pages: list[GopIndex]):
+        """Merge pages of GOP index
+
+        Args:
+            pages (list[GopIndex]): Pages of GOP index in order
+
+        Returns:
+            GopIndex | None: GOP index, None if pages are missing
+        """
+
+        if len(pages) == 0 or pages[-1].page_number != pages[-1].page_count:
+            DamMpeg2Ps.__logger.warning("Invalid GOP index page.")
+            return
+        gops = GopIndexEntries()
+        for page_number, page in enumerate(pages):
+            if page.page_number != page_number or page.page_count != pages[0].page_count:
+                DamMpeg2Ps.__logger.warning("Invalid GOP index page.")
+                return
+            gops.extend(
+                page.gops
+                if isinstance(page.gops, GopIndexEntries)
+                else GopIndexEntries(page.gops)
+            )
+        return pages[0]._replace(gops=gops)
+
     @staticmethod
     def __serialize_gop_index(gop_index: GopIndex):
-        stream = bitstring.BitStream()
-        stream += bitstring.pack(
-            "uint:8, uint:8, uint:8, uint:4, uint:4, uintbe:16",
+        gops = gop_index.gops
+        if not isinstance(gops, GopIndexEntries):
+            gops = GopIndexEntries(gops)
+        header = DamMpeg2Ps.__GOP_INDEX_HEADER.pack(
             gop_index.sub_stream_id,
             gop_index.version,
             gop_index.stream_id,
-            gop_index.page_number,
-            gop_index.page_count,
-            len(gop_index.gops) - 1,
+            gop_index.page_number << 4 | gop_index.page_count,
+            len(gops) - 1,
         )
-        for gop in gop_index.gops:
-            stream += bitstring.pack(
-                "uintbe:40, uintbe:24, uintbe:32",
-                gop.ps_pack_header_position,
-                gop.access_unit_size,
-                gop.pts,
-            )
-        return stream.tobytes()
+        return header + gops.to_bytes()
+
+    @staticmethod
+    def read_gop_index(stream: bitstring.BitStream | bytes | bytearray | memoryview):
+        """Read GOP index
+
+        Args:
+            stream (bitstring.BitStream | bytes | bytearray | memoryview): BitStream at GOP index or bytes of GOP index
+
+        Returns:
+            GopIndex | None: GOP index, None if invalid
+        """
+
+        profiler = Profiler.current
+        if profiler is None:
+            return DamMpeg2Ps.__read_gop_index(stream)
+        start_time = time.perf_counter()
+        gop_index = DamMpeg2Ps.__read_gop_index(stream)
+        profiler.add(
+            "dam_mpeg2_ps.read_gop_index",
+            time.perf_counter() - start_time,
+            gops=0 if gop_index is None else len(gop_index.gops),
+        )
+        return gop_index
 
     @staticmethod
-    def read_gop_index(stream: bitstring.BitStream):
-        gops: list[GopIndexEntry] = []
+    def __read_gop_index(
+        stream: bitstring.BitStream | bytes | bytearray | memoryview,
+    ):
+        if isinstance(stream, bitstring.BitStream):
+            header_buffer: bytes = stream.read(
+                f"bytes:{DamMpeg2Ps.__GOP_INDEX_HEADER_SIZE}"
+            )
+        else:
+            buffer = memoryview(stream)
+            header_buffer = bytes(buffer[: DamMpeg2Ps.__GOP_INDEX_HEADER_SIZE])
+            if len(header_buffer) < DamMpeg2Ps.__GOP_INDEX_HEADER_SIZE:
+                DamMpeg2Ps.__logger.warning("Invalid GOP index length.")
+                return
+        (
+            sub_stream_id,
+            version,
+            stream_id,
+            page,
+            gop_count,
+        ) = DamMpeg2Ps.__GOP_INDEX_HEADER.unpack(header_buffer)
+        gop_count += 1
 
-        sub_stream_id: int = stream.read("uint:8")
-        version: int = stream.read("uint:8")
-        stream_id: int = stream.read("uint:8")
-        page_number: int = stream.read("uint:4")
-        page_count: int = stream.read("uint:4")
-        gop_count: int = stream.read("uintbe:16") + 1
-        for _ in range(gop_count):
-            ps_pack_header_position: int = stream.read("uintbe:40")
-            access_unit_size: int = stream.read("uintbe:24")
-            pts: int = stream.read("uintbe:32")
-            gops.append(GopIndexEntry(ps_pack_header_position, access_unit_size, pts))
+        entries_size = gop_count * DamMpeg2Ps.__GOP_INDEX_ENTRY_SIZE
+        if isinstance(stream, bitstring.BitStream):
+            if (len(stream) - stream.pos) // 8 < entries_size:
+                DamMpeg2Ps.__logger.warning("Invalid GOP index length.")
+                return
+            entries_buffer: bytes = stream.read(f"bytes:{entries_size}")
+        else:
+            entries_buffer = buffer[
+                DamMpeg2Ps.__GOP_INDEX_HEADER_SIZE : DamMpeg2Ps.__GOP_INDEX_HEADER_SIZE
+                + entries_size
+            ]
+            if len(entries_buffer) < entries_size:
+                DamMpeg2Ps.__logger.warning("Invalid GOP index length.")
+                return
 
         return GopIndex(
-            sub_stream_id, version, stream_id, page_number, page_count, gops
+            sub_stream_id,
+            version,
+            stream_id,
+            page >> 4,
+            page & 0x0F,
+            GopIndexEntries.from_bytes(entries_buffer),
         )
 
     @staticmethod
-    def load_gop_index(stream: bitstring.BitStream):
-        packet_id = Mpeg2Ps.seek_packet(stream, 0xBF)
-        if packet_id is None:
-            DamMpeg2Ps.__logger.warning("GOP index not found.")
+    def load_gop_index(source: str | io.BufferedReader | bitstring.BitStream):
+        """Load GOP index
+
+        Pages of GOP index are merged. For a file, only the container header and the GOP index packets at the front of the file are read.
+
+        Args:
+            source (str | io.BufferedReader | bitstring.BitStream): File path, readable and seekable stream or BitStream of DAM compatible MPEG2-PS
+
+        Returns:
+            GopIndex | None: GOP index, None if not found
+        """
+
+        if isinstance(source, bitstring.BitStream):
+            packet_id = Mpeg2Ps.seek_packet(source, 0xBF)
+            if packet_id is None:
+                DamMpeg2Ps.__logger.warning("GOP index not found.")
+                return
+            pages: list[GopIndex] = []
+            while True:
+                pes_packet = Mpeg2Ps.read_pes_packet(source)
+                if pes_packet is None:
+                    DamMpeg2Ps.__logger.warning("Invalid pes_packet.")
+                    return
+                page = DamMpeg2Ps.read_gop_index(pes_packet.PES_packet_data)
+                if page is None:
+                    return
+                pages.append(page)
+                if (
+                    page.page_count <= page.page_number
+                    or source.len - source.pos < 32
+                    or Mpeg2Ps.peek_packet_id(source) != 0xBF
+                ):
+                    break
+            return DamMpeg2Ps.merge_gop_index(pages)
+
+        if isinstance(source, str):
+            with open(source, "rb") as stream:
+                return DamMpeg2Ps.load_gop_index(stream)
+
+        index_pages = DamMpeg2Ps.read_gop_index_pages(source)
+        if index_pages is None:
             return
-        pes_packet = Mpeg2Ps.read_pes_packet(stream)
-        if pes_packet is None:
-            DamMpeg2Ps.__logger.warning("Invalid pes_packet.")
+        pages = []
+        for index_page in index_pages:
+            page = DamMpeg2Ps.read_gop_index_page(source, index_page)
+            if page is None:
+                return
+            pages.append(page)
+        return DamMpeg2Ps.merge_gop_index(pages)
+
+    @staticmethod
+    def read_gop_index_pages(stream: io.BufferedReader):
+        """Read headers of GOP index pages
+
+        Only the container header and the header and first entry of each GOP index page at the front of the file are read.
+
+        Args:
+            stream (io.BufferedReader): Readable and seekable stream of DAM compatible MPEG2-PS
+
+        Returns:
+            list[GopIndexPage] | None: GOP index pages, None if not found
+        """
+
+        # PES packet header + GOP index header + First entry
+        header_size = (
+            6 + DamMpeg2Ps.__GOP_INDEX_HEADER_SIZE + DamMpeg2Ps.__GOP_INDEX_ENTRY_SIZE
+        )
+        pages: list[GopIndexPage] = []
+        first_gop_number = 0
+        position = 0
+        while True:
+            stream.seek(position)
+            header = stream.read(header_size)
+            packet_size = Mpeg2Ps.size_of_packet(header[:14])
+            # GOP index follows container header
+            if packet_size is None or header[3] not in (0xBA, 0xBB, 0xBC, 0xBF):
+                DamMpeg2Ps.__logger.warning("GOP index not found.")
+                return
+            if header[3] != 0xBF:
+                if len(pages) != 0:
+                    DamMpeg2Ps.__logger.warning("Invalid GOP index page.")
+                    return
+                position += packet_size
+                continue
+
+            if len(header) < header_size:
+                DamMpeg2Ps.__logger.warning("Truncated GOP index.")
+                return
+            _, _, _, page, gop_count = DamMpeg2Ps.__GOP_INDEX_HEADER.unpack_from(
+                header, 6
+            )
+            gop_count += 1
+            page_number = page >> 4
+            page_count = page & 0x0F
+            if (
+                page_number != len(pages)
+                or (len(pages) != 0 and page_count != pages[0].page_count)
+                or packet_size
+                < 6
+                + DamMpeg2Ps.__GOP_INDEX_HEADER_SIZE
+                + gop_count * DamMpeg2Ps.__GOP_INDEX_ENTRY_SIZE
+            ):
+                DamMpeg2Ps.__logger.warning("Invalid GOP index page.")
+                return
+            first_pts = int.from_bytes(header[header_size - 4 :], byteorder="big")
+            pages.append(
+                GopIndexPage(
+                    position,
+                    packet_size,
+                    page_number,
+                    page_count,
+                    first_gop_number,
+                    gop_count,
+                    first_pts,
+                )
+            )
+            if page_count <= page_number:
+                return pages
+            first_gop_number += gop_count
+            position += packet_size
+
+    @staticmethod
+    def read_gop_index_page(stream: io.BufferedReader, page: GopIndexPage):
+        """Read a GOP index page
+
+        Args:
+            stream (io.BufferedReader): Readable and seekable stream of DAM compatible MPEG2-PS
+            page (GopIndexPage): GOP index page
+
+        Returns:
+            GopIndex | None: Page of GOP index, None if invalid
+        """
+
+        stream.seek(page.position + 6)
+        buffer = stream.read(page.size - 6)
+        if len(buffer) < page.size - 6:
+            DamMpeg2Ps.__logger.warning("Truncated GOP index.")
             return
-        gop_index_stream = bitstring.BitStream(pes_packet.PES_packet_data)
-        return DamMpeg2Ps.__read_gop_index(gop_index_stream)
+        return DamMpeg2Ps.read_gop_index(buffer)
 
     @staticmethod
     def write_gop_index(
@@ -118,26 +366,260 @@ class DamMpeg2Ps:
         input_stream.bytepos = start_position
         output_stream.append(input_stream.read(8 * copy_size))
 
-        pes_packet_size = DamMpeg2Ps.__size_of_gop_index_pes_packet_bytes(gop_index)
-        # Adjust MPEG2-PS Pack Header position
-        for i in range(len(gop_index.gops)):
-            gop = gop_index.gops[i]
-            gop_index.gops[i] = GopIndexEntry(
-                start_position + pes_packet_size + gop.ps_pack_header_position,
-                gop.access_unit_size,
-                gop.pts,
-            )
-        gop_index_buffer = DamMpeg2Ps.__serialize_gop_index(gop_index)
-        # Allow 0x000001 (Violation of standards), Do not emulation prevention
-        Mpeg2Ps.write_pes_packet(
-            output_stream, Mpeg2PesPacketType2(0xBF, gop_index_buffer)
+        output_stream.append(
+            DamMpeg2Ps.__build_gop_index_pes_packets(gop_index, start_position)
         )
 
         # Copy stream
         output_stream.append(input_stream.read("bytes"))
 
     @staticmethod
-    def write_container_header(stream: bitstring.BitStream, codec: DamMpeg2PsCodec):
+    def __build_gop_index_pes_packets(gop_index: GopIndex, offset: int):
+        profiler = Profiler.current
+        if profiler is not None:
+            start_time = time.perf_counter()
+        gops = gop_index.gops
+        if not isinstance(gops, GopIndexEntries):
+            gops = GopIndexEntries(gops)
+        pes_packet_size = DamMpeg2Ps.__size_of_gop_index_pes_packet_bytes(len(gops))
+        # Adjust MPEG2-PS Pack Header position
+        gops.offset_ps_pack_header_position(offset + pes_packet_size)
+        if gops is not gop_index.gops:
+            gop_index.gops[:] = gops
+        buffer = bytearray()
+        for page in DamMpeg2Ps.paginate_gop_index(gop_index._replace(gops=gops)):
+            gop_index_buffer = DamMpeg2Ps.__serialize_gop_index(page)
+            # Allow 0x000001 (Violation of standards), Do not emulation prevention
+            Mpeg2Ps.write_pes_packet(buffer, Mpeg2PesPacketType2(0xBF, gop_index_buffer))
+        if profiler is not None:
+            profiler.add(
+                "dam_mpeg2_ps.write_gop_index",
+                time.perf_counter() - start_time,
+                bytes=len(buffer),
+                gops=len(gops),
+            )
+        return buffer
+
+    @staticmethod
+    def write_gop_index_stream(
+        output_stream: io.BufferedWriter,
+        header_buffer: bytes | bytearray | memoryview,
+        gop_index: GopIndex,
+        body: io.BufferedReader | bytes | bytearray | memoryview | None = None,
+    ):
+        """Write container header, GOP index and body to a file
+
+        Unlike write_gop_index, the container header is given as is and the body is not copied through BitStream. A body in a file is copied in the kernel by StreamCopy.
+
+        Args:
+            output_stream (io.BufferedWriter): Writable stream of DAM compatible MPEG2-PS
+            header_buffer (bytes | bytearray | memoryview): Container header
+            gop_index (GopIndex): GOP index, MPEG2-PS Pack Header positions are relative to the container header and adjusted in place
+            body (io.BufferedReader | bytes | bytearray | memoryview | None, optional): Body following the container header, a stream is copied from its current position. Defaults to None (Write the body separately).
+        """
+
+        output_stream.write(header_buffer)
+        output_stream.write(DamMpeg2Ps.__build_gop_index_pes_packets(gop_index, 0))
+        if body is None:
+            return
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            output_stream.write(body)
+            return
+        StreamCopy.copy(body, output_stream)
+
+    @staticmethod
+    def __has_sps(buffer: bytes):
+        # Search NAL units before the first picture
+        position = buffer.find(b"\x00\x00\x01")
+        while position != -1 and position + 3 < len(buffer):
+            nal_unit_type = buffer[position + 3] & 0x1F
+            # Sequence Parameter Set
+            if nal_unit_type == 0x07:
+                return True
+            # Picture's NAL unit
+            if nal_unit_type == 0x01 or nal_unit_type == 0x05:
+                return False
+            position = buffer.find(b"\x00\x00\x01", position + 3)
+
+    @staticmethod
+    def __scan_gop(stream: io.BufferedReader):
+        header_size: int | None = None
+        reserved_size = 0
+        body_detected = False
+        ps_pack_header_position: int | None = None
+        program_end_position: int | None = None
+        gop_positions: list[int] = []
+        gop_pts_list: list[int] = []
+        last_pts: int | None = None
+        max_pts: int | None = None
+        picture_duration: int | None = None
+
+        stream.seek(0, io.SEEK_END)
+        stream_size = stream.tell()
+        stream.seek(0)
+        for position, packet_size in Mpeg2Ps.iter_packet_index(stream):
+            stream.seek(position)
+            buffer = stream.read(min(packet_size, DamMpeg2Ps.__ACCESS_UNIT_PROBE_SIZE))
+            packet_id = buffer[3]
+
+            # Container header ends with first MPEG2-PS Program Stream Map
+            if header_size is None:
+                if packet_id == 0xBC:
+                    header_size = position + packet_size
+                elif packet_id not in (0xBA, 0xBB):
+                    DamMpeg2Ps.__logger.warning(
+                        "First MPEG2-PS Program Stream Map not found."
+                    )
+                    return
+                continue
+            # GOP index and padding following container header are replaced
+            if not body_detected and packet_id in (0xBF, 0xBE):
+                reserved_size += packet_size
+                continue
+            body_detected = True
+
+            if packet_id == 0xBA:
+                ps_pack_header_position = position
+                continue
+            if packet_id == 0xB9:
+                program_end_position = position
+                continue
+            # Video stream with PTS
+            if (
+                packet_id != 0xE0
+                or len(buffer) < 14
+                or buffer[6] & 0xC0 != 0x80
+                or buffer[7] & 0x80 == 0
+            ):
+                continue
+            pts = Mpeg2Ps.decode_timestamp(buffer[9:14])
+            if last_pts is not None and last_pts != pts:
+                duration = abs(pts - last_pts)
+                if picture_duration is None or duration < picture_duration:
+                    picture_duration = duration
+            last_pts = pts
+            max_pts = pts if max_pts is None else max(max_pts, pts)
+
+            PES_packet_data_position = 9 + buffer[8]
+            has_sps = DamMpeg2Ps.__has_sps(buffer[PES_packet_data_position:])
+            if has_sps is None and len(buffer) < packet_size:
+                buffer += stream.read(packet_size - len(buffer))
+                has_sps = DamMpeg2Ps.__has_sps(buffer[PES_packet_data_position:])
+            if not has_sps:
+                continue
+            gop_position = (
+                ps_pack_header_position
+                if ps_pack_header_position is not None
+                else position
+            )
+            gop_positions.append(gop_position)
+            gop_pts_list.append(pts)
+            program_end_position = None
+
+        if header_size is None:
+            DamMpeg2Ps.__logger.warning("First MPEG2-PS Program Stream Map not found.")
+            return
+        if len(gop_positions) == 0:
+            DamMpeg2Ps.__logger.warning("GOP not found.")
+            return
+
+        gops = GopIndexEntries()
+        end_positions = gop_positions[1:] + [
+            program_end_position if program_end_position is not None else stream_size
+        ]
+        for gop_position, end_position, pts in zip(
+            gop_positions, end_positions, gop_pts_list
+        ):
+            gops.append(GopIndexEntry(gop_position, end_position - gop_position, pts))
+        # Estimated PTS after the last picture
+        program_end_pts = max_pts + (
+            picture_duration if picture_duration is not None else 0
+        )
+        gops.append(GopIndexEntry(stream_size, 0, program_end_pts))
+        return gops, header_size, reserved_size
+
+    @staticmethod
+    def restamp_gop_index(
+        input_stream: io.BufferedRandom | io.BufferedReader,
+        output_stream: io.BufferedWriter | None = None,
+    ):
+        """Write GOP index of an existing MPEG2-PS of H.264
+
+        The input is scanned once by packet headers. A GOP starts at the MPEG2-PS Pack Header preceding the access unit with a Sequence Parameter Set. GOP index and padding packets following the container header are replaced.
+
+        Args:
+            input_stream (io.BufferedRandom | io.BufferedReader): Readable and seekable stream of MPEG2-PS
+            output_stream (io.BufferedWriter | None, optional): Writable stream of DAM compatible MPEG2-PS. Defaults to None (Patch the input in place, it must be writable and have enough GOP index and padding packets).
+
+        Returns:
+            GopIndex | None: Written GOP index, None if failed
+        """
+
+        profiler = Profiler.current
+        if profiler is not None:
+            start_time = time.perf_counter()
+        scan_result = DamMpeg2Ps.__scan_gop(input_stream)
+        if profiler is not None:
+            profiler.add("dam_mpeg2_ps.scan_gop", time.perf_counter() - start_time)
+        if scan_result is None:
+            return
+        gops, header_size, reserved_size = scan_result
+        body_position = header_size + reserved_size
+        # First GOP starts in container header
+        if gops.ps_pack_header_position[0] < body_position:
+            gops.access_unit_size[0] -= (
+                body_position - gops.ps_pack_header_position[0]
+            )
+            gops.ps_pack_header_position[0] = body_position
+
+        gop_index_size = DamMpeg2Ps.__size_of_gop_index_pes_packet_bytes(len(gops))
+        padding_size = 0
+        if output_stream is None:
+            padding_size = reserved_size - gop_index_size
+            if padding_size < 0 or 0 < padding_size < 6:
+                DamMpeg2Ps.__logger.warning("Insufficient space for GOP index.")
+                return
+        else:
+            gops.offset_ps_pack_header_position(
+                header_size + gop_index_size - body_position
+            )
+        gop_index = GopIndex(0xFF, 0x01, 0xE0, 0x0, 0x0, gops)
+
+        gop_index_buffer = bytearray()
+        for page in DamMpeg2Ps.paginate_gop_index(gop_index):
+            # Allow 0x000001 (Violation of standards), Do not emulation prevention
+            Mpeg2Ps.write_pes_packet(
+                gop_index_buffer,
+                Mpeg2PesPacketType2(0xBF, DamMpeg2Ps.__serialize_gop_index(page)),
+            )
+        while padding_size != 0:
+            # Padding stream
+            PES_packet_length = min(padding_size - 6, 0xFFFF)
+            if padding_size - 6 - PES_packet_length != 0:
+                # Keep space for the next packet header
+                PES_packet_length = min(PES_packet_length, padding_size - 12)
+            Mpeg2Ps.write_pes_packet(
+                gop_index_buffer, Mpeg2PesPacketType3(0xBE, PES_packet_length)
+            )
+            padding_size -= 6 + PES_packet_length
+
+        if output_stream is None:
+            input_stream.seek(header_size)
+            input_stream.write(gop_index_buffer)
+            input_stream.flush()
+            return gop_index
+
+        input_stream.seek(0)
+        output_stream.write(input_stream.read(header_size))
+        output_stream.write(gop_index_buffer)
+        input_stream.seek(body_position)
+        StreamCopy.copy(input_stream, output_stream)
+        return gop_index
+
+    @staticmethod
+    def write_container_header(
+        stream: bitstring.BitStream | bytearray, codec: DamMpeg2PsCodec
+    ):
         Mpeg2Ps.write_ps_pack_header(stream, Mpeg2PsPackHeader(0, 0, 20000, 0))
         Mpeg2Ps.write_ps_system_header(
             stream,
@@ -0,0 +1,1040 @@
+import asyncio
+import bitstring
+from concurrent.futures import Executor, ProcessPoolExecutor
+import contextlib
+from fractions import Fraction
+import io
+import os
+import tempfile
+import threading
+import time
+from typing import AsyncIterable, Iterable
+
+from dam_mpeg2_ps_utility.customized_logger import getLogger
+from dam_mpeg2_ps_utility.dam_mpeg2_ps import DamMpeg2Ps, DamMpeg2PsCodec
+from dam_mpeg2_ps_utility.dam_mpeg2_ps_generator_data import (
+    GopIndexEntry,
+    GopIndexEntries,
+    GopIndex,
+)
+from dam_mpeg2_ps_utility.h264_annex_b import H264AnnexB
+from dam_mpeg2_ps_utility.h264_annex_b_data import H264NalUnit, H264NalUnitRange
+from dam_mpeg2_ps_utility.index_cache import IndexCache, IndexCacheWriter
+from dam_mpeg2_ps_utility.mpeg2_ps import Mpeg2Ps
+from dam_mpeg2_ps_utility.mpeg2_ps_clock import Mpeg2PsClock
+from dam_mpeg2_ps_utility.mpeg2_ps_data import (
+    Mpeg2PsProgramEnd,
+    Mpeg2PesPacketType1,
+    Mpeg2PsPackHeader,
+)
+from dam_mpeg2_ps_utility.pipeline_queue import PipelineQueue
+from dam_mpeg2_ps_utility.pipeline_queue_data import PipelineQueueStats
+from dam_mpeg2_ps_utility.profiler import Profiler
+from dam_mpeg2_ps_utility.stream_copy import StreamCopy
+
+
+class DamMpeg2PsGenerator:
+    """DAM compatible MPEG2-PS Generator"""
+
+    __OUTPUT_CHUNK_SIZE = 1024 * 1024
+    __PIPELINE_BATCH_SIZE = 1024 * 1024
+    __PIPELINE_WRITE_SIZE = 4 * 1024 * 1024
+
+    __logger = getLogger("DamMpeg2PsGenerator")
+
+    def __init__(self, index_cache: IndexCache | None = None):
+        """Constructor
+
+        Args:
+            index_cache (IndexCache | None, optional): Cache of NAL unit indexes. Defaults to None.
+        """
+
+        self.nal_units: list[H264NalUnit | H264NalUnitRange] = []
+        self.__source_stream: io.BufferedReader | None = None
+        self.__index_cache = index_cache
+        self.__pipeline_stats: list[PipelineQueueStats] = []
+
+    @property
+    def pipeline_stats(self):
+        """Queue stats of the last write_mpeg2_ps_pipelined"""
+
+        return self.__pipeline_stats
+
+    def load_h264_es(self, stream: io.BufferedReader, pass_through=False):
+        """Load H.264-ES
+
+        Args:
+            stream (io.BufferedReader): Readable stream of H.264-ES
+            pass_through (bool, optional): Keep only NAL unit headers and ranges, and copy NAL units from the stream unchanged in write_mpeg2_ps. The stream must be kept open until then. Defaults to False.
+        """
+
+        profiler = Profiler.current
+        if profiler is not None:
+            start_time = time.perf_counter()
+        self.nal_units.clear()
+        self.nal_units.extend(
+            DamMpeg2PsGenerator.__iter_nal_unit(
+                stream, pass_through, self.__index_cache
+            )
+        )
+        if profiler is not None:
+            profiler.add(
+                "dam_mpeg2_ps_generator.load_h264_es",
+                time.perf_counter() - start_time,
+                nal_units=len(self.nal_units),
+            )
+        self.__source_stream = stream if pass_through else None
+
+    @staticmethod
+    def __iter_nal_unit_range(
+        stream: io.BufferedReader, index_cache: IndexCache | None
+    ):
+        if index_cache is None:
+            yield from DamMpeg2PsGenerator.__index_nal_unit_range(stream, None)
+            return
+
+        cached_entries = index_cache.load("h264_nal_unit", stream)
+        if cached_entries is not None:
+            for nal_unit_position, nal_unit_size, header in cached_entries:
+                yield H264NalUnitRange(
+                    (header >> 5) & 0x03,
+                    header & 0x1F,
+                    nal_unit_position,
+                    nal_unit_size,
+                )
+            return
+
+        # Entries are written while NAL units are yielded, and committed at the end
+        with index_cache.writer("h264_nal_unit", stream) as cache_writer:
+            yield from DamMpeg2PsGenerator.__index_nal_unit_range(
+                stream, cache_writer
+            )
+
+    @staticmethod
+    def __index_nal_unit_range(
+        stream: io.BufferedReader, cache_writer: IndexCacheWriter | None
+    ):
+        for nal_unit_position, nal_unit_size in H264AnnexB.iter_nal_unit_index(stream):
+            stream.seek(nal_unit_position)
+            nal_unit_buffer: bytes = stream.read(
+                min(nal_unit_size, H264AnnexB.NAL_UNIT_HEADER_END)
+            )
+            nal_unit = H264AnnexB.parse_nal_unit_range(
+                nal_unit_buffer, nal_unit_position, nal_unit_size
+            )
+            if nal_unit is None:
+                continue
+            if cache_writer is not None:
+                cache_writer.append(
+                    (
+                        nal_unit_position,
+                        nal_unit_size,
+                        nal_unit.nal_ref_idc << 5 | nal_unit.nal_unit_type,
+                    )
+                )
+            yield nal_unit
+
+    @staticmethod
+    def __iter_nal_unit(
+        stream: io.BufferedReader,
+        pass_through: bool,
+        index_cache: IndexCache | None = None,
+    ):
+        for nal_unit_range in DamMpeg2PsGenerator.__iter_nal_unit_range(
+            stream, index_cache
+        ):
+            if pass_through:
+                yield nal_unit_range
+                continue
+            stream.seek(nal_unit_range.position)
+            nal_unit_buffer: bytes = stream.read(nal_unit_range.size)
+            nal_unit = H264AnnexB.parse_nal_unit(nal_unit_buffer)
+            if nal_unit is None:
+                continue
+            yield nal_unit
+
+    @staticmethod
+    def __serialize_nal_unit(
+        nal_unit: H264NalUnit | H264NalUnitRange,
+        source_stream: io.BufferedReader | None,
+    ):
+        if isinstance(nal_unit, H264NalUnitRange):
+            source_stream.seek(nal_unit.position)
+            return source_stream.read(nal_unit.size)
+        return H264AnnexB.serialize_nal_unit(nal_unit)
+
+    @staticmethod
+    def __build_sequence():
+        # Receive NAL units by send(), and yield each completed sequence or None
+        current_sequence: list[list[H264NalUnit | H264NalUnitRange]] = []
+        current_access_unit: list[H264NalUnit | H264NalUnitRange] = []
+        sps_detected = False
+        completed_sequence: list[list[H264NalUnit | H264NalUnitRange]] | None = None
+        while True:
+            nal_unit: H264NalUnit | H264NalUnitRange = yield completed_sequence
+            completed_sequence = None
+
+            # Access Unit Delimiter
+            if nal_unit.nal_unit_type == 0x09:
+                if sps_detected:
+                    if len(current_sequence) != 0:
+                        completed_sequence = current_sequence
+                        current_sequence = []
+                    sps_detected = False
+                if len(current_access_unit) != 0:
+                    current_sequence.append(current_access_unit)
+                    current_access_unit = []
+
+            # Sequence Parameter Set
+            if nal_unit.nal_unit_type == 0x07:
+                sps_detected = True
+
+            current_access_unit.append(nal_unit)
+
+    @staticmethod
+    def __iter_sequence(nal_units: Iterable[H264NalUnit | H264NalUnitRange]):
+        sequence_builder = DamMpeg2PsGenerator.__build_sequence()
+        next(sequence_builder)
+        for nal_unit in nal_units:
+            sequence = sequence_builder.send(nal_unit)
+            if sequence is not None:
+                yield sequence
+
+    @staticmethod
+    def __iter_pes_packet(
+        access_unit_buffer: bytearray, pts: int | None, dts: int | None
+    ):
+        # Fill and separate PES Packet
+        pes_packet_data_buffer_length_limit: int
+        if pts is None:
+            PTS_DTS_flags = 0
+            pes_packet_data_buffer_length_limit = 65535 - 3
+        else:
+            if dts is None:
+                PTS_DTS_flags = 2
+                pes_packet_data_buffer_length_limit = 65535 - 8
+            else:
+                PTS_DTS_flags = 3
+                pes_packet_data_buffer_length_limit = 65535 - 13
+        access_unit_view = memoryview(access_unit_buffer)
+        position = 0
+        while position < len(access_unit_view):
+            next_position = position + pes_packet_data_buffer_length_limit
+            yield Mpeg2PesPacketType1(
+                0xE0,
+                0,
+                0,
+                0,
+                0,
+                0,
+                PTS_DTS_flags,
+                0,
+                0,
+                0,
+                0,
+                0,
+                0,
+                pts,
+                dts,
+                access_unit_view[position:next_position],
+            )
+            position = next_position
+            # Following PES packets of the access unit
+            PTS_DTS_flags = 0
+            pes_packet_data_buffer_length_limit = 65535 - 3
+
+    @staticmethod
+    def __write_sequence(
+        stream: bitstring.BitStream | bytearray,
+        sequence: list[list[H264NalUnit | H264NalUnitRange]],
+        picture_count: int,
+        clock: Mpeg2PsClock,
+        source_stream: io.BufferedReader | None,
+    ):
+        profiler = Profiler.current
+        if profiler is not None:
+            start_time = time.perf_counter()
+            first_picture_count = picture_count
+
+        # Write PS Pack header
+        SCR_base, SCR_ext = clock.scr(picture_count)
+        ps_pack_header = Mpeg2PsPackHeader(SCR_base, SCR_ext, 20000, 0)
+        Mpeg2Ps.write_ps_pack_header(stream, ps_pack_header)
+
+        for access_unit in sequence:
+            pts = clock.pts(picture_count)
+            dts = None
+
+            access_unit_buffer = bytearray()
+            for nal_unit in access_unit:
+                # Picture's NAL unit
+                if nal_unit.nal_unit_type == 0x01 or nal_unit.nal_unit_type == 0x05:
+                    picture_count += 1
+                access_unit_buffer += DamMpeg2PsGenerator.__serialize_nal_unit(
+                    nal_unit, source_stream
+                )
+
+            for pes_packet in DamMpeg2PsGenerator.__iter_pes_packet(
+                access_unit_buffer, pts, dts
+            ):
+                Mpeg2Ps.write_pes_packet(stream, pes_packet)
+
+        if profiler is not None:
+            profiler.add(
+                "dam_mpeg2_ps_generator.write_sequence",
+                time.perf_counter() - start_time,
+                sequences=1,
+                access_units=len(sequence),
+                pictures=picture_count - first_picture_count,
+            )
+        return picture_count, SCR_base
+
+    def write_mpeg2_ps(
+        self,
+        stream: bitstring.BitStream | io.BufferedWriter,
+        codec: DamMpeg2PsCodec,
+        frame_rate: Fraction,
+    ):
+        """Write MPEG2-PS
+
+        Args:
+            stream (bitstring.BitStream | io.BufferedWriter): Writable stream of MPEG2-PS. A file stream is written directly without copying through BitStream.
+            codec (DamMpeg2PsCodec): Codec
+            frame_rate (Fraction): Frame rate
+
+        Returns:
+            GopIndex: Written GOP index
+        """
+
+        temp_stream = bytearray()
+
+        # Write Container Header
+        DamMpeg2Ps.write_container_header(temp_stream, codec)
+        header_size = len(temp_stream)
+
+        gops = GopIndexEntries()
+
+        clock = Mpeg2PsClock(frame_rate)
+        picture_count = 0
+        for sequence in DamMpeg2PsGenerator.__iter_sequence(self.nal_units):
+            access_unit_position = len(temp_stream)
+            picture_count, SCR_base = DamMpeg2PsGenerator.__write_sequence(
+                temp_stream, sequence, picture_count, clock, self.__source_stream
+            )
+
+            # Add a GOP index entry
+            access_unit_size = len(temp_stream) - access_unit_position
+            gops.append(GopIndexEntry(access_unit_position, access_unit_size, SCR_base))
+            DamMpeg2PsGenerator.__logger.debug(
+                "GOP index entry added. access_unit_position=%s, access_unit_size=%s, pts=%s, pts_msec=%s",
+                access_unit_position,
+                access_unit_size,
+                SCR_base,
+                SCR_base / 90,
+            )
+
+        # Write Program End
+        Mpeg2Ps.write_ps_packet(temp_stream, Mpeg2PsProgramEnd())
+        # Add GOP index entry of Program end
+        access_unit_position = len(temp_stream)
+        SCR_base = clock.pts(picture_count)
+        gops.append(GopIndexEntry(access_unit_position, 0, SCR_base))
+        DamMpeg2PsGenerator.__logger.debug(
+            "GOP index entry (Program end) added. access_unit_position=%s, access_unit_size=0, pts=%s, pts_msec=%s",
+            access_unit_position,
+            SCR_base,
+            SCR_base / 90,
+        )
+
+        # Write GOP index
+        gop_index = GopIndex(0xFF, 0x01, 0xE0, 0x0, 0x0, gops)
+        if isinstance(stream, bitstring.BitStream):
+            DamMpeg2Ps.write_gop_index(
+                bitstring.BitStream(temp_stream), stream, gop_index
+            )
+            return gop_index
+        temp_view = memoryview(temp_stream)
+        DamMpeg2Ps.write_gop_index_stream(
+            stream, temp_view[:header_size], gop_index, temp_view[header_size:]
+        )
+        return gop_index
+
+    def write_mpeg2_ps_streaming(
+        self,
+        input_stream: io.BufferedReader,
+        output_stream: io.BufferedWriter,
+        codec: DamMpeg2PsCodec,
+        frame_rate: Fraction,
+        pass_through=False,
+    ):
+        """Write MPEG2-PS from H.264-ES incrementally
+
+        Only one sequence is held in memory at a time. PES packets are spooled to a temporary file, and the GOP index is backfilled when the output is assembled.
+
+        Args:
+            input_stream (io.BufferedReader): Readable stream of H.264-ES
+            output_stream (io.BufferedWriter): Writable stream of MPEG2-PS
+            codec (DamMpeg2PsCodec): Codec
+            frame_rate (Fraction): Frame rate
+            pass_through (bool, optional): Copy NAL units from the input unchanged instead of parsing and serializing them. Defaults to False.
+
+        Returns:
+            GopIndex: Written GOP index
+        """
+
+        header_buffer = bytearray()
+
+        # Write Container Header
+        DamMpeg2Ps.write_container_header(header_buffer, codec)
+        header_size = len(header_buffer)
+
+        gops = GopIndexEntries()
+
+        with tempfile.TemporaryFile() as body_file:
+            body_size = 0
+            clock = Mpeg2PsClock(frame_rate)
+            picture_count = 0
+            nal_units = DamMpeg2PsGenerator.__iter_nal_unit(
+                input_stream, pass_through, self.__index_cache
+            )
+            for sequence in DamMpeg2PsGenerator.__iter_sequence(nal_units):
+                access_unit_position = header_size + body_size
+                sequence_buffer = bytearray()
+                picture_count, SCR_base = DamMpeg2PsGenerator.__write_sequence(
+                    sequence_buffer,
+                    sequence,
+                    picture_count,
+                    clock,
+                    input_stream if pass_through else None,
+                )
+                body_file.write(sequence_buffer)
+                body_size += len(sequence_buffer)
+
+                # Add a GOP index entry
+                access_unit_size = len(sequence_buffer)
+                gops.append(
+                    GopIndexEntry(access_unit_position, access_unit_size, SCR_base)
+                )
+                DamMpeg2PsGenerator.__logger.debug(
+                    "GOP index entry added. access_unit_position=%s, access_unit_size=%s, pts=%s, pts_msec=%s",
+                    access_unit_position,
+                    access_unit_size,
+                    SCR_base,
+                    SCR_base / 90,
+                )
+
+            # Write Program End
+            program_end_buffer = bytearray()
+            Mpeg2Ps.write_ps_packet(program_end_buffer, Mpeg2PsProgramEnd())
+            body_file.write(program_end_buffer)
+            body_size += len(program_end_buffer)
+            # Add GOP index entry of Program end
+            access_unit_position = header_size + body_size
+            SCR_base = clock.pts(picture_count)
+            gops.append(GopIndexEntry(access_unit_position, 0, SCR_base))
+            DamMpeg2PsGenerator.__logger.debug(
+                "GOP index entry (Program end) added. access_unit_position=%s, access_unit_size=0, pts=%s, pts_msec=%s",
+                access_unit_position,
+                SCR_base,
+                SCR_base / 90,
+            )
+
+            # Write Container Header and GOP index, then copy body
+            gop_index = GopIndex(0xFF, 0x01, 0xE0, 0x0, 0x0, gops)
+            body_file.seek(0)
+            DamMpeg2Ps.write_gop_index_stream(
+                output_stream, header_buffer, gop_index, body_file
+            )
+
+        return gop_index
+
+    def write_mpeg2_ps_pipelined(
+        self,
+        input_stream: io.BufferedReader,
+        output_stream: io.BufferedWriter,
+        codec: DamMpeg2PsCodec,
+        frame_rate: Fraction,
+        pass_through=False,
+        queue_size: int = 8,
+        write_size: int = __PIPELINE_WRITE_SIZE,
+    ):
+        """Write MPEG2-PS from H.264-ES with pipelined stages
+
+        A reader thread scans and reads NAL units, the calling thread packetizes sequences, and a writer thread spools PES packets to a temporary file with large writes. Stages are connected by bounded queues, so input and output I/O overlap packetization while memory stays bounded. Queue stats are available from pipeline_stats afterwards.
+
+        Args:
+            input_stream (io.BufferedReader): Readable stream of H.264-ES
+            output_stream (io.BufferedWriter): Writable stream of MPEG2-PS
+            codec (DamMpeg2PsCodec): Codec
+            frame_rate (Fraction): Frame rate
+            pass_through (bool, optional): Copy NAL units from the input unchanged instead of parsing and serializing them. Defaults to False.
+            queue_size (int, optional): Maximum item count of each queue. An item of the reader is a batch of NAL units of about 1 MiB, and an item of the writer is a sequence. Defaults to 8.
+            write_size (int, optional): Size of writes to the temporary file. Defaults to 4 MiB.
+
+        Returns:
+            GopIndex: Written GOP index
+        """
+
+        nal_unit_queue = PipelineQueue("nal_unit", queue_size)
+        sequence_queue = PipelineQueue("sequence", queue_size)
+        errors: list[BaseException] = []
+        index_cache = self.__index_cache
+
+        def read():
+            try:
+                batch: list[tuple[H264NalUnitRange, bytes]] = []
+                batch_size = 0
+                for nal_unit_range in DamMpeg2PsGenerator.__iter_nal_unit_range(
+                    input_stream, index_cache
+                ):
+                    input_stream.seek(nal_unit_range.position)
+                    nal_unit_buffer: bytes = input_stream.read(nal_unit_range.size)
+                    batch.append((nal_unit_range, nal_unit_buffer))
+                    batch_size += len(nal_unit_buffer)
+                    if DamMpeg2PsGenerator.__PIPELINE_BATCH_SIZE <= batch_size:
+                        nal_unit_queue.put(batch)
+                        batch = []
+                        batch_size = 0
+                if len(batch) != 0:
+                    nal_unit_queue.put(batch)
+                nal_unit_queue.close()
+            except BaseException as error:
+                errors.append(error)
+                nal_unit_queue.cancel()
+
+        def write():
+            try:
+                write_buffer = bytearray()
+                for sequence_buffer in sequence_queue:
+                    write_buffer += sequence_buffer
+                    if write_size <= len(write_buffer):
+                        body_file.write(write_buffer)
+                        write_buffer.clear()
+                body_file.write(write_buffer)
+            except BaseException as error:
+                errors.append(error)
+                sequence_queue.cancel()
+
+        header_buffer = bytearray()
+
+        # Write Container Header
+        DamMpeg2Ps.write_container_header(header_buffer, codec)
+        header_size = len(header_buffer)
+
+        gops = GopIndexEntries()
+
+        with tempfile.TemporaryFile() as body_file:
+            reader_thread = threading.Thread(
+                target=read, name="DamMpeg2PsGenerator.reader"
+            )
+            writer_thread = threading.Thread(
+                target=write, name="DamMpeg2PsGenerator.writer"
+            )
+            reader_thread.start()
+            writer_thread.start()
+            try:
+                body_size = 0
+                clock = Mpeg2PsClock(frame_rate)
+                picture_count = 0
+                sequence_builder = DamMpeg2PsGenerator.__build_sequence()
+                next(sequence_builder)
+                # Bytes of pass-through NAL units by position until they are packetized
+                nal_unit_buffers: dict[int, bytes] = {}
+                for batch in nal_unit_queue:
+                    for nal_unit_range, nal_unit_buffer in batch:
+                        nal_unit: H264NalUnit | H264NalUnitRange | None
+                        if pass_through:
+                            nal_unit = nal_unit_range
+                            nal_unit_buffers[nal_unit_range.position] = nal_unit_buffer
+                        else:
+                            nal_unit = H264AnnexB.parse_nal_unit(nal_unit_buffer)
+                            if nal_unit is None:
+                                continue
+                        sequence = sequence_builder.send(nal_unit)
+                        if sequence is None:
+                            continue
+
+                        source_stream = None
+                        if pass_through:
+                            # Relocate NAL units into a source of the sequence only
+                            source_stream = io.BytesIO()
+                            relocated_sequence = []
+                            for access_unit in sequence:
+                                relocated_access_unit = []
+                                for nal_unit in access_unit:
+                                    relocated_access_unit.append(
+                                        nal_unit._replace(position=source_stream.tell())
+                                    )
+                                    source_stream.write(
+                                        nal_unit_buffers.pop(nal_unit.position)
+                                    )
+                                relocated_sequence.append(relocated_access_unit)
+                            sequence = relocated_sequence
+                        access_unit_position = header_size + body_size
+                        sequence_buffer = bytearray()
+                        picture_count, SCR_base = DamMpeg2PsGenerator.__write_sequence(
+                            sequence_buffer,
+                            sequence,
+                            picture_count,
+                            clock,
+                            source_stream,
+                        )
+                        sequence_queue.put(sequence_buffer)
+                        body_size += len(sequence_buffer)
+
+                        # Add a GOP index entry
+                        access_unit_size = len(sequence_buffer)
+                        gops.append(
+                            GopIndexEntry(
+                                access_unit_position, access_unit_size, SCR_base
+                            )
+                        )
+                        DamMpeg2PsGenerator.__logger.debug(
+                            "GOP index entry added. access_unit_position=%s, access_unit_size=%s, pts=%s, pts_msec=%s",
+                            access_unit_position,
+                            access_unit_size,
+                            SCR_base,
+                            SCR_base / 90,
+                        )
+
+                # Write Program End
+                program_end_buffer = bytearray()
+                Mpeg2Ps.write_ps_packet(program_end_buffer, Mpeg2PsProgramEnd())
+                sequence_queue.put(program_end_buffer)
+                sequence_queue.close()
+                body_size += len(program_end_buffer)
+            except BaseException as error:
+                # The first error is the cause, later ones are of cancellation
+                errors.append(error)
+                nal_unit_queue.cancel()
+                sequence_queue.cancel()
+            finally:
+                reader_thread.join()
+                writer_thread.join()
+                self.__pipeline_stats = [nal_unit_queue.stats, sequence_queue.stats]
+            if len(errors) != 0:
+                raise errors[0]
+            for stats in self.__pipeline_stats:
+                DamMpeg2PsGenerator.__logger.debug(
+                    "Pipeline queue stats. name=%s, maxsize=%s, item_count=%s, max_occupancy=%s, mean_occupancy=%.2f, put_wait_time=%.3f, get_wait_time=%.3f",
+                    stats.name,
+                    stats.maxsize,
+                    stats.item_count,
+                    stats.max_occupancy,
+                    stats.mean_occupancy,
+                    stats.put_wait_time,
+                    stats.get_wait_time,
+                )
+
+            # Add GOP index entry of Program end
+            access_unit_position = header_size + body_size
+            SCR_base = clock.pts(picture_count)
+            gops.append(GopIndexEntry(access_unit_position, 0, SCR_base))
+            DamMpeg2PsGenerator.__logger.debug(
+                "GOP index entry (Program end) added. access_unit_position=%s, access_unit_size=0, pts=%s, pts_msec=%s",
+                access_unit_position,
+                SCR_base,
+                SCR_base / 90,
+            )
+
+            # Write Container Header and GOP index, then copy body
+            gop_index = GopIndex(0xFF, 0x01, 0xE0, 0x0, 0x0, gops)
+            body_file.seek(0)
+            DamMpeg2Ps.write_gop_index_stream(
+                output_stream, header_buffer, gop_index, body_file
+            )
+
+        return gop_index
+
+    async def iter_mpeg2_ps_async(
+        self,
+        source: AsyncIterable[bytes],
+        codec: DamMpeg2PsCodec,
+        frame_rate: Fraction,
+        pass_through=False,
+        executor: Executor | None = None,
+        chunk_size: int = __OUTPUT_CHUNK_SIZE,
+    ):
+        """Write MPEG2-PS from an async source of H.264-ES
+
+        NAL units are split and packetized on the executor while the source is arriving, and PES packets are spooled to a temporary file. Only the incomplete NAL unit and sequence are held in memory. The output starts with the container header and the GOP index, so it is yielded after the source ends.
+
+        Args:
+            source (AsyncIterable[bytes]): Async source of H.264-ES chunks
+            codec (DamMpeg2PsCodec): Codec
+            frame_rate (Fraction): Frame rate
+            pass_through (bool, optional): Copy NAL units unchanged instead of parsing and serializing them. The source is spooled to a temporary file. Defaults to False.
+            executor (Executor | None, optional): Executor of packetization. It must share memory with the caller, such as ThreadPoolExecutor. Defaults to None (Default executor of the event loop).
+            chunk_size (int, optional): Size of output chunks. Defaults to 1 MiB.
+
+        Yields:
+            bytes: Chunk of MPEG2-PS
+        """
+
+        loop = asyncio.get_running_loop()
+        clock = Mpeg2PsClock(frame_rate)
+        header_buffer = bytearray()
+
+        # Write Container Header
+        DamMpeg2Ps.write_container_header(header_buffer, codec)
+        header_size = len(header_buffer)
+
+        gops = GopIndexEntries()
+
+        with tempfile.TemporaryFile() as body_file, (
+            tempfile.TemporaryFile() if pass_through else contextlib.nullcontext()
+        ) as input_file:
+            body_size = 0
+            picture_count = 0
+            sequence_builder = DamMpeg2PsGenerator.__build_sequence()
+            next(sequence_builder)
+            # Bytes from the start of the current NAL unit
+            pending_buffer = bytearray()
+            pending_position = 0
+            nal_unit_start: int | None = None
+            scan_start = 0
+            # Leading zero of the long start code is not searched before it
+            leading_zero_start = 0
+
+            def write_sequence(sequence: list[list[H264NalUnit | H264NalUnitRange]]):
+                nonlocal body_size, picture_count
+                access_unit_position = header_size + body_size
+                sequence_buffer = bytearray()
+                picture_count, SCR_base = DamMpeg2PsGenerator.__write_sequence(
+                    sequence_buffer, sequence, picture_count, clock, input_file
+                )
+                body_file.write(sequence_buffer)
+                body_size += len(sequence_buffer)
+
+                # Add a GOP index entry
+                access_unit_size = len(sequence_buffer)
+                gops.append(
+                    GopIndexEntry(access_unit_position, access_unit_size, SCR_base)
+                )
+                DamMpeg2PsGenerator.__logger.debug(
+                    "GOP index entry added. access_unit_position=%s, access_unit_size=%s, pts=%s, pts_msec=%s",
+                    access_unit_position,
+                    access_unit_size,
+                    SCR_base,
+                    SCR_base / 90,
+                )
+
+            def push_nal_unit(nal_unit_position: int, nal_unit_buffer: bytearray):
+                nal_unit: H264NalUnit | H264NalUnitRange | None
+                if pass_through:
+                    nal_unit = H264AnnexB.parse_nal_unit_range(
+                        nal_unit_buffer[: H264AnnexB.NAL_UNIT_HEADER_END],
+                        nal_unit_position,
+                        len(nal_unit_buffer),
+                    )
+                else:
+                    nal_unit = H264AnnexB.parse_nal_unit(bytes(nal_unit_buffer))
+                if nal_unit is None:
+                    return
+                sequence = sequence_builder.send(nal_unit)
+                if sequence is not None:
+                    write_sequence(sequence)
+
+            def feed(chunk: bytes):
+                nonlocal pending_position, nal_unit_start, scan_start
+                nonlocal leading_zero_start
+                if pass_through:
+                    # NAL units are read back from the spooled source
+                    input_file.seek(0, io.SEEK_END)
+                    input_file.write(chunk)
+                pending_buffer.extend(chunk)
+                while True:
+                    start_code_position = pending_buffer.find(b"\x00\x00\x01", scan_start)
+                    if start_code_position == -1:
+                        # Search again only the bytes which may start a start code
+                        scan_start = max(scan_start, len(pending_buffer) - 3)
+                        break
+                    # Need one more byte after the start code for the NAL unit header
+                    if len(pending_buffer) <= start_code_position + 3:
+                        scan_start = start_code_position
+                        break
+                    # Count up to one more leading zero of the long start code
+                    position = start_code_position
+                    if (
+                        leading_zero_start < start_code_position
+                        and pending_buffer[start_code_position - 1] == 0x00
+                    ):
+                        position -= 1
+                    if nal_unit_start is not None:
+                        push_nal_unit(
+                            pending_position + nal_unit_start,
+                            pending_buffer[nal_unit_start:position],
+                        )
+                    nal_unit_start = position
+                    scan_start = position + 4
+                    leading_zero_start = scan_start
+
+                # Keep the current NAL unit, or the bytes which may be a part of the next start code
+                keep_position = (
+                    nal_unit_start
+                    if nal_unit_start is not None
+                    else max(leading_zero_start, len(pending_buffer) - 4)
+                )
+                del pending_buffer[:keep_position]
+                pending_position += keep_position
+                scan_start = max(scan_start - keep_position, 0)
+                leading_zero_start = max(leading_zero_start - keep_position, 0)
+                if nal_unit_start is not None:
+                    nal_unit_start = 0
+
+            def finish():
+                nonlocal body_size
+                if nal_unit_start is not None:
+                    push_nal_unit(
+                        pending_position + nal_unit_start,
+                        pending_buffer[nal_unit_start:],
+                    )
+
+                # Write Program End
+                program_end_buffer = bytearray()
+                Mpeg2Ps.write_ps_packet(program_end_buffer, Mpeg2PsProgramEnd())
+                body_file.write(program_end_buffer)
+                body_size += len(program_end_buffer)
+                # Add GOP index entry of Program end
+                access_unit_position = header_size + body_size
+                SCR_base = clock.pts(picture_count)
+                gops.append(GopIndexEntry(access_unit_position, 0, SCR_base))
+                DamMpeg2PsGenerator.__logger.debug(
+                    "GOP index entry (Program end) added. access_unit_position=%s, access_unit_size=0, pts=%s, pts_msec=%s",
+                    access_unit_position,
+                    SCR_base,
+                    SCR_base / 90,
+                )
+
+                # Write Container Header and GOP index
+                gop_index = GopIndex(0xFF, 0x01, 0xE0, 0x0, 0x0, gops)
+                indexed_header_stream = io.BytesIO()
+                DamMpeg2Ps.write_gop_index_stream(
+                    indexed_header_stream, header_buffer, gop_index
+                )
+                body_file.seek(0)
+                return indexed_header_stream.getvalue()
+
+            async for chunk in source:
+                if len(chunk) == 0:
+                    continue
+                await loop.run_in_executor(executor, feed, chunk)
+            yield await loop.run_in_executor(executor, finish)
+
+            # Copy body
+            while True:
+                chunk = await loop.run_in_executor(executor, body_file.read, chunk_size)
+                if len(chunk) == 0:
+                    break
+                yield chunk
+
+    @staticmethod
+    def write_sequences(
+        input_path: str,
+        output_path: str,
+        sequences: list[list[list[H264NalUnitRange]]],
+        picture_count: int,
+        frame_rate: Fraction,
+        pass_through: bool,
+    ):
+        """Write PS packets of sequences to a file
+
+        This is the worker of write_mpeg2_ps_parallel.
+
+        Args:
+            input_path (str): H.264-ES file path
+            output_path (str): Output file path
+            sequences (list[list[list[H264NalUnitRange]]]): Sequences of NAL unit ranges in input_path
+            picture_count (int): Picture count at the start of sequences
+            frame_rate (Fraction): Frame rate
+            pass_through (bool): Copy NAL units from the input unchanged instead of parsing and serializing them
+
+        Returns:
+            list[int]: Size of each sequence
+        """
+
+        clock = Mpeg2PsClock(frame_rate)
+        sequence_sizes: list[int] = []
+        with open(input_path, "rb") as input_file, open(
+            output_path, "wb"
+        ) as output_file:
+            for sequence in sequences:
+                if not pass_through:
+                    # Unparsable NAL units are skipped like __iter_nal_unit
+                    sequence = [
+                        [
+                            nal_unit
+                            for nal_unit in (
+                                DamMpeg2PsGenerator.__read_nal_unit(
+                                    input_file, nal_unit_range
+                                )
+                                for nal_unit_range in access_unit
+                            )
+                            if nal_unit is not None
+                        ]
+                        for access_unit in sequence
+                    ]
+                sequence_buffer = bytearray()
+                picture_count, _ = DamMpeg2PsGenerator.__write_sequence(
+                    sequence_buffer, sequence, picture_count, clock, input_file
+                )
+                output_file.write(sequence_buffer)
+                sequence_sizes.append(len(sequence_buffer))
+        return sequence_sizes
+
+    @staticmethod
+    def __read_nal_unit(stream: io.BufferedReader, nal_unit_range: H264NalUnitRange):
+        stream.seek(nal_unit_range.position)
+        return H264AnnexB.parse_nal_unit(stream.read(nal_unit_range.size))
+
+    @staticmethod
+    def __split_sequences(
+        sequences: list[list[list[H264NalUnitRange]]], chunk_count: int
+    ):
+        # Split into consecutive chunks of roughly equal size
+        sequence_sizes = [
+            sum(nal_unit.size for access_unit in sequence for nal_unit in access_unit)
+            for sequence in sequences
+        ]
+        chunk_size_limit = sum(sequence_sizes) / chunk_count
+        chunks: list[tuple[int, int]] = []
+        chunk_start = 0
+        chunk_size = 0
+        for index, sequence_size in enumerate(sequence_sizes):
+            chunk_size += sequence_size
+            if chunk_size_limit <= chunk_size:
+                chunks.append((chunk_start, index + 1))
+                chunk_start = index + 1
+                chunk_size = 0
+        if chunk_start != len(sequences):
+            chunks.append((chunk_start, len(sequences)))
+        return chunks
+
+    def write_mpeg2_ps_parallel(
+        self,
+        input_path: str,
+        output_stream: io.BufferedWriter,
+        codec: DamMpeg2PsCodec,
+        frame_rate: Fraction,
+        pass_through=False,
+        workers: int | None = None,
+    ):
+        """Write MPEG2-PS from H.264-ES file with worker processes
+
+        Sequences are packetized in parallel, then stitched together in order. Only NAL unit headers are held in memory.
+
+        Args:
+            input_path (str): H.264-ES file path
+            output_stream (io.BufferedWriter): Writable stream of MPEG2-PS
+            codec (DamMpeg2PsCodec): Codec
+            frame_rate (Fraction): Frame rate
+            pass_through (bool, optional): Copy NAL units from the input unchanged instead of parsing and serializing them. Defaults to False.
+            workers (int | None, optional): Worker process count. Defaults to None (CPU count).
+
+        Returns:
+            GopIndex: Written GOP index
+        """
+
+        with open(input_path, "rb") as input_file:
+            # NAL units skipped by the serial path fail the same header checks here,
+            # so sequences and picture counts are the same
+            nal_units = DamMpeg2PsGenerator.__iter_nal_unit(
+                input_file, True, self.__index_cache
+            )
+            sequences = list(DamMpeg2PsGenerator.__iter_sequence(nal_units))
+
+        # Picture count at the start of each sequence
+        picture_counts: list[int] = []
+        picture_count = 0
+        for sequence in sequences:
+            picture_counts.append(picture_count)
+            for access_unit in sequence:
+                for nal_unit in access_unit:
+                    # Picture's NAL unit
+                    if (
+                        nal_unit.nal_unit_type == 0x01
+                        or nal_unit.nal_unit_type == 0x05
+                    ):
+                        picture_count += 1
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        # Several chunks per worker to even out the load
+        chunks = DamMpeg2PsGenerator.__split_sequences(sequences, workers * 4)
+
+        header_buffer = bytearray()
+
+        # Write Container Header
+        DamMpeg2Ps.write_container_header(header_buffer, codec)
+        header_size = len(header_buffer)
+
+        gops = GopIndexEntries()
+
+        with tempfile.TemporaryDirectory() as temp_directory:
+            chunk_paths = [
+                os.path.join(temp_directory, f"{chunk_index}.ps")
+                for chunk_index in range(len(chunks))
+            ]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(
+                        DamMpeg2PsGenerator.write_sequences,
+                        input_path,
+                        chunk_path,
+                        sequences[chunk_start:chunk_end],
+                        picture_counts[chunk_start],
+                        frame_rate,
+                        pass_through,
+                    )
+                    for chunk_path, (chunk_start, chunk_end) in zip(chunk_paths, chunks)
+                ]
+                sequence_sizes = [
+                    sequence_size
+                    for future in futures
+                    for sequence_size in future.result()
+                ]
+
+            clock = Mpeg2PsClock(frame_rate)
+            body_size = 0
+            for sequence_picture_count, sequence_size in zip(
+                picture_counts, sequence_sizes
+            ):
+                # Add a GOP index entry
+                access_unit_position = header_size + body_size
+                SCR_base = clock.pts(sequence_picture_count)
+                gops.append(
+                    GopIndexEntry(access_unit_position, sequence_size, SCR_base)
+                )
+                DamMpeg2PsGenerator.__logger.debug(
+                    "GOP index entry added. access_unit_position=%s, access_unit_size=%s, pts=%s, pts_msec=%s",
+                    access_unit_position,
+                    sequence_size,
+                    SCR_base,
+                    SCR_base / 90,
+                )
+                body_size += sequence_size
+
+            # Write Program End
+            program_end_buffer = bytearray()
+            Mpeg2Ps.write_ps_packet(program_end_buffer, Mpeg2PsProgramEnd())
+            body_size += len(program_end_buffer)
+            # Add GOP index entry of Program end
+            access_unit_position = header_size + body_size
+            SCR_base = clock.pts(picture_count)
+            gops.append(GopIndexEntry(access_unit_position, 0, SCR_base))
+            DamMpeg2PsGenerator.__logger.debug(
+                "GOP index entry (Program end) added. access_unit_position=%s, access_unit_size=0, pts=%s, pts_msec=%s",
+                access_unit_position,
+                SCR_base,
+                SCR_base / 90,
+            )
+
+            # Write Container Header and GOP index, then stitch chunks
+            gop_index = GopIndex(0xFF, 0x01, 0xE0, 0x0, 0x0, gops)
+            DamMpeg2Ps.write_gop_index_stream(output_stream, header_buffer, gop_index)
+            for chunk_path in chunk_paths:
+                with open(chunk_path, "rb") as chunk_file:
+                    StreamCopy.copy(chunk_file, output_stream)
+            output_stream.write(program_end_buffer)
+
+        return gop_index
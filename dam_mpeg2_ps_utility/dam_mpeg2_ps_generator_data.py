@@ -1,4 +1,6 @@
-from typing import NamedTuple
+from array import array
+import sys
+from typing import Iterable, NamedTuple
 
 
 class GopIndexEntry(NamedTuple):
@@ -7,10 +9,168 @@ class GopIndexEntry(NamedTuple):
     pts: int
 
 
+class GopIndexEntries:
+    """Columnar GOP index entries
+
+    Each field is stored in its own unsigned 64-bit array. Entries are converted from and to the 12-byte records of GOP index (ps_pack_header_position:40, access_unit_size:24, pts:32) by strided byte copies of whole columns.
+    """
+
+    RECORD_SIZE = 12
+    # Field, Offset in record, Size in record
+    __FIELDS = (
+        ("ps_pack_header_position", 0, 5),
+        ("access_unit_size", 5, 3),
+        ("pts", 8, 4),
+    )
+
+    def __init__(self, entries: Iterable[GopIndexEntry] = ()):
+        """Constructor
+
+        Args:
+            entries (Iterable[GopIndexEntry], optional): Entries. Defaults to ().
+        """
+
+        self.ps_pack_header_position = array("Q")
+        self.access_unit_size = array("Q")
+        self.pts = array("Q")
+        if isinstance(entries, GopIndexEntries):
+            self.extend(entries)
+            return
+        for entry in entries:
+            self.append(entry)
+
+    @staticmethod
+    def from_bytes(buffer: bytes | bytearray | memoryview):
+        """Deserialize entries from records
+
+        Args:
+            buffer (bytes | bytearray | memoryview): Records. Trailing bytes of an incomplete record are ignored.
+
+        Returns:
+            GopIndexEntries: Entries
+        """
+
+        entries = GopIndexEntries()
+        count = len(buffer) // GopIndexEntries.RECORD_SIZE
+        records = bytes(buffer[: count * GopIndexEntries.RECORD_SIZE])
+        for name, offset, size in GopIndexEntries.__FIELDS:
+            # Big endian 64-bit column
+            column_buffer = bytearray(8 * count)
+            for i in range(size):
+                column_buffer[8 - size + i :: 8] = records[
+                    offset + i :: GopIndexEntries.RECORD_SIZE
+                ]
+            column: array = getattr(entries, name)
+            column.frombytes(column_buffer)
+            if sys.byteorder == "little":
+                column.byteswap()
+        return entries
+
+    def to_bytes(self):
+        """Serialize entries to records
+
+        Returns:
+            bytes: Records
+        """
+
+        count = len(self)
+        records = bytearray(count * GopIndexEntries.RECORD_SIZE)
+        if count == 0:
+            return bytes(records)
+        for name, offset, size in GopIndexEntries.__FIELDS:
+            column: array = getattr(self, name)
+            if (1 << (8 * size)) <= max(column):
+                raise RuntimeError(f"Invalid {name}.")
+            # Big endian 64-bit column
+            column = array("Q", column)
+            if sys.byteorder == "little":
+                column.byteswap()
+            column_buffer = column.tobytes()
+            for i in range(size):
+                records[offset + i :: GopIndexEntries.RECORD_SIZE] = column_buffer[
+                    8 - size + i :: 8
+                ]
+        return bytes(records)
+
+    def offset_ps_pack_header_position(self, offset: int):
+        """Add an offset to MPEG2-PS Pack Header position of all entries
+
+        Args:
+            offset (int): Offset
+        """
+
+        column = self.ps_pack_header_position
+        if len(column) == 0:
+            return
+        # Positions are 40 bits in GOP index records
+        if min(column) + offset < 0 or (1 << 40) <= max(column) + offset:
+            raise RuntimeError("Invalid ps_pack_header_position.")
+        self.ps_pack_header_position = array("Q", map(offset.__add__, column))
+
+    def extend(self, entries: "GopIndexEntries"):
+        self.ps_pack_header_position.extend(entries.ps_pack_header_position)
+        self.access_unit_size.extend(entries.access_unit_size)
+        self.pts.extend(entries.pts)
+
+    def append(self, entry: GopIndexEntry):
+        self.ps_pack_header_position.append(entry[0])
+        self.access_unit_size.append(entry[1])
+        self.pts.append(entry[2])
+
+    def __len__(self):
+        return len(self.pts)
+
+    def __getitem__(self, index: int | slice):
+        if isinstance(index, slice):
+            entries = GopIndexEntries()
+            entries.ps_pack_header_position = self.ps_pack_header_position[index]
+            entries.access_unit_size = self.access_unit_size[index]
+            entries.pts = self.pts[index]
+            return entries
+        return GopIndexEntry(
+            self.ps_pack_header_position[index],
+            self.access_unit_size[index],
+            self.pts[index],
+        )
+
+    def __iter__(self):
+        return map(
+            GopIndexEntry,
+            self.ps_pack_header_position,
+            self.access_unit_size,
+            self.pts,
+        )
+
+    def __eq__(self, other):
+        if isinstance(other, GopIndexEntries):
+            return (
+                self.ps_pack_header_position == other.ps_pack_header_position
+                and self.access_unit_size == other.access_unit_size
+                and self.pts == other.pts
+            )
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return f"GopIndexEntries({list(self)!r})"
+
+
 class GopIndex(NamedTuple):
     sub_stream_id: int
     version: int
     stream_id: int
     page_number: int
     page_count: int
-    gops: list[GopIndexEntry]
+    gops: GopIndexEntries | list[GopIndexEntry]
+
+
+class GopIndexPage(NamedTuple):
+    position: int
+    size: int
+    page_number: int
+    page_count: int
+    first_gop_number: int
+    gop_count: int
+    first_pts: int
@@ -0,0 +1,163 @@
+import bisect
+import io
+
+from dam_mpeg2_ps_utility.dam_mpeg2_ps import DamMpeg2Ps
+from dam_mpeg2_ps_utility.dam_mpeg2_ps_generator_data import (
+    GopIndexEntry,
+    GopIndexEntries,
+    GopIndex,
+    GopIndexPage,
+)
+from dam_mpeg2_ps_utility.mpeg2_ps_reader import Mpeg2PsReader
+
+
+class DamMpeg2PsSeeker:
+    """Random access to GOPs of DAM compatible MPEG2-PS by PTS
+
+    GOPs are looked up by binary search over the first PTS of GOP index pages, then over the one page read on demand. Only the bytes of the requested GOP are read through the memory map, and its packets are decoded on iteration.
+    """
+
+    def __init__(self, stream: io.BufferedReader, gop_index: GopIndex | None = None):
+        """Constructor
+
+        Args:
+            stream (io.BufferedReader): Readable stream of DAM compatible MPEG2-PS file
+            gop_index (GopIndex | None, optional): GOP index. Defaults to None (Read pages from the stream on demand).
+        """
+
+        self.__stream = stream
+        self.__gop_index = gop_index
+        if gop_index is None:
+            pages = DamMpeg2Ps.read_gop_index_pages(stream)
+            if pages is None:
+                raise RuntimeError("Invalid GOP index.")
+        else:
+            gops = gop_index.gops
+            if not isinstance(gops, GopIndexEntries):
+                gops = GopIndexEntries(gops)
+            # Whole GOP index as a page
+            pages = [GopIndexPage(0, 0, 0, 0, 0, len(gops), 0)]
+            self.__page_gops = gops
+        self.__pages = pages
+        self.__page_first_pts_list = [page.first_pts for page in pages]
+        self.__page_first_gop_number_list = [page.first_gop_number for page in pages]
+        self.__page_index = 0 if gop_index is not None else None
+        self.__reader = Mpeg2PsReader(stream)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def gop_index(self):
+        """GOP index, all pages are read on first access"""
+
+        if self.__gop_index is None:
+            self.__gop_index = DamMpeg2Ps.load_gop_index(self.__stream)
+            if self.__gop_index is None:
+                raise RuntimeError("Invalid GOP index.")
+        return self.__gop_index
+
+    @property
+    def gop_count(self):
+        return self.__pages[-1].first_gop_number + self.__pages[-1].gop_count
+
+    def close(self):
+        self.__reader.close()
+
+    def __load_page(self, page_index: int):
+        if self.__page_index == page_index:
+            return self.__page_gops
+        page = DamMpeg2Ps.read_gop_index_page(self.__stream, self.__pages[page_index])
+        if page is None or len(page.gops) != self.__pages[page_index].gop_count:
+            raise RuntimeError("Invalid GOP index.")
+        self.__page_index = page_index
+        self.__page_gops = page.gops
+        return self.__page_gops
+
+    def gop_at(self, index: int) -> GopIndexEntry:
+        """GOP index entry
+
+        Args:
+            index (int): Index of GOP in the GOP index
+
+        Returns:
+            GopIndexEntry: GOP index entry
+        """
+
+        if index < 0 or self.gop_count <= index:
+            raise RuntimeError("Invalid index.")
+        page_index = bisect.bisect_right(self.__page_first_gop_number_list, index) - 1
+        gops = self.__load_page(page_index)
+        return gops[index - self.__pages[page_index].first_gop_number]
+
+    def find_gop(self, pts: int):
+        """Find the GOP presented at PTS
+
+        Args:
+            pts (int): PTS (90 kHz)
+
+        Returns:
+            int | None: Index of GOP in the GOP index, None if PTS is after the last GOP
+        """
+
+        if self.gop_count == 0:
+            return
+        # Last page and GOP starting at or before PTS
+        page_index = max(bisect.bisect_right(self.__page_first_pts_list, pts) - 1, 0)
+        gops = self.__load_page(page_index)
+        index = max(bisect.bisect_right(gops.pts, pts) - 1, 0)
+        # Entry of Program end
+        if gops.access_unit_size[index] == 0:
+            return
+        return self.__pages[page_index].first_gop_number + index
+
+    def seek(self, pts: int) -> GopIndexEntry | None:
+        """Seek the GOP presented at PTS
+
+        Args:
+            pts (int): PTS (90 kHz)
+
+        Returns:
+            GopIndexEntry | None: GOP index entry with MPEG2-PS Pack Header position and access unit size, None if PTS is after the last GOP
+        """
+
+        index = self.find_gop(pts)
+        if index is None:
+            return
+        return self.gop_at(index)
+
+    def read_gop(self, gop: GopIndexEntry):
+        """Read bytes of a GOP
+
+        Args:
+            gop (GopIndexEntry): GOP index entry
+
+        Returns:
+            memoryview: Bytes of GOP from its MPEG2-PS Pack Header
+        """
+
+        return self.__reader.buffer[
+            gop.ps_pack_header_position : gop.ps_pack_header_position
+            + gop.access_unit_size
+        ]
+
+    def iter_gop_packet(self, gop: GopIndexEntry):
+        """Iterate MPEG2-PS packets of a GOP
+
+        Args:
+            gop (GopIndexEntry): GOP index entry
+
+        Yields:
+            Mpeg2PsPacket: MPEG2-PS packet
+        """
+
+        end_position = gop.ps_pack_header_position + gop.access_unit_size
+        self.__reader.seek(gop.ps_pack_header_position)
+        while self.__reader.tell() < end_position:
+            ps_packet = self.__reader.read_ps_packet()
+            if ps_packet is None:
+                break
+            yield ps_packet
@@ -1,8 +1,18 @@
 from collections import namedtuple
-from dam_mpeg2_ps_utility.h264_annex_b_data import H264NalUnit
+from dam_mpeg2_ps_utility.h264_annex_b_data import H264NalUnit, H264NalUnitRange
+from enum import Enum, auto
 import io
-from logging import getLogger, Formatter, StreamHandler, DEBUG
+from dam_mpeg2_ps_utility.customized_logger import getLogger
 import os
+import time
+
+from dam_mpeg2_ps_utility.profiler import Profiler
+
+
+class H264AnnexBScanBackend(Enum):
+    BYTEWISE = auto()
+    FIND = auto()
+    NUMPY = auto()
 
 
 class H264AnnexB:
@@ -11,6 +21,10 @@ class H264AnnexB:
     __NAL_UNIT_START_CODE = b"\x00\x00\x01"
     __NAL_UNIT_START_CODE_LONG = b"\x00\x00\x00\x01"
     __EBSP_ESCAPE_START_CODE = b"\x00\x00\x03"
+    __SCAN_CHUNK_SIZE = 1024 * 1024
+
+    # Long start code and NAL unit header
+    NAL_UNIT_HEADER_END = 5
 
     __logger = getLogger("H264AnnexB")
 
@@ -45,142 +59,246 @@ class H264AnnexB:
                 zero_count = 0
 
     @staticmethod
-    def __find_ebsp_escaped(buffer: bytes, start=0):
-        position = buffer.find(H264AnnexB.__EBSP_ESCAPE_START_CODE, start)
-        if position == -1 or len(buffer) - 1 < position + 3:
-            return -1
-        if 0x03 < buffer[position + 3]:
-            return H264AnnexB.__find_ebsp_escaped(buffer, position + 4)
-        return position
+    def __ebsp_to_rbsp(ebsp: bytes):
+        position = ebsp.find(H264AnnexB.__EBSP_ESCAPE_START_CODE)
+        # No emulation prevention byte
+        if position == -1:
+            return ebsp
 
-    @staticmethod
-    def __list_ebsp_escaped_position(buffer: bytes):
-        position_list: list[int] = []
-        position = 0
-        while True:
-            position = H264AnnexB.__find_ebsp_escaped(buffer, position)
-            if position == -1:
-                break
-            position_list.append(position)
-            position += 4
-        return position_list
+        ebsp_view = memoryview(ebsp)
+        ebsp_length = len(ebsp)
+        rbsp = bytearray()
+        current_position = 0
+        while position != -1 and position + 3 < ebsp_length:
+            if ebsp[position + 3] <= 0x03:
+                # Drop 0x03 of 0x000003XX
+                rbsp += ebsp_view[current_position : position + 2]
+                current_position = position + 3
+            position = ebsp.find(H264AnnexB.__EBSP_ESCAPE_START_CODE, position + 4)
+        rbsp += ebsp_view[current_position:]
+        return bytes(rbsp)
 
     @staticmethod
-    def __ebsp_unescape(buffer: bytes):
-        return b"\x00\x00" + buffer[3:4]
+    def __rbsp_to_ebsp(rbsp: bytes):
+        position = rbsp.find(b"\x00\x00")
+        # No emulation prevention needed
+        if position == -1:
+            return rbsp
 
-    @staticmethod
-    def __ebsp_to_rbsp(ebsp: bytes):
-        rbsp = b""
-        escaped_positions = H264AnnexB.__list_ebsp_escaped_position(ebsp)
+        rbsp_view = memoryview(rbsp)
+        rbsp_length = len(rbsp)
+        ebsp = bytearray()
         current_position = 0
-        for escaped_position in escaped_positions:
-            rbsp += ebsp[current_position:escaped_position]
-            rbsp += H264AnnexB.__ebsp_unescape(
-                ebsp[escaped_position : escaped_position + 4]
-            )
-            current_position = escaped_position + 4
-        rbsp += ebsp[current_position:]
-        return rbsp
+        while position != -1 and position + 2 < rbsp_length:
+            tail_value = rbsp[position + 2]
+            if tail_value <= 0x03:
+                # Do not escape tail 0x000003
+                if position + 2 == rbsp_length - 1 and tail_value == 0x03:
+                    break
+                # Insert 0x03 into 0x0000XX
+                ebsp += rbsp_view[current_position : position + 2]
+                ebsp += b"\x03"
+                current_position = position + 2
+            position = rbsp.find(b"\x00\x00", position + 3)
+        ebsp += rbsp_view[current_position:]
+        return bytes(ebsp)
 
     @staticmethod
-    def __find_ebsp_escape_needed(buffer: bytes, start=0):
-        position = buffer.find(b"\x00\x00", start)
-        buffer_length = len(buffer)
-        if position == -1 or buffer_length - 1 < position + 2:
-            return -1
-        tail_value = buffer[position + 2]
-        if 0x03 < tail_value:
-            return H264AnnexB.__find_ebsp_escape_needed(buffer, position + 3)
-        # Do not escape tail 0x000003
-        if buffer_length - 1 == position + 2 and tail_value == 0x03:
-            return -1
-        return position
+    def __start_code_finder_find(buffer: bytes):
+        def find(start: int):
+            return buffer.find(H264AnnexB.__NAL_UNIT_START_CODE, start)
 
-    @staticmethod
-    def __list_ebsp_escape_needed_position(buffer: bytes):
-        position_list: list[int] = []
-        position = 0
-        while True:
-            position = H264AnnexB.__find_ebsp_escape_needed(buffer, position)
-            if position == -1:
-                break
-            position_list.append(position)
-            position += 3
-        return position_list
+        return find
 
     @staticmethod
-    def __ebsp_escape(buffer: bytes):
-        return b"\x00\x00\x03" + buffer[2:3]
+    def __start_code_finder_numpy(buffer: bytes):
+        import numpy
 
-    @staticmethod
-    def __rbsp_to_ebsp(rbsp: bytes):
-        ebsp = b""
-        escape_needed_positions = H264AnnexB.__list_ebsp_escape_needed_position(rbsp)
-        current_position = 0
-        for escape_needed_position in escape_needed_positions:
-            ebsp += rbsp[current_position:escape_needed_position]
-            ebsp += H264AnnexB.__ebsp_escape(
-                rbsp[escape_needed_position : escape_needed_position + 3]
-            )
-            current_position = escape_needed_position + 3
-        ebsp += rbsp[current_position:]
-        return ebsp
+        array = numpy.frombuffer(buffer, dtype=numpy.uint8)
+        candidates = numpy.flatnonzero(
+            (array[:-2] == 0x00) & (array[1:-1] == 0x00) & (array[2:] == 0x01)
+        )
 
-    @staticmethod
-    def index_nal_unit(stream: io.BufferedReader):
-        index: list[tuple[int, int]] = []
+        def find(start: int):
+            index = numpy.searchsorted(candidates, start)
+            if index == len(candidates):
+                return -1
+            return int(candidates[index])
 
-        last_position = -1
+        return find
+
+    @staticmethod
+    def __iter_nal_unit_position_bytewise(stream: io.BufferedReader):
         while True:
             nal_unit_type = H264AnnexB.seek_nal_unit(stream)
             if nal_unit_type is None:
                 break
             position = stream.tell()
+            yield position
+            stream.seek(position + 4)
+        # End of stream
+        yield stream.tell()
+
+    @staticmethod
+    def __iter_nal_unit_position_chunked(
+        stream: io.BufferedReader, backend: H264AnnexBScanBackend, chunk_size: int
+    ):
+        make_finder = H264AnnexB.__start_code_finder_find
+        if backend == H264AnnexBScanBackend.NUMPY:
+            # NumPy is optional, import only when it is selected
+            try:
+                import numpy
+            except ImportError:
+                raise RuntimeError("NumPy is not installed.")
+            make_finder = H264AnnexB.__start_code_finder_numpy
+
+        # Absolute position of buffer[0] and of the next chunk
+        buffer_position = stream.tell()
+        read_position = buffer_position
+        buffer = b""
+        find = make_finder(buffer)
+        # Start codes before start are already consumed
+        start = 0
+        end_of_stream = False
+        while True:
+            start_code_position = find(start)
+            # Need one more byte after the start code for the NAL unit header
+            if start_code_position == -1 or len(buffer) <= start_code_position + 3:
+                if end_of_stream:
+                    break
+                # Keep the bytes which may be a part of the next start code
+                keep_position = max(start, len(buffer) - 4)
+                stream.seek(read_position)
+                chunk: bytes = stream.read(chunk_size)
+                read_position += len(chunk)
+                if len(chunk) == 0:
+                    end_of_stream = True
+                buffer_position += keep_position
+                buffer = buffer[keep_position:] + chunk
+                find = make_finder(buffer)
+                start = max(start - keep_position, 0)
+                continue
+            # Count up to one more leading zero of the long start code
+            position = start_code_position
+            if start < start_code_position and buffer[start_code_position - 1] == 0x00:
+                position -= 1
+            yield buffer_position + position
+            start = position + 4
+        # End of stream
+        yield buffer_position + len(buffer)
+
+    @staticmethod
+    def iter_nal_unit_index(
+        stream: io.BufferedReader,
+        backend: H264AnnexBScanBackend = H264AnnexBScanBackend.FIND,
+        chunk_size: int = __SCAN_CHUNK_SIZE,
+    ):
+        """Iterate NAL unit index incrementally
+
+        The stream may be moved between iterations; scanning resumes from the last start code.
+
+        Args:
+            stream (io.BufferedReader): Readable and seekable stream of H.264-ES
+            backend (H264AnnexBScanBackend, optional): Start code scanner. Defaults to H264AnnexBScanBackend.FIND.
+            chunk_size (int, optional): Read size of chunked scanners. Defaults to 1 MiB.
+
+        Yields:
+            tuple[int, int]: Position and size of NAL unit
+        """
+
+        positions = Profiler.iterate(
+            "h264_annex_b.index_nal_unit",
+            H264AnnexB.__iter_nal_unit_position_bytewise(stream)
+            if backend == H264AnnexBScanBackend.BYTEWISE
+            else H264AnnexB.__iter_nal_unit_position_chunked(
+                stream, backend, chunk_size
+            ),
+            "nal_units",
+        )
+        last_position = -1
+        for position in positions:
             if last_position != -1:
-                index.append((last_position, position - last_position))
+                yield (last_position, position - last_position)
             last_position = position
-            stream.seek(4, os.SEEK_CUR)
-
-        if last_position != -1:
-            position = stream.tell()
-            index.append((last_position, position - last_position))
 
+    @staticmethod
+    def index_nal_unit(
+        stream: io.BufferedReader,
+        backend: H264AnnexBScanBackend = H264AnnexBScanBackend.FIND,
+    ):
+        index: list[tuple[int, int]] = list(
+            H264AnnexB.iter_nal_unit_index(stream, backend)
+        )
         return index
 
     @staticmethod
-    def parse_nal_unit(buffer: bytes):
-        if len(buffer) < 4:
+    def __parse_nal_unit_header(buffer: bytes, size: int):
+        if size < 4:
             H264AnnexB.__logger.warning("Invalid buffer length.")
             return
 
-        stream = io.BytesIO(buffer)
-
         # Prefix
-        prefix_zero_count = 0
-        for _ in range(4):
-            if int.from_bytes(stream.read(1), byteorder="big") == 0x01:
-                break
-            prefix_zero_count += 1
+        prefix_zero_count = buffer.find(b"\x01", 0, 4)
+        if prefix_zero_count == -1:
+            prefix_zero_count = 4
         is_start_code_long = False if prefix_zero_count <= 2 else True
         # Read header
-        header_buffer = stream.read(1)
-        if len(header_buffer) != 1:
+        header_position = prefix_zero_count + 1 if prefix_zero_count < 4 else 4
+        if len(buffer) <= header_position:
             H264AnnexB.__logger.warning("Invalid header_buffer length.")
             return
-        header = int.from_bytes(header_buffer, byteorder="big")
+        header = buffer[header_position]
         forbidden_zero_bit = header >> 7
         if forbidden_zero_bit != 0x00:
             H264AnnexB.__logger.warning("Invalid forbidden_zero_bit.")
             return
         nal_ref_idc = (header >> 5) & 0x03
         nal_unit_type = header & 0x1F
+
+        return is_start_code_long, nal_ref_idc, nal_unit_type, header_position + 1
+
+    @staticmethod
+    def parse_nal_unit(buffer: bytes):
+        nal_unit_header = H264AnnexB.__parse_nal_unit_header(buffer, len(buffer))
+        if nal_unit_header is None:
+            return
+        is_start_code_long, nal_ref_idc, nal_unit_type, ebsp_position = nal_unit_header
         # Read EBSP
-        ebsp = stream.read()
+        ebsp = buffer[ebsp_position:]
+        profiler = Profiler.current
+        if profiler is not None:
+            start_time = time.perf_counter()
         rbsp = H264AnnexB.__ebsp_to_rbsp(ebsp)
+        if profiler is not None:
+            profiler.add(
+                "h264_annex_b.ebsp_to_rbsp",
+                time.perf_counter() - start_time,
+                bytes=len(ebsp),
+                nal_units=1,
+            )
 
         return H264NalUnit(is_start_code_long, nal_ref_idc, nal_unit_type, rbsp)
 
+    @staticmethod
+    def parse_nal_unit_range(buffer: bytes, position: int, size: int):
+        """Parse NAL unit header only
+
+        Args:
+            buffer (bytes): First NAL_UNIT_HEADER_END bytes of NAL unit, or the whole NAL unit if shorter
+            position (int): Position of NAL unit in its source
+            size (int): Size of NAL unit
+
+        Returns:
+            H264NalUnitRange | None: NAL unit header and range, None if invalid
+        """
+
+        nal_unit_header = H264AnnexB.__parse_nal_unit_header(buffer, size)
+        if nal_unit_header is None:
+            return
+        _, nal_ref_idc, nal_unit_type, _ = nal_unit_header
+
+        return H264NalUnitRange(nal_ref_idc, nal_unit_type, position, size)
+
     @staticmethod
     def serialize_nal_unit(nal_unit: H264NalUnit):
         prefix = (
@@ -192,6 +310,16 @@ class H264AnnexB:
         header = (nal_unit.nal_ref_idc & 0x03) << 5
         header |= nal_unit.nal_unit_type & 0x1F
 
+        profiler = Profiler.current
+        if profiler is not None:
+            start_time = time.perf_counter()
         ebsp = H264AnnexB.__rbsp_to_ebsp(nal_unit.rbsp)
+        if profiler is not None:
+            profiler.add(
+                "h264_annex_b.rbsp_to_ebsp",
+                time.perf_counter() - start_time,
+                bytes=len(nal_unit.rbsp),
+                nal_units=1,
+            )
 
         return prefix + header.to_bytes(length=1, byteorder="big") + ebsp
@@ -6,3 +6,10 @@ class H264NalUnit(NamedTuple):
     nal_ref_idc: int
     nal_unit_type: int
     rbsp: bytes
+
+
+class H264NalUnitRange(NamedTuple):
+    nal_ref_idc: int
+    nal_unit_type: int
+    position: int
+    size: int
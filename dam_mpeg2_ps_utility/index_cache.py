@@ -0,0 +1,338 @@
+import functools
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import time
+from typing import IO, Callable, Iterable
+
+from dam_mpeg2_ps_utility.customized_logger import getLogger
+
+
+class IndexCache:
+    """On-disk cache of NAL unit and packet indexes
+
+    Indexes are stored as binary files in a cache directory, keyed by the size, mtime and a partial content hash of the indexed file. The least recently used files are evicted when the directory grows over max_size.
+    """
+
+    DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+    # Seconds, active writers write their temporary files every few thousand entries
+    STALE_TEMP_FILE_AGE = 60 * 60
+
+    __MAGIC = b"DAMIDX01"
+    # Magic, Fingerprint, Entry count
+    __HEADER = struct.Struct("<8s16sI")
+    # Position, Size, Type
+    __ENTRY = struct.Struct("<QIB")
+    __FINGERPRINT_CHUNK_SIZE = 64 * 1024
+    __CHUNK_ENTRY_COUNT = 4096
+
+    __logger = getLogger("IndexCache")
+
+    def __init__(self, directory: str | None = None, max_size=DEFAULT_MAX_SIZE):
+        """Constructor
+
+        Args:
+            directory (str | None, optional): Cache directory. Defaults to None ($DAM_MPEG2_PS_INDEX_CACHE_DIR or the user cache directory).
+            max_size (int, optional): Maximum total size of cache files. Defaults to 256 MiB.
+        """
+
+        self.directory = (
+            directory if directory is not None else IndexCache.default_directory()
+        )
+        self.max_size = max_size
+
+    @staticmethod
+    def default_directory():
+        directory = os.environ.get("DAM_MPEG2_PS_INDEX_CACHE_DIR")
+        if directory is not None:
+            return directory
+        cache_home = os.environ.get("XDG_CACHE_HOME")
+        if cache_home is None:
+            cache_home = os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(cache_home, "dam_mpeg2_ps_utility")
+
+    @staticmethod
+    def fingerprint(stream: io.BufferedReader):
+        """Fingerprint of a file
+
+        Args:
+            stream (io.BufferedReader): Readable and seekable stream of file
+
+        Returns:
+            bytes: Fingerprint
+        """
+
+        stat = os.fstat(stream.fileno())
+        content_hash = hashlib.blake2b(digest_size=16)
+        content_hash.update(struct.pack("<QQ", stat.st_size, stat.st_mtime_ns))
+        position = stream.tell()
+        stream.seek(0)
+        content_hash.update(stream.read(IndexCache.__FINGERPRINT_CHUNK_SIZE))
+        stream.seek(max(stat.st_size - IndexCache.__FINGERPRINT_CHUNK_SIZE, 0))
+        content_hash.update(stream.read(IndexCache.__FINGERPRINT_CHUNK_SIZE))
+        stream.seek(position)
+        return content_hash.digest()
+
+    def __path(self, kind: str, fingerprint: bytes):
+        return os.path.join(self.directory, f"{kind}-{fingerprint.hex()}.idx")
+
+    def load(self, kind: str, stream: io.BufferedReader):
+        """Load index of a file
+
+        Entries are read from the cache file in chunks while they are iterated.
+
+        Args:
+            kind (str): Kind of index
+            stream (io.BufferedReader): Readable and seekable stream of indexed file
+
+        Returns:
+            Iterator[tuple[int, int, int]] | None: Position, size and type of entries, None if not cached
+        """
+
+        fingerprint = IndexCache.fingerprint(stream)
+        path = self.__path(kind, fingerprint)
+        try:
+            cache_file = open(path, "rb")
+        except OSError:
+            return
+
+        try:
+            header = cache_file.read(IndexCache.__HEADER.size)
+            file_size = os.fstat(cache_file.fileno()).st_size
+        except OSError:
+            cache_file.close()
+            return
+        if len(header) < IndexCache.__HEADER.size:
+            cache_file.close()
+            IndexCache.__logger.warning("Invalid index cache length.")
+            return
+        magic, cached_fingerprint, entry_count = IndexCache.__HEADER.unpack(header)
+        if (
+            magic != IndexCache.__MAGIC
+            or cached_fingerprint != fingerprint
+            or file_size
+            != IndexCache.__HEADER.size + IndexCache.__ENTRY.size * entry_count
+        ):
+            cache_file.close()
+            IndexCache.__logger.warning("Invalid index cache.")
+            return
+
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return IndexCache.__iter_entries(cache_file)
+
+    @staticmethod
+    def __iter_entries(cache_file: io.BufferedReader):
+        with cache_file:
+            while True:
+                buffer = cache_file.read(
+                    IndexCache.__ENTRY.size * IndexCache.__CHUNK_ENTRY_COUNT
+                )
+                if len(buffer) == 0:
+                    break
+                yield from IndexCache.__ENTRY.iter_unpack(buffer)
+
+    def writer(self, kind: str, stream: io.BufferedReader):
+        """Writer of index of a file
+
+        Args:
+            kind (str): Kind of index
+            stream (io.BufferedReader): Readable and seekable stream of indexed file
+
+        Returns:
+            IndexCacheWriter: Writer, committed on exit of the with statement
+        """
+
+        fingerprint = IndexCache.fingerprint(stream)
+        return IndexCacheWriter(
+            self,
+            self.__path(kind, fingerprint),
+            functools.partial(
+                IndexCache.__HEADER.pack, IndexCache.__MAGIC, fingerprint
+            ),
+            IndexCache.__ENTRY,
+        )
+
+    def store(
+        self,
+        kind: str,
+        stream: io.BufferedReader,
+        entries: Iterable[tuple[int, int, int]],
+    ):
+        """Store index of a file
+
+        Args:
+            kind (str): Kind of index
+            stream (io.BufferedReader): Readable and seekable stream of indexed file
+            entries (Iterable[tuple[int, int, int]]): Position, size and type of entries
+        """
+
+        with self.writer(kind, stream) as cache_writer:
+            for entry in entries:
+                cache_writer.append(entry)
+
+    def evict(self):
+        """Remove least recently used cache files over max_size
+
+        Temporary files of writers count against max_size. They are removed if not written for STALE_TEMP_FILE_AGE seconds, such as when the writer was killed.
+        """
+
+        cache_files: list[tuple[int, int, str]] = []
+        temp_file_size = 0
+        stale_time = time.time_ns() - IndexCache.STALE_TEMP_FILE_AGE * 1000000000
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    is_temp_file = entry.name.endswith(".tmp")
+                    if not is_temp_file and not entry.name.endswith(".idx"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if not is_temp_file:
+                        cache_files.append(
+                            (stat.st_mtime_ns, stat.st_size, entry.path)
+                        )
+                        continue
+                    if stat.st_mtime_ns < stale_time:
+                        try:
+                            os.remove(entry.path)
+                            continue
+                        except OSError:
+                            pass
+                    temp_file_size += stat.st_size
+        except OSError:
+            return
+
+        total_size = temp_file_size + sum(size for _, size, _ in cache_files)
+        cache_files.sort()
+        for _, size, path in cache_files:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+
+
+class IndexCacheWriter:
+    """Incremental writer of an index cache file
+
+    Entries are written to a temporary file in the cache directory as they are appended, and the temporary file replaces the cache file on commit. It is removed instead if the writer is discarded, such as by an exception in the with statement. Failures are logged and leave the cache unchanged.
+    """
+
+    # Entry count buffered before a write
+    __CHUNK_ENTRY_COUNT = 4096
+
+    __logger = getLogger("IndexCacheWriter")
+
+    def __init__(
+        self,
+        index_cache: IndexCache,
+        path: str,
+        pack_header: Callable[[int], bytes],
+        entry_struct: struct.Struct,
+    ):
+        """Constructor
+
+        Args:
+            index_cache (IndexCache): Cache to store into
+            path (str): Cache file path
+            pack_header (Callable[[int], bytes]): Pack the header of an entry count
+            entry_struct (struct.Struct): Struct of entries
+        """
+
+        self.__index_cache = index_cache
+        self.__path = path
+        self.__pack_header = pack_header
+        self.__entry_struct = entry_struct
+        self.__entry_count = 0
+        self.__buffer = bytearray()
+        self.__file: IO[bytes] | None = None
+        try:
+            os.makedirs(index_cache.directory, exist_ok=True)
+            self.__file = tempfile.NamedTemporaryFile(
+                "wb", dir=index_cache.directory, suffix=".tmp", delete=False
+            )
+            # Entry count is written on commit
+            self.__file.write(pack_header(0))
+        except OSError as exception:
+            self.__fail(exception)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+    def append(self, entry: tuple[int, int, int]):
+        """Append an entry
+
+        Args:
+            entry (tuple[int, int, int]): Position, size and type of entry
+        """
+
+        if self.__file is None:
+            return
+        self.__buffer += self.__entry_struct.pack(*entry)
+        self.__entry_count += 1
+        if self.__entry_count % IndexCacheWriter.__CHUNK_ENTRY_COUNT == 0:
+            self.__flush()
+
+    def __flush(self):
+        if self.__file is None:
+            return
+        try:
+            self.__file.write(self.__buffer)
+        except OSError as exception:
+            self.__fail(exception)
+        self.__buffer.clear()
+
+    def commit(self):
+        """Write the header and replace the cache file"""
+
+        self.__flush()
+        cache_file = self.__file
+        if cache_file is None:
+            return
+        try:
+            cache_file.seek(0)
+            cache_file.write(self.__pack_header(self.__entry_count))
+            cache_file.close()
+            os.replace(cache_file.name, self.__path)
+        except OSError as exception:
+            self.__fail(exception)
+            return
+        self.__file = None
+        self.__index_cache.evict()
+
+    def discard(self):
+        """Remove the temporary file without replacing the cache file"""
+
+        cache_file = self.__file
+        if cache_file is None:
+            return
+        self.__file = None
+        self.__buffer.clear()
+        try:
+            cache_file.close()
+        except OSError:
+            pass
+        try:
+            os.remove(cache_file.name)
+        except OSError:
+            pass
+
+    def __fail(self, exception: OSError):
+        IndexCacheWriter.__logger.warning("Failed to store index cache. %s", exception)
+        self.discard()
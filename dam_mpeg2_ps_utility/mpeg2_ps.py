@@ -1,6 +1,10 @@
 import bitstring
 from dam_mpeg2_ps_utility.customized_logger import getLogger
 import io
+import struct
+import time
+from typing import Iterable
+from dam_mpeg2_ps_utility.profiler import Profiler
 from dam_mpeg2_ps_utility.mpeg2_ps_data import (
     Mpeg2PsProgramEnd,
     Mpeg2PesPacketType1,
@@ -21,73 +25,245 @@ from dam_mpeg2_ps_utility.mpeg2_ps_data import (
 )
 
 
+def _make_crc32_table():
+    table: list[int] = []
+    for value in range(256):
+        crc = value << 24
+        for _ in range(8):
+            msb = crc >> 31
+            crc <<= 1
+            crc ^= (0 - msb) & 0x104C11DB7
+        table.append(crc)
+    return table
+
+
 class Mpeg2Ps:
     """MPEG2-PS"""
 
     SYSTEM_CLOCK_FREQUENCY = 27000000
     PACKET_START_CODE = b"\x00\x00\x01"
+    __RESYNC_CHUNK_SIZE = 1024 * 1024
+
+    # packet_start_code_prefix, stream_id, PES_packet_length
+    __PES_PACKET_HEADER = struct.Struct(">3sBH")
+    # ... and flags, PES_header_data_length
+    __PES_PACKET_TYPE1_HEADER = struct.Struct(">3sBHBBB")
+    # pack_start_code, SCR (16 + 32 bits), program_mux_rate (16 + 8 bits), pack_stuffing_length
+    __PS_PACK_HEADER = struct.Struct(">4sHIHBB")
+    # rate_bound (8 + 16 bits), flags
+    __PS_SYSTEM_HEADER = struct.Struct(">BHBBB")
+    __PS_SYSTEM_HEADER_P_STD_INFO = struct.Struct(">BH")
+    # stream_type, elementary_stream_id, elementary_stream_info_length
+    __ELEMENTARY_STREAM_MAP_ENTRY = struct.Struct(">BBH")
+
+    __CRC32_TABLE = _make_crc32_table()
 
     __logger = getLogger("Mpeg2Ps")
 
     @staticmethod
-    def crc32(buffer: bytes):
-        crc = 0xFFFFFFFF
+    def crc32(buffer: bytes, crc: int = 0xFFFFFFFF):
+        """Calculate CRC-32/MPEG-2
+
+        Args:
+            buffer (bytes): Data
+            crc (int, optional): CRC of preceding data to continue from. Defaults to 0xFFFFFFFF.
+
+        Returns:
+            int: CRC
+        """
+
+        profiler = Profiler.current
+        if profiler is not None:
+            start_time = time.perf_counter()
+        table = Mpeg2Ps.__CRC32_TABLE
         for value in buffer:
-            crc ^= value << 24
-            for _ in range(8):
-                msb = crc >> 31
-                crc <<= 1
-                crc ^= (0 - msb) & 0x104C11DB7
+            crc = ((crc << 8) & 0xFFFFFFFF) ^ table[(crc >> 24) ^ value]
+        if profiler is not None:
+            profiler.add(
+                "mpeg2_ps.crc32", time.perf_counter() - start_time, bytes=len(buffer)
+            )
         return crc
 
     @staticmethod
-    def seek_packet(stream: bitstring.BitStream, packet_id: int | None = None):
-        zero_count = 0
+    def size_of_packet(header: bytes):
+        """Get packet size declared by its header
+
+        Args:
+            header (bytes): First 14 bytes of packet (or fewer at end of stream)
+
+        Returns:
+            int | None: Packet size, None if header is not a valid MPEG2-PS packet start
+        """
+
+        if len(header) < 4 or header[0:3] != Mpeg2Ps.PACKET_START_CODE:
+            return
+        packet_id = header[3]
+        if packet_id == 0xB9:
+            return 4
+        if packet_id < 0xB9:
+            return
+        if packet_id == 0xBA:
+            # '01' of MPEG-2 PS Pack Header
+            if len(header) < 14 or header[4] & 0xC0 != 0x40:
+                return
+            return 14 + (header[13] & 0x07)
+        if len(header) < 6:
+            return
+        return 6 + int.from_bytes(header[4:6], byteorder="big")
+
+    @staticmethod
+    def find_packet_start_code(buffer: bytes, start: int = 0):
         while True:
-            current_byte: int
-            try:
-                current_byte = stream.read("uint:8")
-            except bitstring.ReadError:
+            position = buffer.find(Mpeg2Ps.PACKET_START_CODE, start)
+            if position == -1 or len(buffer) - 1 < position + 3:
+                return -1
+            if 0xB9 <= buffer[position + 3]:
+                return position
+            start = position + 1
+
+    @staticmethod
+    def __peek_packet_size(stream: bitstring.BitStream):
+        remaining = (stream.len - stream.pos) // 8
+        header: bytes = stream.peek(f"bytes:{min(14, remaining)}")
+        return Mpeg2Ps.size_of_packet(header), header
+
+    @staticmethod
+    def __resync_packet(stream: bitstring.BitStream):
+        end_position = stream.len // 8
+        # Skip the current invalid packet start
+        start = 1
+        while True:
+            remaining = end_position - stream.bytepos
+            chunk: bytes = stream.peek(
+                f"bytes:{min(Mpeg2Ps.__RESYNC_CHUNK_SIZE, remaining)}"
+            )
+            position = Mpeg2Ps.find_packet_start_code(chunk, start)
+            if position != -1:
+                stream.bytepos += position
+                return True
+            if len(chunk) == remaining:
                 # End of stream
-                break
-            if 2 <= zero_count and current_byte == 0x01:
-                try:
-                    current_byte = stream.read("uint:8")
-                except bitstring.ReadError:
-                    # End of stream
-                    break
-                if packet_id is None:
-                    stream.bytepos -= 4
-                    return current_byte
-                else:
-                    if current_byte == packet_id:
-                        stream.bytepos -= 4
-                        return current_byte
-            # Count zero
-            if current_byte == 0x00:
-                zero_count += 1
-            else:
-                zero_count = 0
+                stream.bytepos = end_position
+                return False
+            # Keep the bytes which may be a part of the next start code
+            stream.bytepos += len(chunk) - 3
+            start = 0
+
+    @staticmethod
+    def seek_packet(stream: bitstring.BitStream, packet_id: int | None = None):
+        """Seek MPEG2-PS packet
+
+        Jump from header to header by the declared packet size. Search start code only when the stream is not on a packet boundary.
+
+        Args:
+            stream (bitstring.BitStream): MPEG2-PS stream
+            packet_id (int | None, optional): Packet ID to seek. Defaults to None.
+
+        Returns:
+            int | None: Packet ID, None if not found
+        """
+
+        end_position = stream.len // 8
+        while True:
+            packet_size, header = Mpeg2Ps.__peek_packet_size(stream)
+            if packet_size is None:
+                if not Mpeg2Ps.__resync_packet(stream):
+                    return
+                continue
+            if packet_id is None or header[3] == packet_id:
+                return header[3]
+            if end_position < stream.bytepos + packet_size:
+                # Truncated packet
+                stream.bytepos = end_position
+                return
+            stream.bytepos += packet_size
 
     @staticmethod
     def index_packets(stream: bitstring.BitStream, packet_id: int | None = None):
         index: list[tuple[int, int]] = []
 
-        last_position = -1
         while True:
-            packet_id = Mpeg2Ps.seek_packet(stream, packet_id)
-            if packet_id is None:
+            if Mpeg2Ps.seek_packet(stream, packet_id) is None:
                 break
-            if last_position != -1:
-                index.append((last_position, stream.bytepos - last_position))
-            last_position = stream.bytepos
-            stream.bytepos += 4
-
-        if last_position != -1:
-            index.append((last_position, stream.bytepos - last_position))
+            position = stream.bytepos
+            packet_size, _ = Mpeg2Ps.__peek_packet_size(stream)
+            packet_size = min(packet_size, stream.len // 8 - position)
+            index.append((position, packet_size))
+            stream.bytepos += packet_size
 
         return index
 
+    @staticmethod
+    def iter_packet_index(stream: io.BufferedReader, packet_id: int | None = None):
+        """Iterate MPEG2-PS packet index of a file
+
+        Only packet headers are read, the rest of the file is skipped by seeking.
+
+        Args:
+            stream (io.BufferedReader): Readable and seekable stream of MPEG2-PS
+            packet_id (int | None, optional): Packet ID to index. Defaults to None.
+
+        Yields:
+            tuple[int, int]: Position and size of packet. The size of a truncated packet is clamped to the end of the stream.
+        """
+
+        position = stream.tell()
+        stream_size = stream.seek(0, io.SEEK_END)
+        while True:
+            stream.seek(position)
+            header = stream.read(14)
+            packet_size = Mpeg2Ps.size_of_packet(header)
+            if packet_size is None:
+                # Resync, skip the current invalid packet start
+                chunk_position = position + 1
+                while True:
+                    stream.seek(chunk_position)
+                    chunk = stream.read(Mpeg2Ps.__RESYNC_CHUNK_SIZE)
+                    found_position = Mpeg2Ps.find_packet_start_code(chunk)
+                    if found_position != -1 or len(chunk) < 4:
+                        break
+                    # Keep the bytes which may be a part of the next start code
+                    chunk_position += len(chunk) - 3
+                if found_position == -1:
+                    # End of stream
+                    break
+                position = chunk_position + found_position
+                continue
+            packet_size = min(packet_size, stream_size - position)
+            if packet_id is None or header[3] == packet_id:
+                yield (position, packet_size)
+            position += packet_size
+
+    @staticmethod
+    def iter_packets(
+        source: str | io.BufferedReader,
+        stream_ids: Iterable[int] | None = None,
+        decode=False,
+    ):
+        """Iterate MPEG2-PS packets of a file
+
+        The file is memory-mapped by Mpeg2PsReader, and packets are filtered by stream_id before the rest of the packet is touched.
+
+        Args:
+            source (str | io.BufferedReader): File path or readable stream of MPEG2-PS file
+            stream_ids (Iterable[int] | None, optional): stream_id of packets to iterate. Defaults to None (All packets).
+            decode (bool, optional): Yield decoded packets instead of views. Defaults to False.
+
+        Yields:
+            Mpeg2PsPacketView | Mpeg2PsPacket: View of packet, or decoded packet if decode is set
+        """
+
+        # Mpeg2PsReader depends on Mpeg2Ps
+        from dam_mpeg2_ps_utility.mpeg2_ps_reader import Mpeg2PsReader
+
+        if isinstance(source, str):
+            with open(source, "rb") as stream:
+                yield from Mpeg2Ps.iter_packets(stream, stream_ids, decode)
+            return
+
+        with Mpeg2PsReader(source) as reader:
+            yield from reader.iter_packets(stream_ids, decode)
+
     @staticmethod
     def peek_packet_id(stream: bitstring.BitStream):
         buffer: bytes = stream.peek("bytes:4")
@@ -184,70 +360,116 @@ class Mpeg2Ps:
             return Mpeg2PesPacketType3(stream_id, PES_packet_length)
 
     @staticmethod
-    def write_pes_packet(stream: bitstring.BitStream, data: Mpeg2PesPacket):
-        stream.append(Mpeg2Ps.PACKET_START_CODE)
-        stream.append(bitstring.pack("uint:8", data.stream_id))
-        PES_packet_stream = bitstring.BitStream()
+    def __encode_timestamp(prefix: int, timestamp: int):
+        raw_timestamp = prefix
+        raw_timestamp |= (timestamp & (0x0007 << 30)) << 3
+        raw_timestamp |= (timestamp & (0x7FFF << 15)) << 2
+        raw_timestamp |= (timestamp & 0x7FFF) << 1
+        return raw_timestamp.to_bytes(5, byteorder="big")
+
+    @staticmethod
+    def decode_timestamp(buffer: bytes):
+        """Decode PTS or DTS of PES packet header
+
+        Args:
+            buffer (bytes): 5 bytes of timestamp with its prefix and marker bits
+
+        Returns:
+            int: Timestamp (90 kHz)
+        """
+
+        raw_timestamp = int.from_bytes(buffer[0:5], byteorder="big")
+        return (
+            ((raw_timestamp >> 33) & 0x0007) << 30
+            | ((raw_timestamp >> 17) & 0x7FFF) << 15
+            | ((raw_timestamp >> 1) & 0x7FFF)
+        )
+
+    @staticmethod
+    def serialize_pes_packet_header(data: Mpeg2PesPacket):
+        """Serialize PES packet header
+
+        Args:
+            data (Mpeg2PesPacket): PES packet
+
+        Returns:
+            bytes: Header bytes which precede PES_packet_data
+        """
+
         if isinstance(data, Mpeg2PesPacketType1):
-            PES_packet_stream.append(bitstring.BitArray(bin="10"))
-            PES_packet_stream.append(
-                bitstring.pack("uint:2", data.PES_scrambling_control)
+            PES_header_data_buffer = b""
+            if data.PTS_DTS_flags == 0x02:
+                PES_header_data_buffer = Mpeg2Ps.__encode_timestamp(
+                    0x2100010001, data.pts
+                )
+            elif data.PTS_DTS_flags == 0x03:
+                PES_header_data_buffer = Mpeg2Ps.__encode_timestamp(
+                    0x3100010001, data.pts
+                ) + Mpeg2Ps.__encode_timestamp(0x1100010001, data.dts)
+            flags_0 = 0x80
+            flags_0 |= (data.PES_scrambling_control & 0x03) << 4
+            flags_0 |= (data.PES_priority & 0x01) << 3
+            flags_0 |= (data.data_alignment_indicator & 0x01) << 2
+            flags_0 |= (data.copyright & 0x01) << 1
+            flags_0 |= data.original_or_copy & 0x01
+            flags_1 = (data.PTS_DTS_flags & 0x03) << 6
+            flags_1 |= (data.ESCR_flag & 0x01) << 5
+            flags_1 |= (data.ES_rate_flag & 0x01) << 4
+            flags_1 |= (data.DSM_trick_mode_flag & 0x01) << 3
+            flags_1 |= (data.additional_copy_info_flag & 0x01) << 2
+            flags_1 |= (data.PES_CRC_flag & 0x01) << 1
+            flags_1 |= data.PES_extension_flag & 0x01
+            PES_header_data_length = len(PES_header_data_buffer)
+            return (
+                Mpeg2Ps.__PES_PACKET_TYPE1_HEADER.pack(
+                    Mpeg2Ps.PACKET_START_CODE,
+                    data.stream_id,
+                    3 + PES_header_data_length + len(data.PES_packet_data),
+                    flags_0,
+                    flags_1,
+                    PES_header_data_length,
+                )
+                + PES_header_data_buffer
             )
-            PES_packet_stream.append(bitstring.pack("uint:1", data.PES_priority))
-            PES_packet_stream.append(
-                bitstring.pack("uint:1", data.data_alignment_indicator)
+        elif isinstance(data, Mpeg2PesPacketType2):
+            return Mpeg2Ps.__PES_PACKET_HEADER.pack(
+                Mpeg2Ps.PACKET_START_CODE, data.stream_id, len(data.PES_packet_data)
             )
-            PES_packet_stream.append(bitstring.pack("uint:1", data.copyright))
-            PES_packet_stream.append(bitstring.pack("uint:1", data.original_or_copy))
-            PES_packet_stream.append(bitstring.pack("uint:2", data.PTS_DTS_flags))
-            PES_packet_stream.append(bitstring.pack("uint:1", data.ESCR_flag))
-            PES_packet_stream.append(bitstring.pack("uint:1", data.ES_rate_flag))
-            PES_packet_stream.append(bitstring.pack("uint:1", data.DSM_trick_mode_flag))
-            PES_packet_stream.append(
-                bitstring.pack("uint:1", data.additional_copy_info_flag)
+        elif isinstance(data, Mpeg2PesPacketType3):
+            return Mpeg2Ps.__PES_PACKET_HEADER.pack(
+                Mpeg2Ps.PACKET_START_CODE, data.stream_id, data.PES_packet_length
             )
-            PES_packet_stream.append(bitstring.pack("uint:1", data.PES_CRC_flag))
-            PES_packet_stream.append(bitstring.pack("uint:1", data.PES_extension_flag))
 
-            PES_header_data_stream = bitstring.BitStream()
-            if data.PTS_DTS_flags == 0x02:
-                raw_PTS = 0x2100010001
-                raw_PTS |= (data.pts & (0x0007 << 30)) << 3
-                raw_PTS |= (data.pts & (0x7FFF << 15)) << 2
-                raw_PTS |= (data.pts & 0x7FFF) << 1
-                PES_header_data_stream.append(bitstring.pack("uintbe:40", raw_PTS))
-            elif data.PTS_DTS_flags == 0x03:
-                raw_PTS = 0x3100010001
-                raw_PTS |= (data.pts & (0x0007 << 30)) << 3
-                raw_PTS |= (data.pts & (0x7FFF << 15)) << 2
-                raw_PTS |= (data.pts & 0x7FFF) << 1
-                PES_header_data_stream.append(bitstring.pack("uintbe:40", raw_PTS))
-                raw_DTS = 0x1100010001
-                raw_DTS |= (data.dts & (0x0007 << 30)) << 3
-                raw_DTS |= (data.dts & (0x7FFF << 15)) << 2
-                raw_DTS |= (data.dts & 0x7FFF) << 1
-                PES_header_data_stream.append(bitstring.pack("uintbe:40", raw_DTS))
-            PES_header_data_buffer = PES_header_data_stream.tobytes()
-            PES_packet_stream.append(
-                bitstring.pack("uint:8", len(PES_header_data_buffer))
+    @staticmethod
+    def write_pes_packet(
+        stream: bitstring.BitStream | bytearray, data: Mpeg2PesPacket
+    ):
+        profiler = Profiler.current
+        if profiler is not None:
+            start_time = time.perf_counter()
+        header = Mpeg2Ps.serialize_pes_packet_header(data)
+        stream += header
+        payload_size = 0
+        if isinstance(data, Mpeg2PesPacketType1) or isinstance(
+            data, Mpeg2PesPacketType2
+        ):
+            # bytearray takes memoryview of PES_packet_data without copy
+            stream += (
+                data.PES_packet_data
+                if isinstance(stream, bytearray)
+                else bytes(data.PES_packet_data)
             )
-            PES_packet_stream.append(PES_header_data_buffer)
-
-            PES_packet_stream.append(data.PES_packet_data)
-
-            PES_packet_buffer = PES_packet_stream.tobytes()
-            stream.append(bitstring.pack("uintbe:16", len(PES_packet_buffer)))
-            stream.append(PES_packet_buffer)
-
-            return
-        elif isinstance(data, Mpeg2PesPacketType2):
-            stream.append(bitstring.pack("uintbe:16", len(data.PES_packet_data)))
-            stream.append(data.PES_packet_data)
-            return
+            payload_size = len(data.PES_packet_data)
         elif isinstance(data, Mpeg2PesPacketType3):
-            stream.append(bitstring.pack("uintbe:16", data.PES_packet_length))
-            for _ in range(data.PES_packet_length):
-                stream.append(b"\xff")
+            stream += b"\xff" * data.PES_packet_length
+            payload_size = data.PES_packet_length
+        if profiler is not None:
+            profiler.add(
+                "mpeg2_ps.write_pes_packet",
+                time.perf_counter() - start_time,
+                bytes=len(header) + payload_size,
+                packets=1,
+            )
 
     @staticmethod
     def read_ps_pack_header(stream: bitstring.BitStream):
@@ -255,7 +477,7 @@ class Mpeg2Ps:
         if pack_start_code != (Mpeg2Ps.PACKET_START_CODE + b"\xba"):
             raise RuntimeError("Invalid pack_start_code.")
         system_clock_reference_raw: int = stream.read("uintbe:48")
-        system_clock_reference_base = (system_clock_reference_raw >> 13) & (0x03 << 30)
+        system_clock_reference_base = (system_clock_reference_raw >> 13) & (0x07 << 30)
         system_clock_reference_base |= (system_clock_reference_raw >> 12) & (
             0x7FFF << 15
         )
@@ -273,11 +495,10 @@ class Mpeg2Ps:
         )
 
     @staticmethod
-    def write_ps_pack_header(stream: bitstring.BitStream, data: Mpeg2PsPackHeader):
-        stream.append(Mpeg2Ps.PACKET_START_CODE + b"\xba")
+    def serialize_ps_pack_header(data: Mpeg2PsPackHeader):
         system_clock_reference_raw = 0x440004000401
         system_clock_reference_raw |= (
-            data.system_clock_reference_base & (0x03 << 30)
+            data.system_clock_reference_base & (0x07 << 30)
         ) << 13
         system_clock_reference_raw |= (
             data.system_clock_reference_base & (0x7FFF << 15)
@@ -286,15 +507,24 @@ class Mpeg2Ps:
         system_clock_reference_raw |= (
             data.system_clock_reference_extension & 0x01FF
         ) << 1
-        stream.append(bitstring.pack("uintbe:48", system_clock_reference_raw))
         program_mux_rate_raw = 0x000003
         program_mux_rate_raw |= (data.program_mux_rate & 0x3FFFFF) << 2
-        stream.append(bitstring.pack("uintbe:24", program_mux_rate_raw))
         pack_stuffing_length_raw = 0xF8
-        pack_stuffing_length_raw |= data.pack_stuffing_length & 0x03
-        stream.append(bitstring.pack("uint:8", pack_stuffing_length_raw))
-        for _ in range(data.pack_stuffing_length):
-            stream.append(b"\0xff")
+        pack_stuffing_length_raw |= data.pack_stuffing_length & 0x07
+        return Mpeg2Ps.__PS_PACK_HEADER.pack(
+            Mpeg2Ps.PACKET_START_CODE + b"\xba",
+            system_clock_reference_raw >> 32,
+            system_clock_reference_raw & 0xFFFFFFFF,
+            program_mux_rate_raw >> 8,
+            program_mux_rate_raw & 0xFF,
+            pack_stuffing_length_raw,
+        ) + (b"\xff" * (data.pack_stuffing_length & 0x07))
+
+    @staticmethod
+    def write_ps_pack_header(
+        stream: bitstring.BitStream | bytearray, data: Mpeg2PsPackHeader
+    ):
+        stream += Mpeg2Ps.serialize_ps_pack_header(data)
 
     @staticmethod
     def read_ps_system_header(stream: bitstring.BitStream):
@@ -351,36 +581,43 @@ class Mpeg2Ps:
         )
 
     @staticmethod
-    def write_ps_system_header(stream: bitstring.BitStream, data: Mpeg2PsSystemHeader):
-        stream.append(Mpeg2Ps.PACKET_START_CODE + b"\xbb")
-
-        header_stream = bitstring.BitStream()
-        header_stream.append(
-            bitstring.pack("uintbe:24", 0x800001 | ((data.rate_bound & 0x3FFFFF) << 1))
-        )
-        header_stream.append(bitstring.pack("uint:6", data.audio_bound))
-        header_stream.append(bitstring.pack("uint:1", data.fixed_flag))
-        header_stream.append(bitstring.pack("uint:1", data.CSPS_flag))
-        header_stream.append(bitstring.pack("uint:1", data.system_audio_lock_flag))
-        header_stream.append(bitstring.pack("uint:1", data.system_video_lock_flag))
-        # marker_bit
-        header_stream.append(bitstring.pack("uint:1", 1))
-        header_stream.append(bitstring.pack("uint:5", data.video_bound))
-        header_stream.append(
-            bitstring.pack("uint:1", data.packet_rate_restriction_flag)
+    def serialize_ps_system_header(data: Mpeg2PsSystemHeader):
+        header_buffer = bytearray(
+            Mpeg2Ps.__PS_SYSTEM_HEADER.pack(
+                0x80 | ((data.rate_bound >> 15) & 0x7F),
+                ((data.rate_bound & 0x7FFF) << 1) | 0x0001,
+                ((data.audio_bound & 0x3F) << 2)
+                | ((data.fixed_flag & 0x01) << 1)
+                | (data.CSPS_flag & 0x01),
+                ((data.system_audio_lock_flag & 0x01) << 7)
+                | ((data.system_video_lock_flag & 0x01) << 6)
+                # marker_bit
+                | 0x20
+                | (data.video_bound & 0x1F),
+                # reserved_bits
+                ((data.packet_rate_restriction_flag & 0x01) << 7) | 0x7F,
+            )
         )
-        # reserved_bits
-        header_stream.append(bitstring.BitArray(bin="1111111"))
         for P_STD_info_entry in data.P_STD_info:
-            header_stream.append(bitstring.pack("uint:8", P_STD_info_entry.stream_id))
             temp = 0xC000
             temp |= (P_STD_info_entry.P_STD_buffer_bound_scale & 0x01) << 13
             temp |= P_STD_info_entry.P_STD_buffer_size_bound & 0x1FFF
-            header_stream.append(bitstring.pack("uintbe:16", temp))
+            header_buffer += Mpeg2Ps.__PS_SYSTEM_HEADER_P_STD_INFO.pack(
+                P_STD_info_entry.stream_id, temp
+            )
+
+        return (
+            Mpeg2Ps.__PES_PACKET_HEADER.pack(
+                Mpeg2Ps.PACKET_START_CODE, 0xBB, len(header_buffer)
+            )
+            + header_buffer
+        )
 
-        header_bytes = header_stream.tobytes()
-        stream.append(bitstring.pack("uintbe:16", len(header_bytes)))
-        stream.append(header_bytes)
+    @staticmethod
+    def write_ps_system_header(
+        stream: bitstring.BitStream | bytearray, data: Mpeg2PsSystemHeader
+    ):
+        stream += Mpeg2Ps.serialize_ps_system_header(data)
 
     @staticmethod
     def __read_descriptor(stream: bitstring.BitStream) -> Mpeg2Descriptor | None:
@@ -480,7 +717,7 @@ class Mpeg2Ps:
         interlaced_source_flag: int = data_stream.read("uint:1")
         non_packed_constraint_flag: int = data_stream.read("uint:1")
         frame_only_constraint_flag: int = data_stream.read("uint:1")
-        copied_44bits: int = data_stream.read("uintbe:44")
+        copied_44bits: int = data_stream.read("uint:44")
         level_idc: int = data_stream.read("uint:8")
         temporal_layer_subset_flag: int = data_stream.read("uint:1")
         HEVC_still_present_flag: int = data_stream.read("uint:1")
@@ -519,90 +756,85 @@ class Mpeg2Ps:
         )
 
     @staticmethod
-    def __write_descriptor(stream: bitstring.BitStream, data: Mpeg2Descriptor):
+    def __serialize_descriptor(data: Mpeg2Descriptor):
         if isinstance(data, Mpeg2GenericDescriptor):
-            return Mpeg2Ps.__write_generic_descriptor(stream, data)
+            return Mpeg2Ps.__serialize_generic_descriptor(data)
         elif isinstance(data, Mpeg2AvcVideoDescriptor):
-            return Mpeg2Ps.__write_avc_video_descriptor(stream, data)
+            return Mpeg2Ps.__serialize_avc_video_descriptor(data)
         elif isinstance(data, Mpeg2AacAudioDescriptor):
-            return Mpeg2Ps.__write_aac_audio_descriptor(stream, data)
+            return Mpeg2Ps.__serialize_aac_audio_descriptor(data)
         elif isinstance(data, Mpeg2HevcVideoDescriptor):
-            return Mpeg2Ps.__write_hevc_video_descriptor(stream, data)
+            return Mpeg2Ps.__serialize_hevc_video_descriptor(data)
+        return b""
 
     @staticmethod
-    def __write_generic_descriptor(
-        stream: bitstring.BitStream, data: Mpeg2GenericDescriptor
-    ):
-        stream.append(bitstring.pack("uint:8", data.descriptor_tag))
-        stream.append(bitstring.pack("uint:8", len(data.data)))
-        stream.append(data.data)
+    def __serialize_generic_descriptor(data: Mpeg2GenericDescriptor):
+        return bytes((data.descriptor_tag, len(data.data))) + data.data
 
     @staticmethod
-    def __write_avc_video_descriptor(
-        stream: bitstring.BitStream, data: Mpeg2AvcVideoDescriptor
-    ):
-        stream.append(b"\x28\x04")
-        stream.append(bitstring.pack("uint:8", data.profile_idc))
-        stream.append(bitstring.pack("uint:1", data.constraint_set0_flag))
-        stream.append(bitstring.pack("uint:1", data.constraint_set1_flag))
-        stream.append(bitstring.pack("uint:1", data.constraint_set2_flag))
-        stream.append(bitstring.pack("uint:1", data.constraint_set3_flag))
-        stream.append(bitstring.pack("uint:1", data.constraint_set4_flag))
-        stream.append(bitstring.pack("uint:1", data.constraint_set5_flag))
-        stream.append(bitstring.pack("uint:2", data.AVC_compatible_flags))
-        stream.append(bitstring.pack("uint:8", data.level_idc))
-        stream.append(bitstring.pack("uint:1", data.AVC_still_present))
-        stream.append(bitstring.pack("uint:1", data.AVC_24_hour_picture_flag))
-        stream.append(bitstring.pack("uint:1", data.Frame_Packing_SEI_not_present_flag))
+    def __serialize_avc_video_descriptor(data: Mpeg2AvcVideoDescriptor):
+        constraint_flags = (data.constraint_set0_flag & 0x01) << 7
+        constraint_flags |= (data.constraint_set1_flag & 0x01) << 6
+        constraint_flags |= (data.constraint_set2_flag & 0x01) << 5
+        constraint_flags |= (data.constraint_set3_flag & 0x01) << 4
+        constraint_flags |= (data.constraint_set4_flag & 0x01) << 3
+        constraint_flags |= (data.constraint_set5_flag & 0x01) << 2
+        constraint_flags |= data.AVC_compatible_flags & 0x03
+        flags = (data.AVC_still_present & 0x01) << 7
+        flags |= (data.AVC_24_hour_picture_flag & 0x01) << 6
+        flags |= (data.Frame_Packing_SEI_not_present_flag & 0x01) << 5
         # reserved
-        stream.append(bitstring.BitArray(bin="11111"))
+        flags |= 0x1F
+        return b"\x28\x04" + bytes(
+            (data.profile_idc, constraint_flags, data.level_idc, flags)
+        )
 
     @staticmethod
-    def __write_aac_audio_descriptor(
-        stream: bitstring.BitStream, data: Mpeg2AacAudioDescriptor
-    ):
-        stream.append(b"\x2b\x03")
-        stream.append(bitstring.pack("uint:8", data.MPEG_2_AAC_profile))
-        stream.append(bitstring.pack("uint:8", data.MPEG_2_AAC_channel_configuration))
-        stream.append(bitstring.pack("uint:8", data.MPEG_2_AAC_additional_information))
+    def __serialize_aac_audio_descriptor(data: Mpeg2AacAudioDescriptor):
+        return b"\x2b\x03" + bytes(
+            (
+                data.MPEG_2_AAC_profile,
+                data.MPEG_2_AAC_channel_configuration,
+                data.MPEG_2_AAC_additional_information,
+            )
+        )
 
     @staticmethod
-    def __write_hevc_video_descriptor(
-        stream: bitstring.BitStream, data: Mpeg2HevcVideoDescriptor
-    ):
-        stream.append(b"\x2b")
+    def __serialize_hevc_video_descriptor(data: Mpeg2HevcVideoDescriptor):
+        buffer = bytearray(b"\x38")
         if data.temporal_layer_subset_flag & 0x01 == 0x01:
-            stream.append(b"\x0f")
+            buffer += b"\x0f"
         else:
-            stream.append(b"\x0d")
-        stream.append(bitstring.pack("uint:2", data.profile_space))
-        stream.append(bitstring.pack("uint:1", data.tier_flag))
-        stream.append(bitstring.pack("uint:5", data.profile_idc))
-        stream.append(
-            bitstring.pack("uintbe:32", data.profile_compatibility_indication)
+            buffer += b"\x0d"
+        buffer.append(
+            ((data.profile_space & 0x03) << 6)
+            | ((data.tier_flag & 0x01) << 5)
+            | (data.profile_idc & 0x1F)
         )
-        stream.append(bitstring.pack("uint:1", data.progressive_source_flag))
-        stream.append(bitstring.pack("uint:1", data.interlaced_source_flag))
-        stream.append(bitstring.pack("uint:1", data.non_packed_constraint_flag))
-        stream.append(bitstring.pack("uint:1", data.frame_only_constraint_flag))
-        stream.append(bitstring.pack("uintbe:44", data.copied_44bits))
-        stream.append(bitstring.pack("uint:8", data.level_idc))
-        stream.append(bitstring.pack("uint:1", data.temporal_layer_subset_flag))
-        stream.append(bitstring.pack("uint:1", data.HEVC_still_present_flag))
-        stream.append(bitstring.pack("uint:1", data.HEVC_24hr_picture_present_flag))
-        stream.append(
-            bitstring.pack("uint:1", data.sub_pic_hrd_params_not_present_flag)
+        buffer += (data.profile_compatibility_indication & 0xFFFFFFFF).to_bytes(
+            4, byteorder="big"
         )
-        # reserved
-        stream.append(bitstring.BitArray(bin="11"))
-        stream.append(bitstring.pack("uint:2", data.HDR_WCG_idc))
-        if data.temporal_layer_subset_flag & 0x01 == 0x01:
-            stream.append(bitstring.pack("uint:3", data.temporal_id_min))
+        flags = (data.progressive_source_flag & 0x01) << 47
+        flags |= (data.interlaced_source_flag & 0x01) << 46
+        flags |= (data.non_packed_constraint_flag & 0x01) << 45
+        flags |= (data.frame_only_constraint_flag & 0x01) << 44
+        flags |= data.copied_44bits & 0xFFFFFFFFFFF
+        buffer += flags.to_bytes(6, byteorder="big")
+        buffer.append(data.level_idc)
+        buffer.append(
+            ((data.temporal_layer_subset_flag & 0x01) << 7)
+            | ((data.HEVC_still_present_flag & 0x01) << 6)
+            | ((data.HEVC_24hr_picture_present_flag & 0x01) << 5)
+            | ((data.sub_pic_hrd_params_not_present_flag & 0x01) << 4)
             # reserved
-            stream.append(bitstring.BitArray(bin="11111"))
-            stream.append(bitstring.pack("uint:3", data.temporal_id_max))
+            | 0x0C
+            | (data.HDR_WCG_idc & 0x03)
+        )
+        if data.temporal_layer_subset_flag & 0x01 == 0x01:
             # reserved
-            stream.append(bitstring.BitArray(bin="11111"))
+            buffer.append(((data.temporal_id_min & 0x07) << 5) | 0x1F)
+            buffer.append(((data.temporal_id_max & 0x07) << 5) | 0x1F)
+        return bytes(buffer)
 
     @staticmethod
     def read_program_stream_map(stream: bitstring.BitStream):
@@ -613,9 +845,18 @@ class Mpeg2Ps:
         if map_stream_id != 0xBC:
             raise RuntimeError("Invalid map_stream_id.")
         program_stream_map_length: int = stream.read("uintbe:16")
-        program_stream_map_stream = bitstring.BitStream(
-            stream.read(8 * program_stream_map_length)
+        program_stream_map_buffer: bytes = stream.read(
+            8 * program_stream_map_length
+        ).bytes
+        # CRC of the whole packet including CRC_32 is 0
+        crc32 = Mpeg2Ps.crc32(
+            Mpeg2Ps.__PES_PACKET_HEADER.pack(
+                Mpeg2Ps.PACKET_START_CODE, map_stream_id, program_stream_map_length
+            )
         )
+        if Mpeg2Ps.crc32(program_stream_map_buffer, crc32) != 0:
+            Mpeg2Ps.__logger.warning("Invalid CRC_32.")
+        program_stream_map_stream = bitstring.BitStream(program_stream_map_buffer)
 
         current_next_indicator: int = program_stream_map_stream.read("uint:1")
         # Skip Reserved
@@ -670,8 +911,6 @@ class Mpeg2Ps:
                 )
             )
 
-        crc32 = program_stream_map_stream.read("uintbe:32")
-
         return Mpeg2PsProgramStreamMap(
             current_next_indicator,
             program_stream_map_version,
@@ -680,65 +919,75 @@ class Mpeg2Ps:
         )
 
     @staticmethod
-    def write_program_stream_map(
-        stream: bitstring.BitStream, data: Mpeg2PsProgramStreamMap
-    ):
-        stream.append(Mpeg2Ps.PACKET_START_CODE + b"\xbc")
-
-        program_stream_map_stream = bitstring.BitStream()
-        program_stream_map_stream.append(
-            bitstring.pack("uint:1", data.current_next_indicator)
-        )
-        # Reserved
-        program_stream_map_stream.append(bitstring.BitArray(bin="11"))
-        program_stream_map_stream.append(
-            bitstring.pack("uint:5", data.program_stream_map_version)
+    def __serialize_program_stream_map_body(data: Mpeg2PsProgramStreamMap):
+        program_stream_map_buffer = bytearray()
+        program_stream_map_buffer.append(
+            ((data.current_next_indicator & 0x01) << 7)
+            # Reserved
+            | 0x60
+            | (data.program_stream_map_version & 0x1F)
         )
         # Reserved and marker_bit
-        program_stream_map_stream.append(b"\xff")
-
-        program_stream_info_stream = bitstring.BitStream()
-        for descriptor in data.program_stream_info:
-            Mpeg2Ps.__write_descriptor(program_stream_info_stream, descriptor)
-        program_stream_info_buffer = program_stream_info_stream.tobytes()
-        program_stream_map_stream.append(
-            bitstring.pack("uintbe:16", len(program_stream_info_buffer))
+        program_stream_map_buffer.append(0xFF)
+
+        program_stream_info_buffer = b"".join(
+            Mpeg2Ps.__serialize_descriptor(descriptor)
+            for descriptor in data.program_stream_info
+        )
+        program_stream_map_buffer += len(program_stream_info_buffer).to_bytes(
+            2, byteorder="big"
         )
-        program_stream_map_stream.append(program_stream_info_buffer)
+        program_stream_map_buffer += program_stream_info_buffer
 
-        elementary_stream_map_stream = bitstring.BitStream()
+        elementary_stream_map_buffer = bytearray()
         for entry in data.elementary_stream_map:
-            elementary_stream_map_stream.append(
-                bitstring.pack("uint:8", entry.stream_type)
+            elementary_stream_info_buffer = b"".join(
+                Mpeg2Ps.__serialize_descriptor(descriptor)
+                for descriptor in entry.elementary_stream_info
             )
-            elementary_stream_map_stream.append(
-                bitstring.pack("uint:8", entry.elementary_stream_id)
-            )
-
-            elementary_stream_info_stream = bitstring.BitStream()
-            for descriptor in entry.elementary_stream_info:
-                Mpeg2Ps.__write_descriptor(elementary_stream_info_stream, descriptor)
-            elementary_stream_info_buffer = elementary_stream_info_stream.tobytes()
-            elementary_stream_map_stream.append(
-                bitstring.pack("uintbe:16", len(elementary_stream_info_buffer))
+            elementary_stream_map_buffer += Mpeg2Ps.__ELEMENTARY_STREAM_MAP_ENTRY.pack(
+                entry.stream_type,
+                entry.elementary_stream_id,
+                len(elementary_stream_info_buffer),
             )
-            elementary_stream_map_stream.append(elementary_stream_info_buffer)
-        elementary_stream_map_buffer = elementary_stream_map_stream.tobytes()
-        program_stream_map_stream.append(
-            bitstring.pack("uintbe:16", len(elementary_stream_map_buffer))
+            elementary_stream_map_buffer += elementary_stream_info_buffer
+        program_stream_map_buffer += len(elementary_stream_map_buffer).to_bytes(
+            2, byteorder="big"
         )
-        program_stream_map_stream.append(elementary_stream_map_buffer)
+        program_stream_map_buffer += elementary_stream_map_buffer
 
-        program_stream_map_buffer = program_stream_map_stream.tobytes()
-        stream.append(bitstring.pack("uintbe:16", len(program_stream_map_buffer) + 4))
-        stream.append(program_stream_map_buffer)
+        return program_stream_map_buffer
 
-        buffer = stream.tobytes()
-        crc32 = Mpeg2Ps.crc32(buffer)
-        stream.append(bitstring.pack("uintbe:32", crc32))
+    @staticmethod
+    def write_program_stream_map(
+        stream: bitstring.BitStream | bytearray, data: Mpeg2PsProgramStreamMap
+    ):
+        program_stream_map_buffer = Mpeg2Ps.__serialize_program_stream_map_body(data)
+        header_buffer = Mpeg2Ps.__PES_PACKET_HEADER.pack(
+            Mpeg2Ps.PACKET_START_CODE, 0xBC, len(program_stream_map_buffer) + 4
+        )
+        crc32 = Mpeg2Ps.crc32(header_buffer)
+        crc32 = Mpeg2Ps.crc32(program_stream_map_buffer, crc32)
+        stream += header_buffer
+        stream += program_stream_map_buffer
+        stream += crc32.to_bytes(4, byteorder="big")
 
     @staticmethod
     def read_ps_packet(stream: bitstring.BitStream) -> Mpeg2PsPacket | None:
+        profiler = Profiler.current
+        if profiler is None:
+            return Mpeg2Ps.__read_ps_packet(stream)
+        start_time = time.perf_counter()
+        ps_packet = Mpeg2Ps.__read_ps_packet(stream)
+        profiler.add(
+            "mpeg2_ps.read_ps_packet",
+            time.perf_counter() - start_time,
+            packets=0 if ps_packet is None else 1,
+        )
+        return ps_packet
+
+    @staticmethod
+    def __read_ps_packet(stream: bitstring.BitStream) -> Mpeg2PsPacket | None:
         packet_id = Mpeg2Ps.seek_packet(stream)
         if packet_id is None:
             return
@@ -756,9 +1005,9 @@ class Mpeg2Ps:
             return Mpeg2Ps.read_pes_packet(stream)
 
     @staticmethod
-    def write_ps_packet(stream: bitstring.BitStream, data: Mpeg2PsPacket):
+    def write_ps_packet(stream: bitstring.BitStream | bytearray, data: Mpeg2PsPacket):
         if isinstance(data, Mpeg2PsProgramEnd):
-            stream.append(b"\x00\x00\x01\xb9")
+            stream += b"\x00\x00\x01\xb9"
         elif isinstance(data, Mpeg2PsPackHeader):
             Mpeg2Ps.write_ps_pack_header(stream, data)
         elif isinstance(data, Mpeg2PsSystemHeader):
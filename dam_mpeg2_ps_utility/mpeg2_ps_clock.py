@@ -0,0 +1,71 @@
+from fractions import Fraction
+
+from dam_mpeg2_ps_utility.mpeg2_ps import Mpeg2Ps
+
+
+class Mpeg2PsClock:
+    """MPEG2-PS timestamp generator of constant frame rate
+
+    Timestamps are derived from the picture count by integer arithmetic, so they do not drift over long streams.
+    """
+
+    def __init__(self, frame_rate: Fraction):
+        """Constructor
+
+        Args:
+            frame_rate (Fraction): Frame rate
+        """
+
+        frame_rate = Fraction(frame_rate)
+        if frame_rate <= 0:
+            raise RuntimeError("Invalid frame_rate.")
+        self.__frame_rate = frame_rate
+
+        # System clock ticks (27 MHz) per picture
+        picture_duration = Mpeg2Ps.SYSTEM_CLOCK_FREQUENCY / frame_rate
+        self.__picture_duration_numerator = picture_duration.numerator
+        self.__picture_duration_denominator = picture_duration.denominator
+
+    @property
+    def frame_rate(self):
+        return self.__frame_rate
+
+    def system_clock(self, picture_count: int):
+        """System clock (27 MHz) of the picture
+
+        Args:
+            picture_count (int): Picture count from the start of stream
+
+        Returns:
+            int: System clock
+        """
+
+        return (
+            picture_count
+            * self.__picture_duration_numerator
+            // self.__picture_duration_denominator
+        )
+
+    def scr(self, picture_count: int):
+        """SCR of the picture
+
+        Args:
+            picture_count (int): Picture count from the start of stream
+
+        Returns:
+            tuple[int, int]: SCR_base (90 kHz) and SCR_ext
+        """
+
+        return divmod(self.system_clock(picture_count), 300)
+
+    def pts(self, picture_count: int):
+        """PTS of the picture
+
+        Args:
+            picture_count (int): Picture count from the start of stream
+
+        Returns:
+            int: PTS (90 kHz)
+        """
+
+        return self.system_clock(picture_count) // 300
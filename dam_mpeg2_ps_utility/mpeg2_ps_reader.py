@@ -0,0 +1,485 @@
+import bisect
+import bitstring
+import io
+import itertools
+import mmap
+import os
+import struct
+import time
+from typing import Iterable
+
+from dam_mpeg2_ps_utility.customized_logger import getLogger
+from dam_mpeg2_ps_utility.index_cache import IndexCache
+from dam_mpeg2_ps_utility.mpeg2_ps import Mpeg2Ps
+from dam_mpeg2_ps_utility.mpeg2_ps_data import (
+    Mpeg2PsProgramEnd,
+    Mpeg2PesPacketType1,
+    Mpeg2PesPacketType2,
+    Mpeg2PesPacketType3,
+    Mpeg2PsPacket,
+)
+from dam_mpeg2_ps_utility.profiler import Profiler
+
+
+class Mpeg2PsReader:
+    """Memory-mapped MPEG2-PS reader
+
+    PES_packet_data of read packets is a memoryview slice into the map instead of a copy.
+    """
+
+    PES_PACKET_TYPE2_STREAM_IDS = (0xBC, 0xBF, 0xF0, 0xF1, 0xF2, 0xF8)
+    # packet_start_code_prefix, stream_id, PES_packet_length
+    __PACKET_HEADER = struct.Struct(">3sBH")
+
+    __logger = getLogger("Mpeg2PsReader")
+
+    def __init__(
+        self, stream: io.BufferedReader, index_cache: IndexCache | None = None
+    ):
+        """Constructor
+
+        Args:
+            stream (io.BufferedReader): Readable stream of MPEG2-PS file. A stream without a file descriptor, such as io.BytesIO, is read into memory from the start instead of being mapped.
+            index_cache (IndexCache | None, optional): Cache of packet indexes. If set, the packet index is loaded or built on the first seek or iteration of all packets, and used to seek packets. The stream must be kept open until then. Not used for a stream without a file descriptor. Defaults to None.
+        """
+
+        file_descriptor: int | None
+        try:
+            file_descriptor = stream.fileno()
+        except io.UnsupportedOperation:
+            file_descriptor = None
+
+        self.__mmap: mmap.mmap | bytes
+        if file_descriptor is None:
+            if stream.seekable():
+                stream.seek(0)
+            self.__mmap = stream.read()
+        elif os.fstat(file_descriptor).st_size == 0:
+            # Empty file can not be mapped
+            self.__mmap = b""
+        else:
+            self.__mmap = mmap.mmap(file_descriptor, 0, access=mmap.ACCESS_READ)
+        self.__buffer = memoryview(self.__mmap)
+        self.__position = 0
+
+        self.__stream = stream
+        # Only files are fingerprinted by the cache
+        self.__index_cache = index_cache if file_descriptor is not None else None
+        self.__packet_index: list[tuple[int, int, int]] | None = None
+        self.__packet_positions: list[int] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            ps_packet = self.read_ps_packet()
+            if ps_packet is None:
+                break
+            yield ps_packet
+
+    @property
+    def buffer(self):
+        return self.__buffer
+
+    def close(self):
+        """Close the map
+
+        If PES_packet_data is still referenced, the map is unmapped when it is released.
+        """
+
+        self.__buffer.release()
+        if isinstance(self.__mmap, mmap.mmap):
+            try:
+                self.__mmap.close()
+            except BufferError:
+                pass
+
+    def tell(self):
+        return self.__position
+
+    def seek(self, position: int):
+        self.__position = position
+
+    def __load_packet_index(self):
+        index_cache = self.__index_cache
+        if index_cache is None:
+            return
+        # Loaded once, and index_packets below scans without the index
+        self.__index_cache = None
+        cached_entries = index_cache.load("mpeg2_ps_packet", self.__stream)
+        if cached_entries is None:
+            packet_index = self.index_packets()
+            index_cache.store("mpeg2_ps_packet", self.__stream, packet_index)
+        else:
+            packet_index = list(cached_entries)
+        self.__packet_index = packet_index
+        self.__packet_positions = [position for position, _, _ in packet_index]
+
+    def index_packets(self):
+        """Index MPEG2-PS packets
+
+        The position of the reader is not changed.
+
+        Returns:
+            list[tuple[int, int, int]]: Position, size and ID of packets
+        """
+
+        if self.__packet_index is not None:
+            return self.__packet_index
+
+        packet_index: list[tuple[int, int, int]] = []
+        position = self.__position
+        self.__position = 0
+        buffer_length = len(self.__buffer)
+        while True:
+            packet_id = self.seek_packet()
+            if packet_id is None:
+                break
+            packet_size = Mpeg2Ps.size_of_packet(
+                self.__buffer[self.__position : self.__position + 14]
+            )
+            packet_index.append((self.__position, packet_size, packet_id))
+            self.__position = min(self.__position + packet_size, buffer_length)
+        self.__position = position
+        return packet_index
+
+    def seek_packet(self, packet_id: int | None = None):
+        """Seek MPEG2-PS packet
+
+        Args:
+            packet_id (int | None, optional): Packet ID to seek. Defaults to None.
+
+        Returns:
+            int | None: Packet ID, None if not found
+        """
+
+        self.__load_packet_index()
+        buffer_length = len(self.__buffer)
+        if self.__packet_index is not None:
+            index = bisect.bisect_left(self.__packet_positions, self.__position)
+            while index < len(self.__packet_index):
+                position, _, current_packet_id = self.__packet_index[index]
+                if packet_id is None or current_packet_id == packet_id:
+                    self.__position = position
+                    return current_packet_id
+                index += 1
+            # End of stream
+            self.__position = buffer_length
+            return
+        while True:
+            header = self.__buffer[self.__position : self.__position + 14]
+            packet_size = Mpeg2Ps.size_of_packet(header)
+            if packet_size is None:
+                # Resync, skip the current invalid packet start
+                position = Mpeg2Ps.find_packet_start_code(
+                    self.__mmap, self.__position + 1
+                )
+                if position == -1:
+                    # End of stream
+                    self.__position = buffer_length
+                    return
+                self.__position = position
+                continue
+            if packet_id is None or header[3] == packet_id:
+                return header[3]
+            self.__position = min(self.__position + packet_size, buffer_length)
+
+    @staticmethod
+    def decode_packet(
+        buffer: memoryview, position: int, packet_size: int, packet_id: int
+    ) -> Mpeg2PsPacket:
+        """Decode MPEG2-PS packet
+
+        Args:
+            buffer (memoryview): Buffer of MPEG2-PS
+            position (int): Position of packet
+            packet_size (int): Packet size
+            packet_id (int): Packet ID
+
+        Returns:
+            Mpeg2PsPacket: MPEG2-PS packet
+        """
+
+        profiler = Profiler.current
+        if profiler is None:
+            return Mpeg2PsReader.__decode_packet(
+                buffer, position, packet_size, packet_id
+            )
+        start_time = time.perf_counter()
+        ps_packet = Mpeg2PsReader.__decode_packet(
+            buffer, position, packet_size, packet_id
+        )
+        profiler.add(
+            "mpeg2_ps_reader.decode_packet",
+            time.perf_counter() - start_time,
+            bytes=packet_size,
+            packets=1,
+        )
+        return ps_packet
+
+    @staticmethod
+    def __decode_packet(
+        buffer: memoryview, position: int, packet_size: int, packet_id: int
+    ) -> Mpeg2PsPacket:
+        if packet_id == 0xB9:
+            return Mpeg2PsProgramEnd()
+        elif packet_id == 0xBA or packet_id == 0xBB or packet_id == 0xBC:
+            # Small headers are decoded by Mpeg2Ps
+            packet_stream = bitstring.BitStream(
+                bytes(buffer[position : position + packet_size])
+            )
+            if packet_id == 0xBA:
+                return Mpeg2Ps.read_ps_pack_header(packet_stream)
+            elif packet_id == 0xBB:
+                return Mpeg2Ps.read_ps_system_header(packet_stream)
+            return Mpeg2Ps.read_program_stream_map(packet_stream)
+        return Mpeg2PsReader.__decode_pes_packet(
+            buffer, position, packet_size, packet_id
+        )
+
+    @staticmethod
+    def __decode_pes_packet(
+        buffer: memoryview, position: int, packet_size: int, stream_id: int
+    ):
+        end_position = position + packet_size
+        if stream_id == 0xBE:
+            return Mpeg2PesPacketType3(stream_id, packet_size - 6)
+        elif stream_id in Mpeg2PsReader.PES_PACKET_TYPE2_STREAM_IDS:
+            return Mpeg2PesPacketType2(stream_id, buffer[position + 6 : end_position])
+
+        flags_0 = buffer[position + 6]
+        flags_1 = buffer[position + 7]
+        PES_header_data_length = buffer[position + 8]
+        PTS_DTS_flags = (flags_1 >> 6) & 0x03
+        pts: int | None = None
+        dts: int | None = None
+        if PTS_DTS_flags == 0x02 or PTS_DTS_flags == 0x03:
+            raw_PTS = int.from_bytes(buffer[position + 9 : position + 14], "big")
+            pts = (raw_PTS >> 3) & (0x0007 << 30)
+            pts |= (raw_PTS >> 2) & (0x7FFF << 15)
+            pts |= (raw_PTS >> 1) & 0x7FFF
+        if PTS_DTS_flags == 0x03:
+            raw_DTS = int.from_bytes(buffer[position + 14 : position + 19], "big")
+            dts = (raw_DTS >> 3) & (0x0007 << 30)
+            dts |= (raw_DTS >> 2) & (0x7FFF << 15)
+            dts |= (raw_DTS >> 1) & 0x7FFF
+        return Mpeg2PesPacketType1(
+            stream_id,
+            (flags_0 >> 4) & 0x03,
+            (flags_0 >> 3) & 0x01,
+            (flags_0 >> 2) & 0x01,
+            (flags_0 >> 1) & 0x01,
+            flags_0 & 0x01,
+            PTS_DTS_flags,
+            (flags_1 >> 5) & 0x01,
+            (flags_1 >> 4) & 0x01,
+            (flags_1 >> 3) & 0x01,
+            (flags_1 >> 2) & 0x01,
+            (flags_1 >> 1) & 0x01,
+            flags_1 & 0x01,
+            pts,
+            dts,
+            buffer[position + 9 + PES_header_data_length : end_position],
+        )
+
+    def iter_packets(self, stream_ids: Iterable[int] | None = None, decode=False):
+        """Iterate MPEG2-PS packets from the current position
+
+        Packets are filtered by the stream_id (packet ID) in their header before the rest of the packet is touched.
+
+        Args:
+            stream_ids (Iterable[int] | None, optional): stream_id of packets to iterate. Defaults to None (All packets).
+            decode (bool, optional): Yield decoded packets instead of views. Defaults to False.
+
+        Yields:
+            Mpeg2PsPacketView | Mpeg2PsPacket: View of packet, or decoded packet if decode is set
+        """
+
+        return Profiler.iterate(
+            "mpeg2_ps_reader.iter_packets",
+            self.__iter_packets(stream_ids, decode),
+            "packets",
+        )
+
+    def __iter_packets(self, stream_ids: Iterable[int] | None, decode: bool):
+        stream_id_set = None if stream_ids is None else frozenset(stream_ids)
+        if stream_id_set is None:
+            # Filtered iteration reads only a few packets, and never builds the index
+            self.__load_packet_index()
+        buffer = self.__buffer
+        buffer_length = len(buffer)
+
+        if self.__packet_index is not None:
+            index = bisect.bisect_left(self.__packet_positions, self.__position)
+            for position, packet_size, packet_id in itertools.islice(
+                self.__packet_index, index, None
+            ):
+                if stream_id_set is not None and packet_id not in stream_id_set:
+                    continue
+                end_position = position + packet_size
+                if buffer_length < end_position:
+                    Mpeg2PsReader.__logger.warning("Truncated packet.")
+                    break
+                self.__position = end_position
+                if decode:
+                    yield Mpeg2PsReader.decode_packet(
+                        buffer, position, packet_size, packet_id
+                    )
+                else:
+                    yield Mpeg2PsPacketView(
+                        buffer[position:end_position], position, packet_id
+                    )
+            # End of stream
+            self.__position = buffer_length
+            return
+
+        source = self.__mmap
+        unpack_packet_header = Mpeg2PsReader.__PACKET_HEADER.unpack_from
+        position = self.__position
+        while True:
+            try:
+                start_code, packet_id, PES_packet_length = unpack_packet_header(
+                    source, position
+                )
+            except struct.error:
+                # End of stream
+                start_code = None
+            if start_code == Mpeg2Ps.PACKET_START_CODE and 0xBB <= packet_id:
+                # PES packet, System Header and Program Stream Map
+                packet_size = 6 + PES_packet_length
+            else:
+                header = source[position : position + 14]
+                packet_size = Mpeg2Ps.size_of_packet(header)
+                if packet_size is None:
+                    # Resync, skip the current invalid packet start
+                    position = Mpeg2Ps.find_packet_start_code(source, position + 1)
+                    if position == -1:
+                        break
+                    continue
+                packet_id = header[3]
+            end_position = position + packet_size
+            if stream_id_set is None or packet_id in stream_id_set:
+                if buffer_length < end_position:
+                    Mpeg2PsReader.__logger.warning("Truncated packet.")
+                    break
+                self.__position = end_position
+                if decode:
+                    yield Mpeg2PsReader.decode_packet(
+                        buffer, position, packet_size, packet_id
+                    )
+                else:
+                    yield Mpeg2PsPacketView(
+                        buffer[position:end_position], position, packet_id
+                    )
+            position = end_position
+        # End of stream
+        self.__position = buffer_length
+
+    def read_ps_packet(self) -> Mpeg2PsPacket | None:
+        """Read next MPEG2-PS packet
+
+        Returns:
+            Mpeg2PsPacket | None: MPEG2-PS packet, None if end of stream
+        """
+
+        packet_id = self.seek_packet()
+        if packet_id is None:
+            return
+
+        position = self.__position
+        packet_size = Mpeg2Ps.size_of_packet(self.__buffer[position : position + 14])
+        if len(self.__buffer) < position + packet_size:
+            Mpeg2PsReader.__logger.warning("Truncated packet.")
+            self.__position = len(self.__buffer)
+            return
+
+        ps_packet = Mpeg2PsReader.decode_packet(
+            self.__buffer, position, packet_size, packet_id
+        )
+        self.__position = position + packet_size
+        return ps_packet
+
+
+class Mpeg2PsPacketView:
+    """View of MPEG2-PS packet
+
+    Header fields are decoded on access. data and PES_packet_data are memoryview slices of the map, which stay valid after the reader is closed.
+    """
+
+    # stream_id of PES packets with flags, PTS and DTS
+    __PES_PACKET_TYPE1_STREAM_IDS = frozenset(
+        [0xBD]
+        + [
+            stream_id
+            for stream_id in range(0xC0, 0x100)
+            if stream_id not in Mpeg2PsReader.PES_PACKET_TYPE2_STREAM_IDS
+        ]
+    )
+
+    __slots__ = ("data", "position", "stream_id")
+
+    def __init__(self, data: memoryview, position: int, stream_id: int):
+        """Constructor
+
+        Args:
+            data (memoryview): Bytes of the whole packet
+            position (int): Position of packet
+            stream_id (int): stream_id (Packet ID)
+        """
+
+        self.data = data
+        self.position = position
+        self.stream_id = stream_id
+
+    def __repr__(self):
+        return f"Mpeg2PsPacketView(position={self.position}, size={self.size}, stream_id={self.stream_id:#04x})"
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def PTS_DTS_flags(self):
+        if self.stream_id not in Mpeg2PsPacketView.__PES_PACKET_TYPE1_STREAM_IDS:
+            return 0
+        return (self.data[7] >> 6) & 0x03
+
+    @property
+    def pts(self):
+        if (
+            self.stream_id not in Mpeg2PsPacketView.__PES_PACKET_TYPE1_STREAM_IDS
+            or self.data[7] & 0x80 == 0
+        ):
+            return
+        return Mpeg2Ps.decode_timestamp(self.data[9:14])
+
+    @property
+    def dts(self):
+        if (
+            self.stream_id not in Mpeg2PsPacketView.__PES_PACKET_TYPE1_STREAM_IDS
+            or self.data[7] & 0xC0 != 0xC0
+        ):
+            return
+        return Mpeg2Ps.decode_timestamp(self.data[14:19])
+
+    @property
+    def PES_packet_data(self):
+        """PES_packet_data, None if the packet is not a PES packet or padding"""
+
+        if self.stream_id in Mpeg2PsPacketView.__PES_PACKET_TYPE1_STREAM_IDS:
+            return self.data[9 + self.data[8] :]
+        if self.stream_id in Mpeg2PsReader.PES_PACKET_TYPE2_STREAM_IDS:
+            return self.data[6:]
+
+    def decode(self) -> Mpeg2PsPacket:
+        """Decode the packet
+
+        Returns:
+            Mpeg2PsPacket: MPEG2-PS packet
+        """
+
+        return Mpeg2PsReader.decode_packet(self.data, 0, len(self.data), self.stream_id)
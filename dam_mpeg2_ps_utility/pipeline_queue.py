@@ -0,0 +1,114 @@
+from collections import deque
+import threading
+import time
+
+from dam_mpeg2_ps_utility.pipeline_queue_data import PipelineQueueStats
+
+
+class PipelineQueue:
+    """Bounded queue between pipeline stages
+
+    Producers block while the queue is full, so memory held between stages is bounded by maxsize. Occupancy is sampled on every put, and the time producers and consumers are blocked is accumulated. A blocked producer means the downstream stage is the bottleneck, and a blocked consumer means the upstream stage is.
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        """Constructor
+
+        Args:
+            name (str): Name in stats
+            maxsize (int): Maximum item count
+        """
+
+        if maxsize < 1:
+            raise RuntimeError("Invalid maxsize.")
+        self.name = name
+        self.maxsize = maxsize
+        self.__items: deque = deque()
+        self.__condition = threading.Condition()
+        self.__closed = False
+        self.__cancelled = False
+        self.__item_count = 0
+        self.__max_occupancy = 0
+        self.__occupancy_sum = 0
+        self.__put_wait_time = 0.0
+        self.__get_wait_time = 0.0
+
+    def put(self, item):
+        """Put an item, blocking while the queue is full
+
+        Args:
+            item (Any): Item
+        """
+
+        with self.__condition:
+            if len(self.__items) >= self.maxsize and not self.__cancelled:
+                wait_start = time.perf_counter()
+                while len(self.__items) >= self.maxsize and not self.__cancelled:
+                    self.__condition.wait()
+                self.__put_wait_time += time.perf_counter() - wait_start
+            if self.__cancelled:
+                raise RuntimeError("Pipeline cancelled.")
+            if self.__closed:
+                raise RuntimeError("Invalid put after close.")
+            self.__items.append(item)
+            occupancy = len(self.__items)
+            self.__item_count += 1
+            self.__max_occupancy = max(self.__max_occupancy, occupancy)
+            self.__occupancy_sum += occupancy
+            self.__condition.notify_all()
+
+    def close(self):
+        """Signal that no more items will be put"""
+
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    def cancel(self):
+        """Abort both sides, blocked and later put and get raise RuntimeError"""
+
+        with self.__condition:
+            self.__cancelled = True
+            self.__items.clear()
+            self.__condition.notify_all()
+
+    def __iter__(self):
+        """Iterate items until the queue is closed and drained
+
+        Yields:
+            Any: Item
+        """
+
+        while True:
+            with self.__condition:
+                if len(self.__items) == 0 and not self.__closed:
+                    wait_start = time.perf_counter()
+                    while (
+                        len(self.__items) == 0
+                        and not self.__closed
+                        and not self.__cancelled
+                    ):
+                        self.__condition.wait()
+                    self.__get_wait_time += time.perf_counter() - wait_start
+                if self.__cancelled:
+                    raise RuntimeError("Pipeline cancelled.")
+                if len(self.__items) == 0:
+                    return
+                item = self.__items.popleft()
+                self.__condition.notify_all()
+            yield item
+
+    @property
+    def stats(self):
+        with self.__condition:
+            return PipelineQueueStats(
+                self.name,
+                self.maxsize,
+                self.__item_count,
+                self.__max_occupancy,
+                self.__occupancy_sum / self.__item_count
+                if self.__item_count != 0
+                else 0.0,
+                self.__put_wait_time,
+                self.__get_wait_time,
+            )
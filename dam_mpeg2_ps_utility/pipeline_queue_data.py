@@ -0,0 +1,11 @@
+from typing import NamedTuple
+
+
+class PipelineQueueStats(NamedTuple):
+    name: str
+    maxsize: int
+    item_count: int
+    max_occupancy: int
+    mean_occupancy: float
+    put_wait_time: float
+    get_wait_time: float
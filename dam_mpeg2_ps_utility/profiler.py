@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+from typing import Callable, Iterable, TypeVar
+
+from dam_mpeg2_ps_utility.profiler_data import ProfilerStage
+
+T = TypeVar("T")
+
+
+class Profiler:
+    """Named stage timers and counters
+
+    Instrumented code reads Profiler.current once per call and skips timing entirely while it is None, so profiling costs one attribute lookup when disabled. Stage times are inclusive, a stage nested in another is counted in both. Stages run on threads are recorded, stages run on worker processes are not.
+    """
+
+    current: "Profiler | None" = None
+
+    def __init__(
+        self, hook: Callable[[str, float, dict[str, int]], None] | None = None
+    ):
+        """Constructor
+
+        Args:
+            hook (Callable[[str, float, dict[str, int]], None] | None, optional): Called with stage name, seconds and counters of every record. Defaults to None.
+        """
+
+        self.hook = hook
+        self.wall_time = 0.0
+        self.__stages: dict[str, list] = {}
+        self.__lock = threading.Lock()
+        self.__previous: Profiler | None = None
+        self.__start_time = 0.0
+
+    def __enter__(self):
+        self.__previous = Profiler.current
+        Profiler.current = self
+        self.__start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_time += time.perf_counter() - self.__start_time
+        Profiler.current = self.__previous
+        self.__previous = None
+
+    def add(self, name: str, seconds: float, **counters: int):
+        """Record a call of a stage
+
+        Args:
+            name (str): Stage name
+            seconds (float): Elapsed time
+            **counters (int): Counters to add, such as bytes, packets and nal_units
+        """
+
+        with self.__lock:
+            stage = self.__stages.get(name)
+            if stage is None:
+                # Calls, Seconds, Counters
+                stage = [0, 0.0, {}]
+                self.__stages[name] = stage
+            stage[0] += 1
+            stage[1] += seconds
+            stage_counters: dict[str, int] = stage[2]
+            for counter_name, value in counters.items():
+                stage_counters[counter_name] = (
+                    stage_counters.get(counter_name, 0) + value
+                )
+        if self.hook is not None:
+            self.hook(name, seconds, counters)
+
+    @staticmethod
+    def iterate(name: str, iterable: Iterable[T], counter: str | None = None):
+        """Record time spent producing each item of an iterable
+
+        Args:
+            name (str): Stage name
+            iterable (Iterable[T]): Iterable
+            counter (str | None, optional): Counter of items. Defaults to None.
+
+        Returns:
+            Iterable[T]: The iterable itself if profiling is disabled, otherwise a wrapper
+        """
+
+        profiler = Profiler.current
+        if profiler is None:
+            return iterable
+        return Profiler.__iterate(profiler, name, iter(iterable), counter)
+
+    @staticmethod
+    def __iterate(profiler: "Profiler", name: str, iterator, counter: str | None):
+        seconds = 0.0
+        count = 0
+        try:
+            while True:
+                start_time = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    seconds += time.perf_counter() - start_time
+                    return
+                seconds += time.perf_counter() - start_time
+                count += 1
+                yield item
+        finally:
+            # Once per iteration, not per item
+            if counter is None:
+                profiler.add(name, seconds)
+            else:
+                profiler.add(name, seconds, **{counter: count})
+
+    @property
+    def stages(self):
+        """Recorded stages, the slowest first"""
+
+        with self.__lock:
+            stages = [
+                ProfilerStage(name, stage[0], stage[1], dict(stage[2]))
+                for name, stage in self.__stages.items()
+            ]
+        return sorted(stages, key=lambda stage: stage.seconds, reverse=True)
+
+    def make_report(self):
+        """Make a JSON serializable report
+
+        Returns:
+            dict: Report
+        """
+
+        stage_reports = []
+        for stage in self.stages:
+            stage_report = {
+                "name": stage.name,
+                "calls": stage.calls,
+                "seconds": stage.seconds,
+                "share": stage.seconds / self.wall_time if 0 < self.wall_time else 0.0,
+                "counters": stage.counters,
+            }
+            if "bytes" in stage.counters and 0 < stage.seconds:
+                stage_report["throughput"] = (
+                    stage.counters["bytes"] / stage.seconds / 1000000
+                )
+            stage_reports.append(stage_report)
+        return {"wall_time": self.wall_time, "stages": stage_reports}
+
+    def write_report(self, path: str):
+        """Write a JSON report
+
+        Args:
+            path (str): Output file path
+        """
+
+        with open(path, "w", encoding="utf-8") as report_file:
+            json.dump(self.make_report(), report_file, indent=2)
+            report_file.write("\n")
@@ -0,0 +1,8 @@
+from typing import NamedTuple
+
+
+class ProfilerStage(NamedTuple):
+    name: str
+    calls: int
+    seconds: float
+    counters: dict[str, int]
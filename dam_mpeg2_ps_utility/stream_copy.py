@@ -0,0 +1,186 @@
+from enum import Enum, auto
+import errno
+import io
+import os
+import time
+
+from dam_mpeg2_ps_utility.customized_logger import getLogger
+from dam_mpeg2_ps_utility.profiler import Profiler
+
+
+class StreamCopyBackend(Enum):
+    BUFFERED = auto()
+    COPY_FILE_RANGE = auto()
+    SENDFILE = auto()
+
+
+class StreamCopy:
+    """Copy between file streams in the kernel
+
+    os.copy_file_range is tried first, which may share extents on copy-on-write file systems, then os.sendfile. Streams without file descriptors, and file systems rejecting both, fall back to a buffered copy in user space.
+    """
+
+    __CHUNK_SIZE = 64 * 1024 * 1024
+    __BUFFERED_CHUNK_SIZE = 1024 * 1024
+    # Errors of unsupported file descriptors or file systems
+    __FALLBACK_ERRNOS = {
+        errno.EBADF,
+        errno.EINVAL,
+        errno.ENOSYS,
+        errno.EOPNOTSUPP,
+        errno.EXDEV,
+        errno.ESPIPE,
+    }
+
+    __logger = getLogger("StreamCopy")
+
+    @staticmethod
+    def __file_descriptor(stream: io.IOBase):
+        try:
+            if not stream.seekable():
+                return
+            return stream.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            return
+
+    @staticmethod
+    def __copy_kernel(
+        backend: StreamCopyBackend,
+        input_fd: int,
+        output_fd: int,
+        input_position: int,
+        output_position: int,
+        size: int | None,
+    ):
+        copied_size = 0
+        while size is None or copied_size < size:
+            count = StreamCopy.__CHUNK_SIZE
+            if size is not None:
+                count = min(count, size - copied_size)
+            if backend == StreamCopyBackend.COPY_FILE_RANGE:
+                result = os.copy_file_range(
+                    input_fd,
+                    output_fd,
+                    count,
+                    input_position + copied_size,
+                    output_position + copied_size,
+                )
+            else:
+                # sendfile writes at the file position of the output
+                os.lseek(output_fd, output_position + copied_size, os.SEEK_SET)
+                result = os.sendfile(
+                    output_fd, input_fd, input_position + copied_size, count
+                )
+            # End of stream
+            if result == 0:
+                break
+            copied_size += result
+        return copied_size
+
+    @staticmethod
+    def copy(
+        input_stream: io.BufferedReader,
+        output_stream: io.BufferedWriter,
+        size: int | None = None,
+        backend: StreamCopyBackend | None = None,
+    ):
+        """Copy from the current position of input to the current position of output
+
+        Both streams are left at the end of the copied bytes.
+
+        Args:
+            input_stream (io.BufferedReader): Readable stream
+            output_stream (io.BufferedWriter): Writable stream
+            size (int | None, optional): Copy size. Defaults to None (Until the end of input).
+            backend (StreamCopyBackend | None, optional): Backend. Defaults to None (Fastest available).
+
+        Returns:
+            int: Copied size
+        """
+
+        profiler = Profiler.current
+        if profiler is None:
+            return StreamCopy.__copy(input_stream, output_stream, size, backend)
+        start_time = time.perf_counter()
+        copied_size = StreamCopy.__copy(input_stream, output_stream, size, backend)
+        profiler.add(
+            "stream_copy.copy", time.perf_counter() - start_time, bytes=copied_size
+        )
+        return copied_size
+
+    @staticmethod
+    def __copy(
+        input_stream: io.BufferedReader,
+        output_stream: io.BufferedWriter,
+        size: int | None,
+        backend: StreamCopyBackend | None,
+    ):
+        backends = (
+            [backend]
+            if backend is not None
+            else [
+                StreamCopyBackend.COPY_FILE_RANGE,
+                StreamCopyBackend.SENDFILE,
+                StreamCopyBackend.BUFFERED,
+            ]
+        )
+        input_fd = StreamCopy.__file_descriptor(input_stream)
+        output_fd = StreamCopy.__file_descriptor(output_stream)
+        if input_fd is not None and output_fd is not None:
+            # Positions of file descriptors are not those of buffered streams
+            input_position = input_stream.tell()
+            output_stream.flush()
+            output_position = output_stream.tell()
+            for kernel_backend in backends:
+                if kernel_backend == StreamCopyBackend.BUFFERED or (
+                    kernel_backend == StreamCopyBackend.COPY_FILE_RANGE
+                    and not hasattr(os, "copy_file_range")
+                ):
+                    continue
+                try:
+                    copied_size = StreamCopy.__copy_kernel(
+                        kernel_backend,
+                        input_fd,
+                        output_fd,
+                        input_position,
+                        output_position,
+                        size,
+                    )
+                except OSError as error:
+                    if error.errno not in StreamCopy.__FALLBACK_ERRNOS:
+                        raise
+                    StreamCopy.__logger.debug(
+                        "Stream copy backend unavailable. backend=%s, errno=%s",
+                        kernel_backend.name,
+                        error.errno,
+                    )
+                    continue
+                input_stream.seek(input_position + copied_size)
+                output_stream.seek(output_position + copied_size)
+                StreamCopy.__logger.debug(
+                    "Stream copied. backend=%s, size=%s",
+                    kernel_backend.name,
+                    copied_size,
+                )
+                return copied_size
+        if StreamCopyBackend.BUFFERED not in backends:
+            raise RuntimeError("Invalid backend.")
+
+        # Buffered copy
+        copied_size = 0
+        while size is None or copied_size < size:
+            count = StreamCopy.__BUFFERED_CHUNK_SIZE
+            if size is not None:
+                count = min(count, size - copied_size)
+            buffer = input_stream.read(count)
+            # End of stream
+            if len(buffer) == 0:
+                break
+            output_stream.write(buffer)
+            copied_size += len(buffer)
+        StreamCopy.__logger.debug(
+            "Stream copied. backend=%s, size=%s",
+            StreamCopyBackend.BUFFERED.name,
+            copied_size,
+        )
+        return copied_size
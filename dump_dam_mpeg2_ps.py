@@ -2,35 +2,79 @@
 # coding: utf-8
 
 import argparse
-import bitstring
 
-from dam_mpeg2_ps_utility.mpeg2_ps import Mpeg2Ps, Mpeg2PesPacketType2
+from dam_mpeg2_ps_utility.customized_logger import (
+    configure_logger,
+    LOG_FORMATS,
+    LOG_LEVELS,
+)
 from dam_mpeg2_ps_utility.dam_mpeg2_ps import DamMpeg2Ps
+from dam_mpeg2_ps_utility.dam_mpeg2_ps_generator_data import GopIndexEntry
+from dam_mpeg2_ps_utility.dam_mpeg2_ps_seeker import DamMpeg2PsSeeker
+from dam_mpeg2_ps_utility.index_cache import IndexCache
+from dam_mpeg2_ps_utility.mpeg2_ps_data import (
+    Mpeg2PesPacketType1,
+    Mpeg2PesPacketType2,
+    Mpeg2PsPacket,
+)
+from dam_mpeg2_ps_utility.mpeg2_ps_reader import Mpeg2PsReader
+from dam_mpeg2_ps_utility.profiler import Profiler
 
 
-def main(argv=None):
-    parser = argparse.ArgumentParser(description="DAM compatible MPEG2-PS Dumper")
-    parser.add_argument("input_path", help="Input H.264-ES file path")
-    parser.add_argument("--print-packets", action="store_true", help="Print packets")
-    args = parser.parse_args()
+def print_ps_packet(ps_packet: Mpeg2PsPacket):
+    if isinstance(ps_packet, (Mpeg2PesPacketType1, Mpeg2PesPacketType2)):
+        print(ps_packet._replace(PES_packet_data=ps_packet.PES_packet_data.tobytes()))
+    else:
+        print(ps_packet)
+
+
+def print_gop(index: int, gop: GopIndexEntry, pts_offset: int):
+    print(
+        f"gop_index[{index}]: ps_pack_header_position={gop.ps_pack_header_position}, access_unit_size={gop.access_unit_size}, pts={gop.pts}, pts_msec={gop.pts / 90}, related_pts={gop.pts - pts_offset}, related_pts_msec={(gop.pts - pts_offset) / 90}"
+    )
+
+
+def dump_dam_mpeg2_ps(args: argparse.Namespace):
+    if args.seek_msec is not None:
+        with open(args.input_path, "rb") as input_file:
+            try:
+                seeker = DamMpeg2PsSeeker(input_file)
+            except RuntimeError:
+                print("Failed to load GOP index.")
+                return
+            with seeker:
+                if seeker.gop_count == 0:
+                    print("GOP not found.")
+                    return
+                pts_offset = seeker.gop_at(0).pts
+                index = seeker.find_gop(pts_offset + round(args.seek_msec * 90))
+                if index is None:
+                    print("GOP not found.")
+                    return
+                gop = seeker.gop_at(index)
+                print_gop(index, gop, pts_offset)
+                if args.print_packets:
+                    for ps_packet in seeker.iter_gop_packet(gop):
+                        print_ps_packet(ps_packet)
+        return
 
-    with open(args.input_path, "rb") as input_file:
-        input_stream = bitstring.BitStream(input_file.read())
-        while True:
-            ps_packet = Mpeg2Ps.read_ps_packet(input_stream)
-            if ps_packet is None:
-                break
+    index_cache = None if args.no_index_cache else IndexCache()
 
+    with open(args.input_path, "rb") as input_file, Mpeg2PsReader(
+        input_file, index_cache
+    ) as reader:
+        gop_number = 0
+        pts_offset: int | None = None
+        # Only GOP index packets are read if packets are not printed
+        for ps_packet in reader.iter_packets(
+            None if args.print_packets else (0xBF,)
+        ):
             if args.print_packets:
-                print(ps_packet)
+                print_ps_packet(ps_packet.decode())
 
             # GOP index packet
-            if (
-                isinstance(ps_packet, Mpeg2PesPacketType2)
-                and ps_packet.stream_id == 0xBF
-            ):
-                data_stream = bitstring.BitStream(ps_packet.PES_packet_data)
-                gop_index = DamMpeg2Ps.read_gop_index(data_stream)
+            if ps_packet.stream_id == 0xBF:
+                gop_index = DamMpeg2Ps.read_gop_index(ps_packet.PES_packet_data)
                 if gop_index is None:
                     print("Failed to load GOP index.")
                     return
@@ -39,11 +83,50 @@ def main(argv=None):
                 )
                 if len(gop_index.gops) == 0:
                     return
-                pts_offset = gop_index.gops[0].pts
-                for index, gop in enumerate(gop_index.gops):
-                    print(
-                        f"gop_index[{index}]: ps_pack_header_position={gop.ps_pack_header_position}, access_unit_size={gop.access_unit_size}, pts={gop.pts}, pts_msec={gop.pts / 90}, related_pts={gop.pts - pts_offset}, related_pts_msec={(gop.pts - pts_offset) / 90}"
-                    )
+                if pts_offset is None:
+                    pts_offset = gop_index.gops[0].pts
+                for index, gop in enumerate(gop_index.gops, gop_number):
+                    print_gop(index, gop, pts_offset)
+                gop_number += len(gop_index.gops)
+                # Last page
+                if (
+                    not args.print_packets
+                    and gop_index.page_count <= gop_index.page_number
+                ):
+                    return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DAM compatible MPEG2-PS Dumper")
+    parser.add_argument("input_path", help="Input H.264-ES file path")
+    parser.add_argument("--print-packets", action="store_true", help="Print packets")
+    parser.add_argument(
+        "--no-index-cache", action="store_true", help="Do not use packet index cache"
+    )
+    parser.add_argument(
+        "--seek-msec",
+        type=float,
+        help="Print only the GOP presented at the time (msec, related to the first GOP)",
+    )
+    parser.add_argument(
+        "--profile", help="JSON profile report output file path of stage timers"
+    )
+    parser.add_argument(
+        "--log_level", choices=LOG_LEVELS, default="info", help="Log level"
+    )
+    parser.add_argument(
+        "--log_format", choices=LOG_FORMATS, default="text", help="Log format"
+    )
+    args = parser.parse_args()
+
+    configure_logger(args.log_level, args.log_format)
+
+    if args.profile is None:
+        dump_dam_mpeg2_ps(args)
+        return
+    with Profiler() as profiler:
+        dump_dam_mpeg2_ps(args)
+    profiler.write_report(args.profile)
 
 
 if __name__ == "__main__":
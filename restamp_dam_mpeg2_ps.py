@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+import os
+import sys
+
+from dam_mpeg2_ps_utility.customized_logger import (
+    configure_logger,
+    LOG_FORMATS,
+    LOG_LEVELS,
+)
+from dam_mpeg2_ps_utility.dam_mpeg2_ps import DamMpeg2Ps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="DAM compatible MPEG2-PS GOP Index Restamper"
+    )
+    parser.add_argument("input_path", help="Input MPEG2-PS file path")
+    parser.add_argument(
+        "output_path",
+        nargs="?",
+        help="DAM compatible MPEG2-PS output file path. Patch the input in place if omitted",
+    )
+    parser.add_argument(
+        "--log_level", choices=LOG_LEVELS, default="info", help="Log level"
+    )
+    parser.add_argument(
+        "--log_format", choices=LOG_FORMATS, default="text", help="Log format"
+    )
+    args = parser.parse_args(argv)
+
+    configure_logger(args.log_level, args.log_format)
+
+    if args.output_path is None:
+        with open(args.input_path, "r+b") as input_file:
+            gop_index = DamMpeg2Ps.restamp_gop_index(input_file)
+    else:
+        with open(args.input_path, "rb") as input_file, open(
+            args.output_path, "wb"
+        ) as output_file:
+            gop_index = DamMpeg2Ps.restamp_gop_index(input_file, output_file)
+    if gop_index is None:
+        if args.output_path is not None:
+            os.remove(args.output_path)
+        print("Failed to write GOP index.")
+        sys.exit(1)
+    # Excluding the entry of Program end
+    print(f"gops={len(gop_index.gops) - 1}")
+
+
+if __name__ == "__main__":
+    main()
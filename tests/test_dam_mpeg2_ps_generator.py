@@ -0,0 +1,211 @@
+import asyncio
+from fractions import Fraction
+import pathlib
+import random
+
+import pytest
+
+from dam_mpeg2_ps_benchmark.synthetic_h264_es import SyntheticH264Es
+from dam_mpeg2_ps_utility.dam_mpeg2_ps import DamMpeg2PsCodec
+from dam_mpeg2_ps_utility.dam_mpeg2_ps_generator import DamMpeg2PsGenerator
+
+FRAME_RATE = Fraction(30000, 1001)
+
+ACCESS_UNIT_DELIMITER = b"\x00\x00\x00\x01\x09\xf0"
+SEQUENCE_PARAMETER_SET = (
+    b"\x00\x00\x00\x01\x67\x64\x00\x28\xac\xd9\x40\x78\x02\x27\xe5\x84"
+    b"\x00\x00\x03\x00\x04\x00\x00\x03\x00\xf0\x3c\x60\xc6\x58"
+)
+PICTURE_PARAMETER_SET = b"\x00\x00\x00\x01\x68\xeb\xe3\xcb\x22\xc0"
+
+
+def make_slice(nal_unit_header: int, size: int, tail: bytes, seed: int):
+    # Slice data without zero bytes, followed by the tail
+    data = random.Random(seed).randbytes(size).replace(b"\x00", b"\x80")
+    return b"\x00\x00\x01" + bytes((nal_unit_header,)) + data + tail
+
+
+def make_h264_es(idr_slice: bytes):
+    buffer = bytearray()
+    for gop_number in range(3):
+        buffer += ACCESS_UNIT_DELIMITER + SEQUENCE_PARAMETER_SET
+        buffer += PICTURE_PARAMETER_SET
+        buffer += (
+            idr_slice
+            if gop_number == 0
+            else make_slice(0x65, 2000, b"", gop_number)
+        )
+        for picture_number in range(1, 4):
+            buffer += ACCESS_UNIT_DELIMITER
+            buffer += make_slice(0x41, 500, b"", gop_number * 4 + picture_number)
+    return bytes(buffer)
+
+
+def mux(
+    input_path: pathlib.Path,
+    output_path: pathlib.Path,
+    pass_through: bool,
+    streaming: bool,
+):
+    generator = DamMpeg2PsGenerator()
+    with open(input_path, "rb") as input_file, open(output_path, "wb") as output_file:
+        if streaming:
+            generator.write_mpeg2_ps_streaming(
+                input_file,
+                output_file,
+                DamMpeg2PsCodec.AVC_VIDEO,
+                FRAME_RATE,
+                pass_through,
+            )
+        else:
+            generator.load_h264_es(input_file, pass_through)
+            generator.write_mpeg2_ps(output_file, DamMpeg2PsCodec.AVC_VIDEO, FRAME_RATE)
+    return output_path.read_bytes()
+
+
+def mux_async(input_buffer: bytes, chunk_size: int, pass_through: bool):
+    async def iter_chunks():
+        for position in range(0, len(input_buffer), chunk_size):
+            yield input_buffer[position : position + chunk_size]
+
+    async def run():
+        generator = DamMpeg2PsGenerator()
+        output = bytearray()
+        async for chunk in generator.iter_mpeg2_ps_async(
+            iter_chunks(), DamMpeg2PsCodec.AVC_VIDEO, FRAME_RATE, pass_through
+        ):
+            output += chunk
+        return bytes(output)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.parametrize("emulation_density", [0.0, 1.0, 8.0])
+def test_pass_through_is_byte_identical(
+    tmp_path: pathlib.Path, streaming: bool, emulation_density: float
+):
+    input_path = tmp_path / "input.h264"
+    with open(input_path, "wb") as input_file:
+        SyntheticH264Es.write(
+            input_file,
+            3.0,
+            FRAME_RATE,
+            gop_length=15,
+            slice_size=3000,
+            idr_slice_size=20000,
+            emulation_density=emulation_density,
+        )
+
+    output = mux(input_path, tmp_path / "output.mpg", False, streaming)
+    pass_through_output = mux(
+        input_path, tmp_path / "pass_through.mpg", True, streaming
+    )
+    assert len(output) != 0
+    assert pass_through_output == output
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_pass_through_keeps_tail_emulation_prevention(
+    tmp_path: pathlib.Path, streaming: bool
+):
+    # EBSP ending in 00 00 03 03 loses its final byte on re-serialization
+    idr_slice = make_slice(0x65, 2000, b"\x00\x00\x03\x03", 0)
+    input_path = tmp_path / "input.h264"
+    input_path.write_bytes(make_h264_es(idr_slice))
+
+    output = mux(input_path, tmp_path / "output.mpg", False, streaming)
+    pass_through_output = mux(
+        input_path, tmp_path / "pass_through.mpg", True, streaming
+    )
+    assert idr_slice in pass_through_output
+    assert idr_slice not in output
+    assert idr_slice[:-1] in output
+    assert len(pass_through_output) == len(output) + 1
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_pass_through_is_byte_identical_with_escaped_tail(
+    tmp_path: pathlib.Path, streaming: bool
+):
+    # 00 00 03 00..02 at the end round-trips through RBSP
+    idr_slice = make_slice(0x65, 2000, b"\x00\x00\x03\x01", 0)
+    input_path = tmp_path / "input.h264"
+    input_path.write_bytes(make_h264_es(idr_slice))
+
+    output = mux(input_path, tmp_path / "output.mpg", False, streaming)
+    pass_through_output = mux(
+        input_path, tmp_path / "pass_through.mpg", True, streaming
+    )
+    assert idr_slice in output
+    assert pass_through_output == output
+
+
+@pytest.mark.parametrize("pass_through", [False, True])
+def test_async_large_nal_unit_in_small_chunks(
+    tmp_path: pathlib.Path, pass_through: bool
+):
+    # A NAL unit of 4 MiB without start codes is fed in 1 KiB chunks
+    idr_slice = make_slice(0x65, 4 * 1024 * 1024, b"", 0)
+    input_path = tmp_path / "input.h264"
+    input_path.write_bytes(make_h264_es(idr_slice))
+
+    output = mux(input_path, tmp_path / "output.mpg", pass_through, False)
+    assert mux_async(input_path.read_bytes(), 1024, pass_through) == output
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7])
+def test_async_start_code_split_across_chunks(
+    tmp_path: pathlib.Path, chunk_size: int
+):
+    # Short and long start codes are split at every offset by some chunk size
+    input_path = tmp_path / "input.h264"
+    input_path.write_bytes(
+        b"\x00" + make_h264_es(make_slice(0x65, 2000, b"\x00\x00\x03\x01", 0))
+    )
+
+    output = mux(input_path, tmp_path / "output.mpg", False, False)
+    assert mux_async(input_path.read_bytes(), chunk_size, False) == output
+
+
+@pytest.mark.parametrize("pass_through", [False, True])
+def test_parallel_skips_corrupt_nal_units(tmp_path: pathlib.Path, pass_through: bool):
+    input_buffer = make_h264_es(make_slice(0x65, 2000, b"", 0))
+    # forbidden_zero_bit is set in a slice of the second access unit, and in the
+    # second GOP in place of its Access Unit Delimiter
+    corrupt_slice = make_slice(0xE1, 500, b"", 100)
+    access_unit_position = input_buffer.index(ACCESS_UNIT_DELIMITER, 1)
+    gop_position = input_buffer.index(SEQUENCE_PARAMETER_SET, 1)
+    input_buffer = (
+        input_buffer[:access_unit_position]
+        + corrupt_slice
+        + input_buffer[access_unit_position:gop_position]
+        + b"\x00\x00\x00\x01\x89\xf0"
+        + input_buffer[gop_position:]
+    )
+    input_path = tmp_path / "input.h264"
+    input_path.write_bytes(input_buffer)
+
+    output = mux(input_path, tmp_path / "output.mpg", pass_through, False)
+    assert corrupt_slice not in output
+    generator = DamMpeg2PsGenerator()
+    with open(tmp_path / "parallel.mpg", "wb") as output_file:
+        generator.write_mpeg2_ps_parallel(
+            str(input_path),
+            output_file,
+            DamMpeg2PsCodec.AVC_VIDEO,
+            FRAME_RATE,
+            pass_through,
+            2,
+        )
+    assert (tmp_path / "parallel.mpg").read_bytes() == output
+
+
+def test_nal_units_are_per_instance(tmp_path: pathlib.Path):
+    input_path = tmp_path / "input.h264"
+    input_path.write_bytes(make_h264_es(make_slice(0x65, 2000, b"", 0)))
+    generator = DamMpeg2PsGenerator()
+    with open(input_path, "rb") as input_file:
+        generator.load_h264_es(input_file)
+    assert len(generator.nal_units) != 0
+    assert DamMpeg2PsGenerator().nal_units == []
@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from dam_mpeg2_ps_utility.dam_mpeg2_ps_generator_data import (
+    GopIndexEntries,
+    GopIndexEntry,
+)
+
+
+def make_entries(positions: list[int]):
+    return GopIndexEntries(
+        GopIndexEntry(position, 1000, 3003 * number)
+        for number, position in enumerate(positions)
+    )
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 1000])
+def test_records_round_trip(count: int):
+    generator = random.Random(count)
+    entries = [
+        GopIndexEntry(
+            generator.randrange(1 << 40),
+            generator.randrange(1 << 24),
+            generator.randrange(1 << 32),
+        )
+        for _ in range(count)
+    ]
+    if count != 0:
+        # Maximum of every field
+        entries[-1] = GopIndexEntry((1 << 40) - 1, (1 << 24) - 1, (1 << 32) - 1)
+    assert count <= 1 or 1 < len(set(entries))
+    buffer = GopIndexEntries(entries).to_bytes()
+    assert len(buffer) == GopIndexEntries.RECORD_SIZE * count
+    # Trailing bytes of an incomplete record are ignored
+    assert list(GopIndexEntries.from_bytes(buffer + b"\xff" * 5)) == entries
+
+
+@pytest.mark.parametrize("count", [1, 2, 1000])
+@pytest.mark.parametrize("offset", [0, 1, -1, 0x12345678, -(1 << 20)])
+def test_offset_ps_pack_header_position(count: int, offset: int):
+    generator = random.Random(count)
+    positions = [generator.randrange(1 << 20, 1 << 39) for _ in range(count)]
+    assert count == 1 or 1 < len(set(positions))
+    entries = make_entries(positions)
+    entries.offset_ps_pack_header_position(offset)
+    assert list(entries) == list(
+        make_entries([position + offset for position in positions])
+    )
+
+
+@pytest.mark.parametrize(
+    "positions, offset",
+    [
+        ([0, 5, (1 << 40) - 5], 0),
+        ([5, 10, (1 << 40) - 5], -5),
+        ([(1 << 40) - 1], 0),
+    ],
+)
+def test_offset_ps_pack_header_position_at_limits(positions: list[int], offset: int):
+    entries = make_entries(positions)
+    entries.offset_ps_pack_header_position(offset)
+    assert list(entries.ps_pack_header_position) == [
+        position + offset for position in positions
+    ]
+
+
+@pytest.mark.parametrize(
+    "positions, offset",
+    [
+        # Over 40 bits
+        ([1 << 40], 0),
+        ([0, (1 << 40) - 1, 0], 1),
+        ([0], 1 << 40),
+        # Negative
+        ([9, 3, 9], -4),
+        ([3, 9], -4),
+        ([9, 3], -4),
+    ],
+)
+def test_offset_ps_pack_header_position_out_of_range(
+    positions: list[int], offset: int
+):
+    with pytest.raises(RuntimeError):
+        make_entries(positions).offset_ps_pack_header_position(offset)
@@ -0,0 +1,63 @@
+import io
+import random
+
+import pytest
+
+from dam_mpeg2_ps_utility.h264_annex_b import H264AnnexB, H264AnnexBScanBackend
+
+
+# Short and long start codes, and a long one after trailing_zero_8bits
+START_CODES = (b"\x00\x00\x01", b"\x00\x00\x00\x01", b"\x00\x00\x00\x00\x01")
+
+
+def make_h264_es():
+    generator = random.Random(0)
+    buffer = bytearray()
+    for number in range(64):
+        buffer += START_CODES[number % 3]
+        buffer += bytes((0x41 if number % 4 else 0x65,))
+        size = generator.randrange(0, 40)
+        buffer += generator.randbytes(size).replace(b"\x00", b"\x80")
+    # NAL unit header is missing at end of stream
+    buffer += b"\x00\x00\x01"
+    return bytes(buffer)
+
+
+def index_nal_unit(
+    buffer: bytes, backend: H264AnnexBScanBackend, chunk_size: int = 1024
+):
+    return list(
+        H264AnnexB.iter_nal_unit_index(io.BytesIO(buffer), backend, chunk_size)
+    )
+
+
+@pytest.mark.parametrize(
+    "backend", [H264AnnexBScanBackend.FIND, H264AnnexBScanBackend.NUMPY]
+)
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 5, 7, 16, 1024])
+def test_scan_backends_agree_across_chunk_boundaries(
+    backend: H264AnnexBScanBackend, chunk_size: int
+):
+    if backend == H264AnnexBScanBackend.NUMPY:
+        pytest.importorskip("numpy")
+    buffer = make_h264_es()
+    expected = index_nal_unit(buffer, H264AnnexBScanBackend.BYTEWISE)
+    assert len(expected) == 64
+    assert index_nal_unit(buffer, backend, chunk_size) == expected
+
+
+def test_nal_unit_index_positions():
+    buffer = make_h264_es()
+    nal_unit_index = index_nal_unit(buffer, H264AnnexBScanBackend.BYTEWISE)
+    # NAL units are contiguous, and start with a start code of at most 4 bytes
+    position = nal_unit_index[0][0]
+    assert position == 0
+    for nal_unit_position, nal_unit_size in nal_unit_index:
+        assert nal_unit_position == position
+        assert buffer[nal_unit_position : nal_unit_position + 4] in (
+            b"\x00\x00\x01\x41",
+            b"\x00\x00\x01\x65",
+            b"\x00\x00\x00\x01",
+        )
+        position += nal_unit_size
+    assert position == len(buffer)
@@ -0,0 +1,73 @@
+import os
+import pathlib
+import time
+
+import pytest
+
+from dam_mpeg2_ps_utility.index_cache import IndexCache
+
+
+def make_indexed_file(path: pathlib.Path):
+    path.write_bytes(bytes(range(256)) * 1024)
+    return path
+
+
+@pytest.mark.parametrize("entry_count", [0, 1, 4095, 4096, 10000])
+def test_store_and_load_round_trip(tmp_path: pathlib.Path, entry_count: int):
+    index_cache = IndexCache(str(tmp_path / "cache"))
+    entries = [
+        (position * 100, position + 4, position & 0xFF)
+        for position in range(entry_count)
+    ]
+    with open(make_indexed_file(tmp_path / "input"), "rb") as stream:
+        assert index_cache.load("test", stream) is None
+        index_cache.store("test", stream, iter(entries))
+        cached_entries = index_cache.load("test", stream)
+        assert cached_entries is not None
+        assert list(cached_entries) == entries
+
+
+def test_writer_discards_on_exception(tmp_path: pathlib.Path):
+    cache_directory = tmp_path / "cache"
+    index_cache = IndexCache(str(cache_directory))
+    with open(make_indexed_file(tmp_path / "input"), "rb") as stream:
+        with pytest.raises(RuntimeError):
+            with index_cache.writer("test", stream) as cache_writer:
+                cache_writer.append((0, 1, 2))
+                raise RuntimeError("Interrupted.")
+        assert index_cache.load("test", stream) is None
+    # Temporary file is removed
+    assert os.listdir(cache_directory) == []
+
+
+def test_load_rejects_truncated_cache(tmp_path: pathlib.Path):
+    cache_directory = tmp_path / "cache"
+    index_cache = IndexCache(str(cache_directory))
+    with open(make_indexed_file(tmp_path / "input"), "rb") as stream:
+        index_cache.store("test", stream, [(0, 1, 2), (3, 4, 5)])
+        (cache_path,) = cache_directory.iterdir()
+        cache_path.write_bytes(cache_path.read_bytes()[:-1])
+        assert index_cache.load("test", stream) is None
+
+
+def test_evict_temp_files(tmp_path: pathlib.Path):
+    cache_directory = tmp_path / "cache"
+    index_cache = IndexCache(str(cache_directory), max_size=1000)
+    with open(make_indexed_file(tmp_path / "input"), "rb") as stream:
+        index_cache.store("test", stream, [(0, 1, 2)] * 10)
+    (cache_path,) = cache_directory.iterdir()
+    # Temporary file of a killed writer
+    stale_path = cache_directory / "stale.tmp"
+    stale_path.write_bytes(bytes(2000))
+    stale_time = time.time() - IndexCache.STALE_TEMP_FILE_AGE - 60
+    os.utime(stale_path, (stale_time, stale_time))
+    index_cache.evict()
+    assert not stale_path.exists()
+    assert cache_path.exists()
+
+    # Temporary file of an active writer is kept, and counts against max_size
+    active_path = cache_directory / "active.tmp"
+    active_path.write_bytes(bytes(1000))
+    index_cache.evict()
+    assert active_path.exists()
+    assert not cache_path.exists()
@@ -0,0 +1,272 @@
+import io
+
+import bitstring
+import pytest
+
+from dam_mpeg2_ps_utility.mpeg2_ps import Mpeg2Ps
+from dam_mpeg2_ps_utility.mpeg2_ps_data import (
+    Mpeg2AacAudioDescriptor,
+    Mpeg2AvcVideoDescriptor,
+    Mpeg2GenericDescriptor,
+    Mpeg2HevcVideoDescriptor,
+    Mpeg2PesPacketType1,
+    Mpeg2PesPacketType2,
+    Mpeg2PesPacketType3,
+    Mpeg2PsElementaryStreamMapEntry,
+    Mpeg2PsPackHeader,
+    Mpeg2PsPacket,
+    Mpeg2PsProgramEnd,
+    Mpeg2PsProgramStreamMap,
+    Mpeg2PsSystemHeader,
+    Mpeg2PsSystemHeaderPStdInfo,
+)
+
+
+def write_packets(ps_packets: list[Mpeg2PsPacket]):
+    buffer = bytearray()
+    for ps_packet in ps_packets:
+        Mpeg2Ps.write_ps_packet(buffer, ps_packet)
+    return bytes(buffer)
+
+
+def read_packets(buffer: bytes):
+    stream = bitstring.BitStream(buffer)
+    ps_packets: list[Mpeg2PsPacket] = []
+    while True:
+        ps_packet = Mpeg2Ps.read_ps_packet(stream)
+        if ps_packet is None:
+            break
+        ps_packets.append(ps_packet)
+    return ps_packets
+
+
+def make_pes_packet(pts: int | None, dts: int | None, PES_packet_data: bytes):
+    PTS_DTS_flags = 0x00 if pts is None else 0x02 if dts is None else 0x03
+    return Mpeg2PesPacketType1(
+        0xE0, 0, 0, 1, 0, 0, PTS_DTS_flags, 0, 0, 0, 0, 0, 0, pts, dts, PES_packet_data
+    )
+
+
+AVC_VIDEO_DESCRIPTOR = Mpeg2AvcVideoDescriptor(
+    0x64, 0, 0, 0, 0, 1, 1, 0x00, 0x28, 0, 0, 1
+)
+
+
+def make_hevc_video_descriptor(temporal_layer_subset_flag: int):
+    return Mpeg2HevcVideoDescriptor(
+        0,
+        1,
+        0x02,
+        0x60000000,
+        1,
+        0,
+        0,
+        1,
+        0x800000000AB,
+        0x99,
+        temporal_layer_subset_flag,
+        0,
+        1,
+        1,
+        0x02,
+        0x01 if temporal_layer_subset_flag == 0x01 else None,
+        0x06 if temporal_layer_subset_flag == 0x01 else None,
+    )
+
+
+@pytest.mark.parametrize(
+    "system_clock_reference_base",
+    [0, 1, 0x7FFF, 0x8000, 0x3FFFFFFF, 0x40000000, 1 << 32, (1 << 33) - 1],
+)
+@pytest.mark.parametrize("system_clock_reference_extension", [0, 1, 299])
+@pytest.mark.parametrize("pack_stuffing_length", range(8))
+def test_ps_pack_header_round_trip(
+    system_clock_reference_base: int,
+    system_clock_reference_extension: int,
+    pack_stuffing_length: int,
+):
+    ps_pack_header = Mpeg2PsPackHeader(
+        system_clock_reference_base,
+        system_clock_reference_extension,
+        20000,
+        pack_stuffing_length,
+    )
+    assert read_packets(write_packets([ps_pack_header])) == [ps_pack_header]
+
+
+def test_ps_pack_header_scr_bit_32():
+    buffer = Mpeg2Ps.serialize_ps_pack_header(Mpeg2PsPackHeader(1 << 32, 0, 0, 0))
+    # '01', SCR[32..30], marker_bit, SCR[29..28]
+    assert buffer[4] == 0x64
+    assert read_packets(buffer)[0].system_clock_reference_base == 1 << 32
+
+
+@pytest.mark.parametrize("pack_stuffing_length", range(8))
+def test_ps_pack_header_stuffing(pack_stuffing_length: int):
+    ps_pack_header = Mpeg2PsPackHeader(0, 0, 20000, pack_stuffing_length)
+    buffer = Mpeg2Ps.serialize_ps_pack_header(ps_pack_header)
+    assert len(buffer) == 14 + pack_stuffing_length
+    assert buffer[13] == 0xF8 | pack_stuffing_length
+    assert buffer[14:] == b"\xff" * pack_stuffing_length
+    # The following packet is still found after the stuffing bytes
+    pes_packet = make_pes_packet(0, None, b"\x00\x00\x00\x01\x09\xf0")
+    assert read_packets(write_packets([ps_pack_header, pes_packet])) == [
+        ps_pack_header,
+        pes_packet,
+    ]
+
+
+@pytest.mark.parametrize(
+    "P_STD_info",
+    [
+        [],
+        [Mpeg2PsSystemHeaderPStdInfo(0xE0, 1, 0x1FFF)],
+        [
+            Mpeg2PsSystemHeaderPStdInfo(0xE0, 1, 232),
+            Mpeg2PsSystemHeaderPStdInfo(0xC0, 0, 32),
+            Mpeg2PsSystemHeaderPStdInfo(0xBF, 1, 2),
+        ],
+    ],
+)
+def test_ps_system_header_round_trip(P_STD_info: list[Mpeg2PsSystemHeaderPStdInfo]):
+    ps_system_header = Mpeg2PsSystemHeader(
+        0x3FFFFF, 0x3F, 1, 0, 1, 1, 0x1F, 1, P_STD_info
+    )
+    assert read_packets(write_packets([ps_system_header])) == [ps_system_header]
+
+
+@pytest.mark.parametrize(
+    "elementary_stream_info",
+    [
+        [],
+        [AVC_VIDEO_DESCRIPTOR],
+        [Mpeg2AacAudioDescriptor(0x01, 0x02, 0x00)],
+        [make_hevc_video_descriptor(0)],
+        [make_hevc_video_descriptor(1)],
+        [Mpeg2GenericDescriptor(0x05, b"HEVC"), AVC_VIDEO_DESCRIPTOR],
+    ],
+)
+def test_program_stream_map_round_trip(elementary_stream_info: list):
+    program_stream_map = Mpeg2PsProgramStreamMap(
+        1,
+        0x01,
+        [Mpeg2GenericDescriptor(0x05, b"DAM")],
+        [
+            Mpeg2PsElementaryStreamMapEntry(0x1B, 0xE0, elementary_stream_info),
+            Mpeg2PsElementaryStreamMapEntry(0x0F, 0xC0, []),
+        ],
+    )
+    buffer = write_packets([program_stream_map])
+    # CRC of the whole packet including CRC_32 is 0
+    assert Mpeg2Ps.crc32(buffer) == 0
+    assert read_packets(buffer) == [program_stream_map]
+
+
+@pytest.mark.parametrize("temporal_layer_subset_flag", [0, 1])
+def test_hevc_video_descriptor_tag(temporal_layer_subset_flag: int):
+    hevc_video_descriptor = make_hevc_video_descriptor(temporal_layer_subset_flag)
+    program_stream_map = Mpeg2PsProgramStreamMap(
+        1,
+        0x00,
+        [],
+        [Mpeg2PsElementaryStreamMapEntry(0x24, 0xE0, [hevc_video_descriptor])],
+    )
+    buffer = write_packets([program_stream_map])
+    # Header, program_stream_info_length, elementary_stream_map_length and entry
+    descriptor_position = 6 + 2 + 2 + 2 + 4
+    assert buffer[descriptor_position] == 0x38
+    assert buffer[descriptor_position + 1] == (
+        0x0F if temporal_layer_subset_flag == 0x01 else 0x0D
+    )
+    ps_packet = read_packets(buffer)[0]
+    assert isinstance(ps_packet, Mpeg2PsProgramStreamMap)
+    assert ps_packet.elementary_stream_map[0].elementary_stream_info == [
+        hevc_video_descriptor
+    ]
+
+
+@pytest.mark.parametrize(
+    "pts, dts",
+    [
+        (None, None),
+        (0, None),
+        ((1 << 33) - 1, None),
+        (1 << 32, 1 << 32),
+        (90090, 87087),
+    ],
+)
+@pytest.mark.parametrize("size", [0, 1, 65535 - 13])
+def test_pes_packet_type1_round_trip(pts: int | None, dts: int | None, size: int):
+    PES_packet_data = bytes(range(256)) * (size // 256) + bytes(size % 256)
+    pes_packet = make_pes_packet(pts, dts, PES_packet_data)
+    assert read_packets(write_packets([pes_packet])) == [pes_packet]
+
+
+def test_pes_packet_type2_and_type3_round_trip():
+    ps_packets = [
+        Mpeg2PesPacketType2(0xBF, b"\xff\x01\xe0\x00\x00\x00\x00"),
+        Mpeg2PesPacketType3(0xBE, 100),
+        Mpeg2PsProgramEnd(),
+    ]
+    assert read_packets(write_packets(ps_packets)) == ps_packets
+
+
+def test_bitstream_and_bytearray_writers_match():
+    ps_packets = [
+        Mpeg2PsPackHeader(1 << 32, 123, 20000, 2),
+        Mpeg2PsSystemHeader(
+            20000, 0, 0, 0, 1, 1, 1, 1, [Mpeg2PsSystemHeaderPStdInfo(0xE0, 1, 232)]
+        ),
+        Mpeg2PsProgramStreamMap(
+            1,
+            0,
+            [],
+            [
+                Mpeg2PsElementaryStreamMapEntry(
+                    0x24, 0xE0, [make_hevc_video_descriptor(1)]
+                )
+            ],
+        ),
+        make_pes_packet(3003, None, b"\x00\x00\x01\x09\xf0"),
+        Mpeg2PsProgramEnd(),
+    ]
+    stream = bitstring.BitStream()
+    for ps_packet in ps_packets:
+        Mpeg2Ps.write_ps_packet(stream, ps_packet)
+    assert stream.bytes == write_packets(ps_packets)
+
+
+@pytest.mark.parametrize("truncated_size", [1, 6, 100])
+def test_iter_packet_index_clamps_truncated_packet(truncated_size: int):
+    pes_packet = make_pes_packet(0, None, bytes(200))
+    buffer = write_packets([Mpeg2PsPackHeader(0, 0, 20000, 0), pes_packet])
+    buffer = buffer[: len(buffer) - truncated_size]
+    stream = io.BytesIO(buffer)
+    packet_index = list(Mpeg2Ps.iter_packet_index(stream))
+    assert packet_index == [(0, 14), (14, len(buffer) - 14)]
+    assert list(Mpeg2Ps.iter_packet_index(io.BytesIO(buffer), 0xE0)) == [
+        (14, len(buffer) - 14)
+    ]
+
+
+def crc32_bitwise(buffer: bytes):
+    crc = 0xFFFFFFFF
+    for value in buffer:
+        crc ^= value << 24
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x104C11DB7 if crc & 0x80000000 else crc << 1
+    return crc
+
+
+def test_crc32_check_value():
+    # Check value of CRC-32/MPEG-2
+    assert Mpeg2Ps.crc32(b"123456789") == 0x0376E6E7
+    assert Mpeg2Ps.crc32(b"") == 0xFFFFFFFF
+
+
+def test_crc32_continues_and_matches_bitwise():
+    buffer = bytes(range(256)) * 3 + b"DAM"
+    assert Mpeg2Ps.crc32(buffer) == crc32_bitwise(buffer)
+    assert Mpeg2Ps.crc32(buffer[100:], Mpeg2Ps.crc32(buffer[:100])) == (
+        Mpeg2Ps.crc32(buffer)
+    )
@@ -0,0 +1,52 @@
+from fractions import Fraction
+
+import pytest
+
+from dam_mpeg2_ps_utility.mpeg2_ps_clock import Mpeg2PsClock
+
+# 10 hours at 30000/1001
+LONG_PICTURE_COUNT = 1079280
+
+
+def test_pts_of_30000_1001_has_no_drift():
+    clock = Mpeg2PsClock(Fraction(30000, 1001))
+    for picture_count in range(0, LONG_PICTURE_COUNT, 997):
+        assert clock.pts(picture_count) == 3003 * picture_count
+    assert clock.pts(LONG_PICTURE_COUNT) == 3003 * LONG_PICTURE_COUNT
+
+
+def test_pts_of_24000_1001_has_no_drift():
+    clock = Mpeg2PsClock(Fraction(24000, 1001))
+    # 3753.75 ticks per picture, exact every 4 pictures
+    for picture_count in range(0, LONG_PICTURE_COUNT, 4 * 997):
+        assert clock.pts(picture_count) == 15015 * picture_count // 4
+    last_pts = clock.pts(LONG_PICTURE_COUNT - 1000)
+    for picture_count in range(LONG_PICTURE_COUNT - 999, LONG_PICTURE_COUNT):
+        pts = clock.pts(picture_count)
+        assert pts - last_pts in (3753, 3754)
+        last_pts = pts
+
+
+@pytest.mark.parametrize("frame_rate", [Fraction(24000, 1001), Fraction(30000, 1001)])
+def test_pts_matches_exact_time(frame_rate: Fraction):
+    clock = Mpeg2PsClock(frame_rate)
+    for picture_count in range(LONG_PICTURE_COUNT - 10000, LONG_PICTURE_COUNT):
+        assert clock.pts(picture_count) == int(picture_count * 90000 / frame_rate)
+
+
+@pytest.mark.parametrize(
+    "frame_rate", [Fraction(24000, 1001), Fraction(30000, 1001), Fraction(60)]
+)
+def test_scr_matches_pts(frame_rate: Fraction):
+    clock = Mpeg2PsClock(frame_rate)
+    for picture_count in (0, 1, 2, 1001, LONG_PICTURE_COUNT):
+        SCR_base, SCR_ext = clock.scr(picture_count)
+        assert SCR_base == clock.pts(picture_count)
+        assert 0 <= SCR_ext < 300
+        assert SCR_base * 300 + SCR_ext == clock.system_clock(picture_count)
+
+
+@pytest.mark.parametrize("frame_rate", [Fraction(0), Fraction(-30)])
+def test_invalid_frame_rate(frame_rate: Fraction):
+    with pytest.raises(RuntimeError):
+        Mpeg2PsClock(frame_rate)
@@ -0,0 +1,102 @@
+import io
+import os
+import pathlib
+
+import pytest
+
+from dam_mpeg2_ps_utility.index_cache import IndexCache
+from dam_mpeg2_ps_utility.mpeg2_ps import Mpeg2Ps
+from dam_mpeg2_ps_utility.mpeg2_ps_data import (
+    Mpeg2PesPacketType2,
+    Mpeg2PesPacketType3,
+    Mpeg2PsPackHeader,
+    Mpeg2PsProgramEnd,
+)
+from dam_mpeg2_ps_utility.mpeg2_ps_reader import Mpeg2PsReader
+
+
+def make_mpeg2_ps(path: pathlib.Path):
+    buffer = bytearray()
+    for packet_number in range(8):
+        Mpeg2Ps.write_ps_packet(
+            buffer, Mpeg2PsPackHeader(packet_number * 3003, 0, 20000, 0)
+        )
+        Mpeg2Ps.write_ps_packet(
+            buffer, Mpeg2PesPacketType2(0xBF, bytes((packet_number,)) * 16)
+        )
+        Mpeg2Ps.write_ps_packet(buffer, Mpeg2PesPacketType3(0xBE, 100))
+    Mpeg2Ps.write_ps_packet(buffer, Mpeg2PsProgramEnd())
+    path.write_bytes(buffer)
+    return path
+
+
+def iter_packets(path: pathlib.Path, index_cache: IndexCache | None, stream_ids=None):
+    with open(path, "rb") as stream, Mpeg2PsReader(stream, index_cache) as reader:
+        return [
+            (ps_packet.position, ps_packet.stream_id, bytes(ps_packet.data))
+            for ps_packet in reader.iter_packets(stream_ids)
+        ]
+
+
+def test_packet_index_is_loaded_lazily(tmp_path: pathlib.Path):
+    cache_directory = tmp_path / "cache"
+    index_cache = IndexCache(str(cache_directory))
+    path = make_mpeg2_ps(tmp_path / "input.mpg")
+
+    # Opening and filtered iteration do not build the index
+    gop_index_packets = iter_packets(path, index_cache, (0xBF,))
+    assert len(gop_index_packets) == 8
+    assert not cache_directory.exists()
+
+    packets = iter_packets(path, None)
+    # Built on a miss, loaded on a hit
+    assert iter_packets(path, index_cache) == packets
+    assert len(os.listdir(cache_directory)) == 1
+    assert iter_packets(path, index_cache) == packets
+    assert iter_packets(path, index_cache, (0xBF,)) == gop_index_packets
+
+
+def test_read_ps_packet_with_packet_index(tmp_path: pathlib.Path):
+    index_cache = IndexCache(str(tmp_path / "cache"))
+    path = make_mpeg2_ps(tmp_path / "input.mpg")
+    for _ in range(2):
+        with open(path, "rb") as stream, Mpeg2PsReader(stream, index_cache) as reader:
+            reader.seek(1)
+            assert reader.seek_packet(0xBF) == 0xBF
+            assert reader.tell() == 14
+            ps_packet = reader.read_ps_packet()
+            assert isinstance(ps_packet, Mpeg2PesPacketType2)
+            assert bytes(ps_packet.PES_packet_data) == b"\x00" * 16
+
+
+def test_stream_without_file_descriptor(tmp_path: pathlib.Path):
+    path = make_mpeg2_ps(tmp_path / "input.mpg")
+    packets = iter_packets(path, None)
+    assert len(packets) == 8 * 3 + 1
+
+    stream = io.BytesIO(path.read_bytes())
+    stream.seek(10)
+    # The cache is not used for a stream without a file
+    index_cache = IndexCache(str(tmp_path / "cache"))
+    with Mpeg2PsReader(stream, index_cache) as reader:
+        assert [
+            (ps_packet.position, ps_packet.stream_id, bytes(ps_packet.data))
+            for ps_packet in reader.iter_packets()
+        ] == packets
+    assert not (tmp_path / "cache").exists()
+
+    stream = io.BytesIO(path.read_bytes())
+    assert [
+        (ps_packet.position, ps_packet.stream_id, bytes(ps_packet.data))
+        for ps_packet in Mpeg2Ps.iter_packets(stream)
+    ] == packets
+
+
+@pytest.mark.parametrize("use_file", [False, True])
+def test_empty_stream(tmp_path: pathlib.Path, use_file: bool):
+    path = tmp_path / "input.mpg"
+    path.write_bytes(b"")
+    with open(path, "rb") if use_file else io.BytesIO() as stream:
+        with Mpeg2PsReader(stream) as reader:
+            assert list(reader.iter_packets()) == []
+            assert reader.read_ps_packet() is None
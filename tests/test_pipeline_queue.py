@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from dam_mpeg2_ps_utility.pipeline_queue import PipelineQueue
+
+
+def start_thread(target):
+    errors: list[BaseException] = []
+
+    def run():
+        try:
+            target()
+        except BaseException as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, errors
+
+
+def wait_blocked(thread: threading.Thread):
+    # The thread is still blocked after a short while
+    time.sleep(0.1)
+    assert thread.is_alive()
+
+
+def test_items_are_in_order():
+    queue = PipelineQueue("test", 3)
+
+    def produce():
+        for item in range(100):
+            queue.put(item)
+        queue.close()
+
+    thread, errors = start_thread(produce)
+    assert list(queue) == list(range(100))
+    thread.join(5)
+    assert errors == []
+    stats = queue.stats
+    assert stats.item_count == 100
+    assert 1 <= stats.max_occupancy <= 3
+
+
+def test_cancel_unblocks_put():
+    queue = PipelineQueue("test", 1)
+    queue.put(0)
+    thread, errors = start_thread(lambda: queue.put(1))
+    wait_blocked(thread)
+    queue.cancel()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert len(errors) == 1 and isinstance(errors[0], RuntimeError)
+
+
+def test_cancel_unblocks_get():
+    queue = PipelineQueue("test", 1)
+    thread, errors = start_thread(lambda: list(queue))
+    wait_blocked(thread)
+    queue.cancel()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert len(errors) == 1 and isinstance(errors[0], RuntimeError)
+
+
+def test_put_and_get_after_cancel():
+    queue = PipelineQueue("test", 2)
+    queue.put(0)
+    queue.cancel()
+    with pytest.raises(RuntimeError):
+        queue.put(1)
+    with pytest.raises(RuntimeError):
+        list(queue)
+
+
+def test_put_after_close():
+    queue = PipelineQueue("test", 2)
+    queue.put(0)
+    queue.close()
+    with pytest.raises(RuntimeError):
+        queue.put(1)
+    # Items put before close are drained
+    assert list(queue) == [0]
+
+
+def test_invalid_maxsize():
+    with pytest.raises(RuntimeError):
+        PipelineQueue("test", 0)
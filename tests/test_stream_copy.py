@@ -0,0 +1,88 @@
+import io
+import pathlib
+import random
+
+import pytest
+
+from dam_mpeg2_ps_utility.stream_copy import StreamCopy, StreamCopyBackend
+
+# Over 2 chunks of the buffered copy
+DATA = random.Random(0).randbytes(2 * 1024 * 1024 + 12345)
+
+
+def copy_file(
+    tmp_path: pathlib.Path,
+    size: int | None,
+    backend: StreamCopyBackend | None,
+):
+    input_path = tmp_path / "input"
+    input_path.write_bytes(DATA)
+    output_path = tmp_path / "output"
+    with open(input_path, "rb") as input_stream, open(
+        output_path, "wb"
+    ) as output_stream:
+        input_stream.seek(100)
+        output_stream.write(b"header")
+        copied_size = StreamCopy.copy(input_stream, output_stream, size, backend)
+        # Both streams are left at the end of the copied bytes
+        assert input_stream.tell() == 100 + copied_size
+        assert output_stream.tell() == 6 + copied_size
+        output_stream.write(b"footer")
+    return copied_size, output_path.read_bytes()
+
+
+@pytest.mark.parametrize(
+    "backend",
+    [
+        None,
+        StreamCopyBackend.BUFFERED,
+        StreamCopyBackend.COPY_FILE_RANGE,
+        StreamCopyBackend.SENDFILE,
+    ],
+)
+@pytest.mark.parametrize("size", [None, 0, 1, 1024 * 1024 + 1, len(DATA)])
+def test_copy_file(
+    tmp_path: pathlib.Path, backend: StreamCopyBackend | None, size: int | None
+):
+    try:
+        copied_size, output = copy_file(tmp_path, size, backend)
+    except RuntimeError:
+        # Kernel backend unavailable on this platform or file system
+        assert backend not in (None, StreamCopyBackend.BUFFERED)
+        pytest.skip(f"{backend} unavailable")
+    expected = DATA[100:] if size is None else DATA[100 : 100 + size]
+    assert copied_size == len(expected)
+    assert output == b"header" + expected + b"footer"
+
+
+@pytest.mark.parametrize("backend", [None, StreamCopyBackend.BUFFERED])
+@pytest.mark.parametrize("size", [None, 1024 * 1024 + 1])
+def test_copy_stream_without_file_descriptor(
+    backend: StreamCopyBackend | None, size: int | None
+):
+    input_stream = io.BytesIO(DATA)
+    input_stream.seek(100)
+    output_stream = io.BytesIO()
+    output_stream.write(b"header")
+    copied_size = StreamCopy.copy(input_stream, output_stream, size, backend)
+    expected = DATA[100:] if size is None else DATA[100 : 100 + size]
+    assert copied_size == len(expected)
+    assert input_stream.tell() == 100 + copied_size
+    assert output_stream.getvalue() == b"header" + expected
+
+
+def test_copy_file_to_stream_without_file_descriptor(tmp_path: pathlib.Path):
+    input_path = tmp_path / "input"
+    input_path.write_bytes(DATA)
+    output_stream = io.BytesIO()
+    with open(input_path, "rb") as input_stream:
+        assert StreamCopy.copy(input_stream, output_stream) == len(DATA)
+    assert output_stream.getvalue() == DATA
+
+
+@pytest.mark.parametrize(
+    "backend", [StreamCopyBackend.COPY_FILE_RANGE, StreamCopyBackend.SENDFILE]
+)
+def test_kernel_backend_without_file_descriptor(backend: StreamCopyBackend):
+    with pytest.raises(RuntimeError):
+        StreamCopy.copy(io.BytesIO(DATA), io.BytesIO(), backend=backend)